@@ -0,0 +1 @@
+"""Offline benchmarks for the data acquisition and integration scripts."""
@@ -0,0 +1,89 @@
+"""Benchmark the ArcGIS fetcher against a local mock FeatureServer.
+
+The mock serves a synthetic point layer and sleeps ``--latency`` seconds
+per query to stand in for a remote server, so throughput should grow with
+the number of workers until the rate limit or the page count caps it.
+
+    python -m benchmarks.arcgis_fetch --features 20000 --workers 1 2 4 8 16
+"""
+
+import argparse
+import json
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from scripts.download_arcgis_chargers import download
+
+FIELDS = [
+    {"name": "OBJECTID", "type": "esriFieldTypeOID"},
+    {"name": "Concelho", "type": "esriFieldTypeString"},
+    {"name": "Pontos", "type": "esriFieldTypeInteger"},
+]
+
+
+def make_handler(features: int, max_record_count: int, latency: float):
+    class MockFeatureServer(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            params = dict(urllib.parse.parse_qsl(url.query))
+            if url.path.endswith("/query"):
+                time.sleep(latency)
+                if params.get("returnCountOnly") == "true":
+                    body = {"count": features}
+                else:
+                    offset = int(params["resultOffset"])
+                    count = min(int(params["resultRecordCount"]), max_record_count)
+                    body = {
+                        "features": [
+                            {
+                                "attributes": {"OBJECTID": i + 1, "Concelho": f"Concelho {i % 278}", "Pontos": i % 12},
+                                "geometry": {"x": -9.5 + (i % 1000) / 250, "y": 37 + (i // 1000 % 1000) / 200},
+                            }
+                            for i in range(offset, min(offset + count, features))
+                        ]
+                    }
+            else:
+                body = {"fields": FIELDS, "maxRecordCount": max_record_count, "objectIdField": "OBJECTID"}
+            payload = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return MockFeatureServer
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--features", type=int, default=20_000)
+    parser.add_argument("--max-record-count", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per query")
+    parser.add_argument("--rate", type=float, default=0, help="requests per second (0 disables)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args(argv)
+
+    handler = make_handler(args.features, args.max_record_count, args.latency)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    layer_url = f"http://127.0.0.1:{server.server_port}/arcgis/rest/services/chargers/FeatureServer/0"
+
+    print(f"{'workers':>7} {'seconds':>8} {'features/s':>11}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            started = time.perf_counter()
+            written = download(layer_url, Path(tmp) / f"w{workers}.parquet", workers=workers, rate=args.rate)
+            elapsed = time.perf_counter() - started
+            print(f"{workers:>7} {elapsed:>8.2f} {written / elapsed:>11.0f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
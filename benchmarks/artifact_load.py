@@ -0,0 +1,170 @@
+"""Compare rebuilding join_df with loading it from Parquet or the memory-mapped Arrow artifact.
+
+Each mode runs in ``--sessions`` worker processes, standing in for
+notebook sessions. They load one after another, so load times are not
+skewed by contention. Each worker loads the frame, touches every numeric
+column and stays alive. Once all are loaded, each reads its memory from
+``/proc/self/smaps_rollup`` (Linux). Reported memory is relative to the
+worker's own baseline after imports:
+
+* ``peak``: the highest resident set size while loading (``VmHWM``)
+* ``rss``: resident pages, shared or not
+* ``private``: anonymous pages, which only this process holds
+* ``pss``: proportional set size, where a page shared by N processes
+  counts 1/N
+
+Pages of a mapped artifact are shared page cache, so the PSS of the
+sessions together stays near one copy. Frames read from Parquet are
+private to every session. ``arrow`` converts strings and nullable
+integers to numpy-backed columns, which are private again, while
+``arrow-dtypes`` keeps every column in the mapping (see
+:func:`scripts.artifact.read`).
+
+Two datasets are used. ``join_df`` is rebuilt from seeded synthetic
+sources with ``--rows`` data rows each (see
+:func:`benchmarks.synthetic.write_sources`). ``plot_df`` is a synthetic
+ranked frame with ``--frame-rows`` rows, large enough that the memory of
+the frame itself dominates.
+
+    python -m benchmarks.artifact_load --rows 100000 --frame-rows 2000000 --sessions 4
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+MODES = {
+    "join_df": ("rebuild", "parquet", "arrow"),
+    "plot_df": ("parquet", "arrow", "arrow-dtypes"),
+}
+
+
+def memory_mib() -> dict[str, float]:
+    usage = {}
+    for path, fields in (
+        ("/proc/self/smaps_rollup", {"Rss": "rss", "Pss": "pss", "Anonymous": "private"}),
+        ("/proc/self/status", {"VmHWM": "peak"}),
+    ):
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = int(value.split()[0]) / 1024
+    return usage
+
+
+def load(mode: str, name: str, directory: Path, sources: dict[str, str]):
+    import pandas as pd
+
+    from scripts import artifact, pipeline
+
+    if mode == "rebuild":
+        density = pipeline.density(sources["density"], 2024)
+        chargers = pipeline.eredes_agg(pd.read_csv(sources["eredes"], sep=";"), density)
+        return pipeline.ranked(pipeline.join(pipeline.joined(pipeline.income(sources["income"]), density, chargers)))
+    if mode == "parquet":
+        return pd.read_parquet(directory / f"{name}.parquet")
+    return artifact.read(directory, name, arrow_dtypes=mode == "arrow-dtypes")
+
+
+def worker(mode: str, name: str, directory: Path, sources: dict[str, str]) -> None:
+    import logging
+
+    import pandas  # noqa: F401
+
+    import scripts.artifact  # noqa: F401
+    import scripts.pipeline  # noqa: F401
+
+    logging.basicConfig(level=logging.ERROR)
+    baseline = memory_mib()
+    started = time.perf_counter()
+    df = load(mode, name, directory, sources)
+    df.sum(numeric_only=True)
+    seconds = time.perf_counter() - started
+    print("ready", flush=True)
+    sys.stdin.readline()
+    usage = memory_mib()
+    # The peak is measured from the resident set at the baseline, not from the earlier peak
+    baseline["peak"] = baseline["rss"]
+    print(json.dumps({"seconds": seconds, **{key: usage[key] - baseline[key] for key in usage}}), flush=True)
+
+
+def sessions(mode: str, name: str, directory: Path, sources: dict[str, str], count: int) -> list[dict]:
+    command = [
+        sys.executable, "-m", "benchmarks.artifact_load",
+        "--worker", mode,
+        "--dataset", name,
+        "--directory", str(directory),
+        "--sources", json.dumps(sources),
+    ]
+    processes = []
+    for _ in range(count):
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        processes.append(process)
+        if process.stdout.readline().strip() != "ready":
+            raise RuntimeError(f"{mode} worker failed")
+    results = []
+    for process in processes:
+        process.stdin.write("\n")
+        process.stdin.flush()
+        results.append(json.loads(process.stdout.readline()))
+        process.wait()
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="data rows per synthetic source")
+    parser.add_argument("--frame-rows", type=int, default=2_000_000, help="rows of the synthetic plot_df")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--dataset", help=argparse.SUPPRESS)
+    parser.add_argument("--directory", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--sources", type=json.loads, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args.worker, args.dataset, args.directory, args.sources)
+        return
+
+    from benchmarks.dashboard import synthetic_join_df
+    from benchmarks.synthetic import write_sources
+    from scripts import artifact
+    from scripts.ranking import add_ranks
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = Path(scratch)
+        sources = {key: str(path) for key, path in write_sources(directory / "sources", args.rows, seed=args.seed).items()}
+        frames = {
+            "join_df": load("rebuild", "join_df", directory, sources),
+            "plot_df": add_ranks(synthetic_join_df(args.frame_rows, args.seed)),
+        }
+        for name, df in frames.items():
+            df.to_parquet(directory / f"{name}.parquet", index=False)
+            artifact.publish(df, directory, name)
+        del frames
+
+        print(
+            f"{'dataset':<8} {'mode':<13} {'load s':>8} {'peak MiB':>9} {'rss MiB':>8} {'private MiB':>12} "
+            f"{'pss MiB':>8} {f'pss x{args.sessions}':>9}"
+        )
+        for name, modes in MODES.items():
+            for mode in modes:
+                results = sessions(mode, name, directory, sources, args.sessions)
+
+                def mean(key: str) -> float:
+                    return sum(result[key] for result in results) / len(results)
+
+                print(
+                    f"{name:<8} {mode:<13} {mean('seconds'):>8.3f} {mean('peak'):>9.1f} {mean('rss'):>8.1f} "
+                    f"{mean('private'):>12.1f} {mean('pss'):>8.1f} {mean('pss') * len(results):>9.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
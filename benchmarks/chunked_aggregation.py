@@ -0,0 +1,127 @@
+"""Compare peak memory of in-memory and streaming E-REDES aggregation.
+
+For each size a synthetic export is generated (see
+:mod:`benchmarks.synthetic`) and aggregated twice, each time in a fresh
+process so the peak resident set size (``ru_maxrss``) belongs to that mode
+alone:
+
+* ``in-memory``: the notebook's path, ``pd.read_csv`` with default dtypes,
+  latest-quarter filter and :func:`scripts.eredes.aggregate_by_municipality`
+* ``streaming``: :func:`scripts.eredes.aggregate_csv` over compact chunks
+
+The two results must be identical. ``baseline`` is the RSS after imports,
+before any data is read.
+
+    python -m benchmarks.chunked_aggregation --sizes 100000 1000000 10000000
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+MODES = ("in-memory", "streaming")
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss survives exec, so a worker would inherit the parent's peak; VmHWM starts afresh
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Linux and BSDs report ru_maxrss in KiB (macOS in bytes)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def worker(mode: str, csv_path: Path, output: Path, municipality_count: int, seed: int, chunksize: int) -> None:
+    import logging
+
+    import pandas as pd
+
+    from benchmarks.synthetic import municipalities
+    from scripts import eredes
+    from scripts.municipalities import MunicipalityIndex
+
+    logging.basicConfig(level=logging.ERROR)
+    index = MunicipalityIndex.from_frame(municipalities(municipality_count, seed))
+    baseline = _peak_rss_mib()
+    started = time.perf_counter()
+    if mode == "in-memory":
+        raw = pd.read_csv(csv_path, sep=";")
+        latest = raw[raw[eredes.QUARTER_COLUMN] == raw[eredes.QUARTER_COLUMN].max()]
+        result = eredes.aggregate_by_municipality(latest, index)
+    else:
+        result = eredes.aggregate_csv(csv_path, index, chunksize=chunksize)
+    seconds = time.perf_counter() - started
+    result.to_pickle(output)
+    print(json.dumps({"seconds": seconds, "baseline_mib": baseline, "peak_mib": _peak_rss_mib()}))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--municipalities", type=int, default=308)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunksize", type=int, default=250_000)
+    parser.add_argument("--data-dir", type=Path, help="keep generated exports here between runs")
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--csv", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--result", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args.worker, args.csv, args.result, args.municipalities, args.seed, args.chunksize)
+        return
+
+    import pandas as pd
+
+    from benchmarks.synthetic import municipalities, write_eredes_csv
+
+    with tempfile.TemporaryDirectory() as scratch:
+        data_dir = args.data_dir or Path(scratch)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        print(f"{'rows':>10} {'mode':<10} {'seconds':>8} {'baseline MiB':>13} {'peak MiB':>9} {'delta MiB':>10}")
+        for size in args.sizes:
+            csv_path = data_dir / f"eredes-{size}-{args.municipalities}-{args.seed}.csv"
+            if not csv_path.exists():
+                munis = municipalities(args.municipalities, args.seed)
+                write_eredes_csv(munis, csv_path.with_suffix(".tmp"), size, args.seed)
+                csv_path.with_suffix(".tmp").rename(csv_path)
+
+            results = {}
+            for mode in MODES:
+                result_path = Path(scratch) / f"{mode}.pkl"
+                completed = subprocess.run(
+                    [
+                        sys.executable, "-m", "benchmarks.chunked_aggregation",
+                        "--worker", mode,
+                        "--csv", str(csv_path),
+                        "--result", str(result_path),
+                        "--municipalities", str(args.municipalities),
+                        "--seed", str(args.seed),
+                        "--chunksize", str(args.chunksize),
+                    ],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                )
+                stats = json.loads(completed.stdout)
+                results[mode] = pd.read_pickle(result_path)
+                print(
+                    f"{size:>10} {mode:<10} {stats['seconds']:>8.2f} {stats['baseline_mib']:>13.0f} "
+                    f"{stats['peak_mib']:>9.0f} {stats['peak_mib'] - stats['baseline_mib']:>10.0f}"
+                )
+            pd.testing.assert_frame_equal(*results.values())
+        print("streaming and in-memory results are identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Measure build time and payload size of the scatter dashboard.
+
+Three ways of building the 2x2 income/density vs stations/points figure
+are timed on synthetic ``join_df``-shaped frames:
+
+* ``subplots``: the notebook's original cell (four ``px.scatter`` figures
+  with ``trendline="ols"``, traces copied into ``make_subplots`` and
+  restyled in loops); needs plotly and statsmodels
+* ``figure``: :func:`scripts.dashboard.figure` (WebGL, precomputed
+  trendlines, downsampling); needs plotly
+* ``html``: :func:`scripts.dashboard.write_html` (shared column store);
+  needs neither
+
+The payload is the figure JSON (``fig.to_json()``) or the page size. Modes
+whose dependencies are missing are reported as skipped.
+
+Measured with plotly 7.1 (seconds / payload MiB):
+
+    rows       subplots        figure        html
+    308        1.24 / 0.08     0.09 / 0.04   0.00 / 0.02
+    10,000     0.57 / 2.35     0.20 / 1.07   0.02 / 0.38
+    100,000    2.08 / 23.81    0.39 / 2.28   0.09 / 1.25
+    1,000,000  17.17 / 241.89  0.57 / 2.37   0.40 / 1.27
+
+    python -m benchmarks.dashboard --rows 308 10000 1000000
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts import dashboard
+from scripts.correlation import correlate
+
+INCOME = dashboard.INCOME_COLUMN
+DENSITY = dashboard.DENSITY_COLUMN
+
+
+def synthetic_join_df(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    income = rng.normal(22000, 4000, rows)
+    density = rng.lognormal(4.3, 1.3, rows)
+    stations = np.round(np.clip(0.002 * income + 0.02 * density + rng.normal(0, 15, rows), 0, None))
+    return pd.DataFrame(
+        {
+            "Concelho": [f"Município {i}" for i in range(rows)],
+            "num_charging_stations": stations,
+            "total_charging_points": stations * 3 + rng.poisson(2, rows),
+            DENSITY: density,
+            INCOME: income,
+        }
+    )
+
+
+def build_subplots(df: pd.DataFrame):
+    """The notebook's original figure."""
+    import plotly.express as px
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=2, cols=2, subplot_titles=[panel.title for panel in dashboard.PANELS])
+    for index, panel in enumerate(dashboard.PANELS):
+        scatter = px.scatter(
+            df, x=panel.x, y=panel.y, hover_name="Concelho", trendline="ols", color_discrete_sequence=[panel.color]
+        )
+        for trace in scatter.data:
+            if trace.mode == "markers":
+                trace.marker.size = 10
+                trace.marker.opacity = 0.6
+                trace.marker.line = dict(width=1.5, color="white")
+                trace.hovertemplate = panel.hovertemplate
+            fig.add_trace(trace, row=index // 2 + 1, col=index % 2 + 1)
+    fig.update_layout(**dashboard.LAYOUT)
+    return fig
+
+
+def measure(mode: str, df: pd.DataFrame, max_points: int, scratch: Path) -> tuple[float, int]:
+    started = time.perf_counter()
+    if mode == "subplots":
+        size = len(build_subplots(df).to_json())
+    elif mode == "figure":
+        correlations = correlate(df, resamples=0, permutations=0, spearman=False)
+        size = len(dashboard.figure(df, correlations, max_points).to_json())
+    else:
+        size = dashboard.write_html(df, scratch / "dashboard.html", max_points=max_points)
+    return time.perf_counter() - started, size
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[308, 10_000, 1_000_000])
+    parser.add_argument("--max-points", type=int, default=dashboard.DEFAULT_MAX_POINTS)
+    parser.add_argument("--modes", nargs="+", default=["subplots", "figure", "html"])
+    args = parser.parse_args(argv)
+
+    print(f"{'rows':>10} {'mode':<9} {'seconds':>8} {'payload MiB':>12}")
+    with tempfile.TemporaryDirectory() as scratch:
+        for rows in args.rows:
+            df = synthetic_join_df(rows)
+            for mode in args.modes:
+                try:
+                    seconds, size = measure(mode, df, args.max_points, Path(scratch))
+                except ImportError as exc:
+                    print(f"{rows:>10} {mode:<9} skipped ({exc.name} is not installed)")
+                    continue
+                print(f"{rows:>10} {mode:<9} {seconds:>8.2f} {size / 2**20:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
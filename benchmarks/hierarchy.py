@@ -0,0 +1,153 @@
+"""Compare the single-pass hierarchical rollup with one groupby per level.
+
+Synthetic parishes are spread over municipalities, NUTS III and NUTS II
+regions whose NUTS codes nest as in the INE exports. Each parish has a
+station count, connection points, households and income, a few of them
+missing. Both approaches start from the same parish frame and the same
+reference of units:
+
+* groupby: for each of municipality, NUTS III and NUTS II, group the
+  parishes by the prefix of their code and aggregate.
+* rollup: :func:`scripts.hierarchy.rollup`, one sort and a ``reduceat``
+  per level over the level below.
+
+Both must give the same sums and household-weighted incomes. Parish
+numbers have three digits, so at most ``MAX_PARISHES`` parishes fit.
+The rollup saves the repeated grouping, but both spend most of their
+time on the same merge and conversions. Expect it to be only 1.1-1.6x
+faster.
+
+    python -m benchmarks.hierarchy --parishes 3000 300000 1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from scripts.hierarchy import (
+    CODE,
+    DENSITY,
+    HOUSEHOLDS,
+    INCOME,
+    LEVEL,
+    PARISHES,
+    POINTS,
+    PREFIX_LENGTHS,
+    STATIONS,
+    rollup,
+)
+from scripts.municipalities import KEY, NAME
+
+PER_MUNICIPALITY = 10
+# Districts of up to 30 municipalities keep DICO codes within four digits
+MAX_MUNICIPALITIES = 99 * 30
+MAX_PARISHES = MAX_MUNICIPALITIES * 1000
+
+
+def synthetic_units(parish_count: int, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """A reference of units of every level and the metrics of its parishes."""
+    if parish_count > MAX_PARISHES:
+        raise ValueError(f"at most {MAX_PARISHES} parishes fit three-digit parish numbers")
+    rng = np.random.default_rng(seed)
+    municipality_count = min(max(parish_count // PER_MUNICIPALITY, 1), MAX_MUNICIPALITIES)
+    index = np.arange(municipality_count)
+    dico = (index // 30 + 1) * 100 + index % 30 + 1
+    municipality_codes = np.array([f"1{n2}{n3}{d:04d}" for n2, n3, d in zip(1 + index // 60 % 7, index // 15 % 10, dico)])
+    # Spread evenly, so no municipality has more than a thousand parishes
+    owner = np.arange(parish_count) * municipality_count // parish_count
+    number = np.arange(parish_count) - np.searchsorted(owner, owner)
+    parish_codes = np.char.add(municipality_codes[owner], np.char.zfill(number.astype(str), 3))
+    # Beyond 99 parishes per municipality DICOFRE-style keys would collide, so keep all three digits
+    parish_keys = dico[owner] * 1000 + number
+
+    frames = [
+        pd.DataFrame({LEVEL: "parish", CODE: parish_codes, KEY: parish_keys}),
+        pd.DataFrame({LEVEL: "municipality", CODE: municipality_codes, KEY: dico}),
+    ]
+    for name in ("nuts3", "nuts2"):
+        codes = np.unique(municipality_codes.astype(f"U{PREFIX_LENGTHS[name]}"))
+        frames.append(pd.DataFrame({LEVEL: name, CODE: codes, KEY: pd.NA}))
+    units = pd.concat(frames, ignore_index=True)
+    units = units.assign(
+        **{
+            CODE: units[CODE].astype("string"),
+            KEY: units[KEY].astype("Int32"),
+            NAME: "Unit " + units[CODE],
+            DENSITY: np.round(rng.lognormal(4.3, 1.3, len(units)), 1),
+        }
+    )
+
+    def sometimes_missing(values: np.ndarray, dtype: str) -> pd.array:
+        array = pd.array(values, dtype=dtype)
+        array[rng.random(parish_count) < 0.02] = pd.NA
+        return array
+
+    parishes = pd.DataFrame(
+        {
+            KEY: pd.array(parish_keys, dtype="Int32"),
+            STATIONS: sometimes_missing(rng.poisson(3, parish_count), "Int64"),
+            POINTS: sometimes_missing(rng.poisson(9, parish_count), "Int64"),
+            HOUSEHOLDS: sometimes_missing(rng.integers(200, 30_000, parish_count), "Float64").astype(np.float64),
+            INCOME: sometimes_missing(np.round(rng.normal(22000, 4000, parish_count)), "Float64").astype(np.float64),
+        }
+    ).sample(frac=1, random_state=seed)
+    return units, parishes
+
+
+def per_level(parishes: pd.DataFrame, units: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """The same levels as :func:`scripts.hierarchy.rollup`, with a groupby per level."""
+    frame = units.loc[units[LEVEL] == "parish", [CODE, KEY]].merge(parishes, on=KEY, how="left")
+    weighted = frame[INCOME].notna() & frame[HOUSEHOLDS].notna()
+    frame = frame.assign(
+        income_weighted=(frame[INCOME] * frame[HOUSEHOLDS]).where(weighted, 0.0),
+        income_weight=frame[HOUSEHOLDS].where(weighted, 0.0),
+    )
+    levels = {}
+    for name, length in PREFIX_LENGTHS.items():
+        groups = frame.groupby(frame[CODE].str[:length].rename(CODE), sort=True)
+        df = groups[[HOUSEHOLDS, "income_weighted", "income_weight", STATIONS, POINTS]].sum(min_count=1)
+        df.insert(0, PARISHES, groups.size())
+        df[INCOME] = (df["income_weighted"] / df["income_weight"]).where(df["income_weight"] > 0)
+        levels[name] = df.drop(columns=["income_weighted", "income_weight"]).reset_index()
+    return levels
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--parishes", type=int, nargs="+", default=[3_000, 300_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if max(args.parishes) > MAX_PARISHES:
+        parser.error(f"--parishes: at most {MAX_PARISHES}")
+
+    def best(function, *arguments):
+        seconds = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = function(*arguments)
+            seconds.append(time.perf_counter() - started)
+        return result, min(seconds)
+
+    columns = [PARISHES, HOUSEHOLDS, INCOME, STATIONS, POINTS]
+    print(f"{'parishes':>9} {'munis':>7} {'nuts3':>6} {'nuts2':>6} {'groupby s':>10} {'rollup s':>9} {'speedup':>8}")
+    for count in args.parishes:
+        units, parishes = synthetic_units(count, args.seed)
+        expected, groupby_seconds = best(per_level, parishes, units)
+        levels, rollup_seconds = best(rollup, parishes, units)
+        for name, df in expected.items():
+            pd.testing.assert_frame_equal(
+                levels[name][[CODE, *columns]].astype({CODE: object, STATIONS: "Float64", POINTS: "Float64"}),
+                df[[CODE, *columns]].astype({CODE: object, STATIONS: "Float64", POINTS: "Float64"}),
+                check_dtype=False,
+            )
+        print(
+            f"{count:>9} {len(levels['municipality']):>7} {len(levels['nuts3']):>6} {len(levels['nuts2']):>6} "
+            f"{groupby_seconds:>10.3f} {rollup_seconds:>9.3f} {groupby_seconds / rollup_seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
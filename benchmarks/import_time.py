@@ -0,0 +1,74 @@
+"""Check module import times against a startup budget.
+
+Each module is imported in a fresh interpreter with ``python -X importtime``
+and the cumulative time of its top-level imports is summed. The check fails
+(exit status 1) when a module exceeds its budget or pulls in one of the
+heavy optional dependencies that only the notebook, plots or profiling
+reports need.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 5 scripts.core=0.8
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+# Seconds; the download CLIs must not need pandas at all
+BUDGETS = {
+    "scripts.download_eredes_chargers": 0.5,
+    "scripts.download_arcgis_chargers": 0.5,
+    "scripts.core": 1.0,
+    "scripts.pipeline": 1.0,
+}
+FORBIDDEN = ("ydata_profiling", "plotly", "matplotlib", "scipy", "statsmodels", "marimo")
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+
+def import_time(module: str) -> tuple[float, set[str]]:
+    """Seconds to import ``module`` in a fresh interpreter, and every module it imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total, imported = 0, set()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        imported.add(name)
+        # Nested imports are already included in their top-level parent's cumulative time
+        if len(indent) == 1:
+            total += int(cumulative)
+    return total / 1e6, imported
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("budgets", nargs="*", metavar="MODULE=SECONDS", help="override or add budgets")
+    parser.add_argument("--repeat", type=int, default=3, help="imports per module; the fastest counts")
+    args = parser.parse_args(argv)
+
+    budgets = dict(BUDGETS)
+    for item in args.budgets:
+        module, _, seconds = item.partition("=")
+        budgets[module] = float(seconds)
+
+    failed = False
+    print(f"{'module':<36} {'seconds':>8} {'budget':>7}  heavy imports")
+    for module, budget in budgets.items():
+        runs = [import_time(module) for _ in range(args.repeat)]
+        seconds = min(run[0] for run in runs)
+        heavy = sorted({name.split(".")[0] for name in runs[0][1]} & set(FORBIDDEN))
+        ok = seconds <= budget and not heavy
+        failed |= not ok
+        print(f"{module:<36} {seconds:>8.3f} {budget:>7.2f}  {', '.join(heavy) or '-'}{'' if ok else '  FAIL'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
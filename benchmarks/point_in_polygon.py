@@ -0,0 +1,93 @@
+"""Benchmark point-in-polygon assignment of charger points to municipalities.
+
+Synthetic municipalities are lobed, slightly jagged polygons (one per grid
+cell, ``--vertices`` vertices each, with a hole in every tenth one) laid
+over mainland Portugal's extent. Random points are assigned with
+:class:`scripts.boundaries.Boundaries` and a sample is checked against a
+plain per-point ray cast.
+
+    python -m benchmarks.point_in_polygon --points 1000000 2000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from scripts.boundaries import Boundaries
+
+EXTENT = (-9.6, 36.9, -6.1, 42.2)
+
+
+def synthetic_rings(rows: int, cols: int, vertices: int, seed: int = 0) -> list[list[np.ndarray]]:
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = EXTENT
+    width, height = (xmax - xmin) / cols, (ymax - ymin) / rows
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    rings = []
+    for i in range(rows * cols):
+        cx = xmin + (i % cols + 0.5) * width
+        cy = ymin + (i // cols + 0.5) * height
+        # Smooth lobes plus a little per-vertex jitter, like a real (if simplified) coastline or border
+        phases = rng.uniform(0, 2 * np.pi, 3)
+        lobes = sum(np.sin(k * angles + phase) for k, phase in zip((3, 5, 11), phases)) / 3
+        radius = 0.5 * (0.8 + 0.15 * lobes + 0.02 * rng.random(vertices))
+        outer = np.column_stack((cx + radius * width * np.cos(angles), cy + radius * height * np.sin(angles)))
+        feature = [outer]
+        if i % 10 == 0:
+            hole = np.column_stack((cx + 0.1 * width * np.cos(angles[::-8]), cy + 0.1 * height * np.sin(angles[::-8])))
+            feature.append(hole)
+        rings.append(feature)
+    return rings
+
+
+def ray_cast(x: float, y: float, rings: list[np.ndarray]) -> bool:
+    inside = False
+    for ring in rings:
+        for (x1, y1), (x2, y2) in zip(ring, np.roll(ring, -1, axis=0)):
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+    return inside
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--grid", type=int, nargs=2, default=[18, 17], help="rows and columns of municipalities")
+    parser.add_argument("--vertices", type=int, default=2000)
+    parser.add_argument("--check", type=int, default=200, help="points verified against a plain ray cast")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rows, cols = args.grid
+    rings = synthetic_rings(rows, cols, args.vertices)
+    boundaries = Boundaries(keys=np.arange(len(rings)), names=[f"M{i}" for i in range(len(rings))], rings=rings)
+    print(f"{len(boundaries)} boundaries x {args.vertices} vertices prepared in {time.perf_counter() - started:.2f}s")
+
+    rng = np.random.default_rng(1)
+    xmin, ymin, xmax, ymax = EXTENT
+    print(f"{'points':>10} {'seconds':>8} {'points/s':>12} {'assigned':>9}")
+    for n in args.points:
+        x = rng.uniform(xmin, xmax, n)
+        y = rng.uniform(ymin, ymax, n)
+        started = time.perf_counter()
+        located = boundaries.locate(x, y)
+        elapsed = time.perf_counter() - started
+        print(f"{n:>10} {elapsed:>8.2f} {n / elapsed:>12.0f} {np.mean(located >= 0):>9.1%}")
+
+    x = rng.uniform(xmin, xmax, args.check)
+    y = rng.uniform(ymin, ymax, args.check)
+    located = boundaries.locate(x, y)
+    mismatches = 0
+    for i in range(args.check):
+        expected = -1
+        for feature, (bxmin, bymin, bxmax, bymax) in enumerate(boundaries.bbox):
+            if bxmin <= x[i] <= bxmax and bymin <= y[i] <= bymax and ray_cast(x[i], y[i], rings[feature]):
+                expected = feature
+                break
+        mismatches += expected != located[i]
+    print(f"{mismatches} mismatches in {args.check} checked points")
+
+
+if __name__ == "__main__":
+    main()
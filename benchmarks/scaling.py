@@ -0,0 +1,214 @@
+"""Measure how the join_df pipeline scales with input size.
+
+For each size, synthetic E-REDES, INE density and INE income files with that
+many data rows are generated (see :mod:`benchmarks.synthetic`; the income
+workbook is capped at one Excel sheet) and the notebook's steps are run as
+stages:
+
+    parse_eredes   read the E-REDES CSV
+    parse_density  read the INE density tabulator CSV
+    parse_income   read the INE income workbook
+    clean          latest quarter, municipality index, column selection
+    aggregate      stations and connection points per municipality
+    join           keyed outer join and inner selection
+    rank           rank columns (plot_df)
+    plot_prep      slope chart frames, top-N counts and scatter trendlines
+
+Each stage records wall time (best of ``--repeat`` runs), rows in and out,
+and its peak traced allocation from a separate run under ``tracemalloc``,
+so tracing does not distort the timings. Results are written as JSON, and
+with ``--baseline`` any stage slower or hungrier than the baseline by more
+than ``--tolerance`` makes the command exit with status 1.
+
+    python -m benchmarks.scaling --sizes 1000 10000 100000 1000000
+    python -m benchmarks.scaling --output baseline.json
+    python -m benchmarks.scaling --baseline baseline.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import EXCEL_MAX_ROWS, write_sources
+from scripts import core, eredes, ine, ranking
+from scripts.municipalities import MunicipalityIndex
+
+STAGES = ("parse_eredes", "parse_density", "parse_income", "clean", "aggregate", "join", "rank", "plot_prep")
+RESULTS_DIR = Path("benchmarks/results")
+# Differences below these floors are noise, whatever the relative change
+MIN_SECONDS = 0.05
+MIN_BYTES = 4 * 1024 * 1024
+
+
+@dataclass
+class StageResult:
+    size: int
+    stage: str
+    seconds: float
+    rows_in: int
+    rows_out: int
+    peak_bytes: int | None = None
+
+
+def _rows(value) -> int:
+    if isinstance(value, (tuple, list)):
+        return sum(_rows(item) for item in value)
+    return len(value) if hasattr(value, "__len__") else 1
+
+
+def clean(raw: pd.DataFrame, density: pd.DataFrame, income: pd.DataFrame):
+    latest = raw[raw[eredes.QUARTER_COLUMN] == raw[eredes.QUARTER_COLUMN].max()]
+    density = density.rename(columns={"Região": "Concelho"})[["Código_NUTS", "Concelho", "Densidade_Populacional_km2"]]
+    income = income.filter(["Concelho", ine.INCOME_CODE_COLUMN, ine.INCOME_COLUMN])
+    return latest, density, income, MunicipalityIndex.from_frame(density)
+
+
+def plot_prep(plot_df: pd.DataFrame) -> list:
+    frames = [
+        ranking.slope_chart_frame(plot_df, "points", "income"),
+        ranking.slope_chart_frame(plot_df, "points", "density"),
+        ranking.top_n_counts(plot_df, include=["income", "density"], exclude=["points"]).to_frame(),
+    ]
+    for x in ("income", "density"):
+        for y in ("stations", "points"):
+            pair = plot_df[[ranking.METRICS[x], ranking.METRICS[y]]].dropna().to_numpy(dtype=np.float64)
+            slope, intercept = np.polyfit(pair[:, 0], pair[:, 1], 1)
+            line_x = np.array([pair[:, 0].min(), pair[:, 0].max()])
+            frames.append(pd.DataFrame({"x": line_x, "y": slope * line_x + intercept}))
+    return frames
+
+
+def run_stages(size: int, paths: dict[str, Path], trace: bool = False) -> list[StageResult]:
+    """Run every stage once, timing it (or tracing its allocations when ``trace``)."""
+    results = []
+
+    def measure(stage: str, rows_in: int, func: Callable, *args):
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        output = func(*args)
+        seconds = time.perf_counter() - started
+        peak = None
+        if trace:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results.append(StageResult(size, stage, seconds, rows_in, _rows(output), peak))
+        return output
+
+    raw = measure("parse_eredes", size, lambda: pd.read_csv(paths["eredes"], sep=";"))
+    density = measure("parse_density", size, lambda: ine.read_density(paths["density"]).data)
+    income = measure(
+        "parse_income", min(size, EXCEL_MAX_ROWS), lambda: ine.read_income(paths["income"], cache_dir=None)
+    )
+    latest, density, income, index = measure("clean", _rows((raw, density, income)), clean, raw, density, income)
+    chargers = measure("aggregate", len(latest), eredes.aggregate_by_municipality, latest, index)
+    join_df = measure(
+        "join",
+        _rows((income, density, chargers)),
+        lambda: core.join(core.join_outer(income, density, chargers)),
+    )
+    plot_df = measure("rank", len(join_df), core.rank, join_df)
+    measure("plot_prep", len(plot_df), plot_prep, plot_df)
+    return results
+
+
+def benchmark(size: int, paths: dict[str, Path], repeat: int = 1, memory: bool = True) -> list[StageResult]:
+    runs = [run_stages(size, paths) for _ in range(repeat)]
+    best = [min(stage_runs, key=lambda result: result.seconds) for stage_runs in zip(*runs)]
+    if memory:
+        for result, traced in zip(best, run_stages(size, paths, trace=True)):
+            result.peak_bytes = traced.peak_bytes
+    return best
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    """Regressions of ``results`` against ``baseline``, as human-readable lines."""
+    reference = {(item["size"], item["stage"]): item for item in baseline}
+    regressions = []
+    for item in results:
+        base = reference.get((item["size"], item["stage"]))
+        if base is None:
+            continue
+        for field, floor in (("seconds", MIN_SECONDS), ("peak_bytes", MIN_BYTES)):
+            new, old = item.get(field), base.get(field)
+            if new is None or old is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append(
+                    f"{item['stage']} at {item['size']} rows: {field} {old:.4g} -> {new:.4g} (+{new / old - 1:.0%})"
+                )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--municipalities", type=int, default=308)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size; the fastest counts")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--data-dir", type=Path, help="keep generated inputs here between runs")
+    parser.add_argument("--output", type=Path, help="results JSON (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, help="fail on regressions against this results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown or growth")
+    args = parser.parse_args(argv)
+
+    # Unresolved synthetic names are expected; their warnings would drown the table
+    logging.basicConfig(level=logging.ERROR)
+    created = datetime.now(timezone.utc)
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        data_dir = args.data_dir or Path(scratch)
+        print(f"{'rows':>10} {'stage':<13} {'seconds':>8} {'rows in':>10} {'rows out':>9} {'peak MiB':>9}")
+        for size in args.sizes:
+            started = time.perf_counter()
+            paths = write_sources(data_dir, size, args.municipalities, args.seed)
+            print(f"{size:>10} {'generate':<13} {time.perf_counter() - started:>8.2f}", file=sys.stderr)
+            for result in benchmark(size, paths, args.repeat, memory=not args.no_memory):
+                peak = "" if result.peak_bytes is None else f"{result.peak_bytes / 2**20:.1f}"
+                print(
+                    f"{size:>10} {result.stage:<13} {result.seconds:>8.3f} "
+                    f"{result.rows_in:>10} {result.rows_out:>9} {peak:>9}"
+                )
+                results.append(asdict(result))
+
+    output = args.output or RESULTS_DIR / f"scaling-{created:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "created": created.isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "municipalities": args.municipalities,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    output.write_text(json.dumps(document, indent=2))
+    print(f"results written to {output}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
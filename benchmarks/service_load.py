@@ -0,0 +1,174 @@
+"""Load-test the metrics query service and report requests per second and latency percentiles.
+
+Without ``--url`` a server is started in a subprocess on a synthetic ranked
+``join_df`` (see :func:`benchmarks.synthetic.join_df`), once with the
+response cache and once without (``--cache-size 0``), so both are
+measured under the same load. Each client thread holds one keep-alive
+connection and sends a seeded mix of requests:
+
+* municipality lookups by code and by name
+* top-N queries for every metric
+* ``/gaps`` queries
+
+The client runs on the same machine as the server, so the figures
+include its overhead.
+
+    python -m benchmarks.service_load --duration 10 --concurrency 8
+    python -m benchmarks.service_load --url http://127.0.0.1:8000
+"""
+
+import argparse
+import http.client
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+from benchmarks.synthetic import join_df, municipalities
+from scripts.ranking import METRICS
+
+
+def targets(munis, count: int, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    choices = []
+    for _ in range(count):
+        kind = rng.choice(["code", "name", "top", "gaps"], p=[0.4, 0.2, 0.25, 0.15])
+        row = munis.iloc[rng.integers(len(munis))]
+        if kind == "code":
+            choices.append(f"/municipalities/{row['dico']}")
+        elif kind == "name":
+            choices.append(f"/municipalities/{quote(row['Concelho'])}")
+        elif kind == "top":
+            choices.append(f"/top?metric={rng.choice(list(METRICS))}&n={rng.integers(1, 51)}")
+        else:
+            choices.append(f"/gaps?n={rng.integers(1, 51)}")
+    return choices
+
+
+def _client(host: str, port: int, paths: list[str], deadline: float, latencies: list[float], errors: list[int]) -> None:
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    index = 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if response.status != 200:
+            errors.append(response.status)
+    connection.close()
+
+
+def load(url: str, paths: list[str], duration: float, concurrency: int) -> dict:
+    parts = urlsplit(url)
+    deadline = time.perf_counter() + duration
+    per_thread = [([], []) for _ in range(concurrency)]
+    threads = [
+        threading.Thread(
+            target=_client,
+            args=(parts.hostname, parts.port, paths[offset::concurrency], deadline, latencies, errors),
+        )
+        for offset, (latencies, errors) in enumerate(per_thread)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies = np.array([value for latencies, _ in per_thread for value in latencies])
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": sum(len(errors) for _, errors in per_thread),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": p50,
+        "p90_ms": p90,
+        "p99_ms": p99,
+        "max_ms": latencies.max() * 1000,
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30) -> None:
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=1)
+            connection.request("GET", "/health")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+        time.sleep(0.1)
+
+
+def serve(artifact: Path, cache_size: int) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "scripts.service",
+            "--artifact", str(artifact),
+            "--port", str(port),
+            "--cache-size", str(cache_size),
+        ],
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    _wait_ready(url)
+    return process, url
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--municipalities", type=int, default=308)
+    parser.add_argument("--distinct", type=int, default=2000, help="distinct request targets in the mix")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    munis = municipalities(args.municipalities, args.seed)
+    paths = targets(munis, args.distinct, args.seed)
+    print(f"{'server':<10} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>7} {'p90 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+
+    def show(label: str, result: dict) -> None:
+        print(
+            f"{label:<10} {result['requests']:>9} {result['errors']:>7} {result['rps']:>8.0f} "
+            f"{result['p50_ms']:>7.2f} {result['p90_ms']:>7.2f} {result['p99_ms']:>7.2f} {result['max_ms']:>7.2f}"
+        )
+
+    if args.url:
+        show("remote", load(args.url, paths, args.duration, args.concurrency))
+        return
+
+    with tempfile.TemporaryDirectory() as scratch:
+        artifact = Path(scratch) / "join_df.parquet"
+        join_df(munis, args.seed).to_parquet(artifact, index=False)
+        for label, cache_size in (("cached", 4096), ("uncached", 0)):
+            process, url = serve(artifact, cache_size)
+            try:
+                show(label, load(url, paths, args.duration, args.concurrency))
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare lazy (CELF) and naive greedy charger siting.
+
+Synthetic demand is a population grid over mainland Portugal's extent.
+Population is concentrated around a few dozen city centres with
+heavy-tailed sizes. Cell populations are integers, and a second run uses
+them scaled by a random non-integer factor per cell, as
+:func:`scripts.siting.density_grid` weights are. With either weights both
+greedy variants must pick the same sites and stop once all demand is
+covered. Existing chargers sit near the largest centres. Candidates are
+the demand points. Coverage is built once and both variants run on it for
+every ``k``.
+
+    python -m benchmarks.siting --cells 20000 50000 --k 10 100 1000 5000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.point_in_polygon import EXTENT
+from scripts.siting import coverage, greedy
+from scripts.spatial import ChargerIndex
+
+
+def synthetic_demand(cells: int, centres: int = 40, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = EXTENT
+    lon = rng.uniform(xmin, xmax, cells)
+    lat = rng.uniform(ymin, ymax, cells)
+    centre_lon = rng.uniform(xmin, xmax, centres)
+    centre_lat = rng.uniform(ymin, ymax, centres)
+    size = rng.pareto(1.2, centres) + 1
+    # Squared distance in degrees to every centre, chunked by cell
+    population = np.zeros(cells)
+    for start in range(0, cells, 100_000):
+        chunk = slice(start, start + 100_000)
+        d2 = (lon[chunk, None] - centre_lon) ** 2 + (lat[chunk, None] - centre_lat) ** 2
+        population[chunk] = (size * np.exp(-d2 / 0.02)).sum(axis=1)
+    population = np.round(population / population.mean() * 300 + rng.poisson(20, cells))
+    return pd.DataFrame({"lon": lon, "lat": lat, "population": population})
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cells", type=int, nargs="+", default=[20_000])
+    parser.add_argument("--k", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--radius-km", type=float, default=5.0)
+    parser.add_argument("--chargers", type=int, default=500, help="existing chargers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(
+        f"{'cells':>8} {'nnz':>10} {'k':>6} {'weights':<8} {'mode':<6} {'seconds':>8} {'sites':>6} "
+        f"{'evaluations':>12} {'covered %':>9} {'speedup':>8}"
+    )
+    for cells in args.cells:
+        demand = synthetic_demand(cells, seed=args.seed)
+        # Existing chargers at the most populated cells, jittered
+        rng = np.random.default_rng(args.seed + 1)
+        top = demand.nlargest(args.chargers, "population")
+        chargers = pd.DataFrame(
+            {"lon": top["lon"] + rng.normal(0, 0.02, len(top)), "lat": top["lat"] + rng.normal(0, 0.02, len(top))}
+        )
+        served = ChargerIndex.from_frame(chargers).count_within(demand["lon"], demand["lat"], args.radius_km) > 0
+        population = demand["population"].to_numpy()
+        weight_kinds = {
+            "integer": np.where(served, 0.0, population),
+            "float": np.where(served, 0.0, population * rng.uniform(0.5, 1.5, cells)),
+        }
+
+        started = time.perf_counter()
+        cover = coverage(demand["lon"], demand["lat"], demand["lon"], demand["lat"], args.radius_km)
+        print(f"{cells:>8} {cover.nnz:>10} {'':>6} {'build':<6} {time.perf_counter() - started:>8.2f}")
+        for kind, weights in weight_kinds.items():
+            total = weights.sum()
+            for k in args.k:
+                results = {}
+                for mode, lazy in (("naive", False), ("celf", True)):
+                    started = time.perf_counter()
+                    selection = greedy(cover, weights, k, lazy=lazy)
+                    results[mode] = (time.perf_counter() - started, selection)
+                naive, celf = results["naive"][1], results["celf"][1]
+                if not np.array_equal(naive.sites, celf.sites):
+                    raise AssertionError(f"CELF and naive greedy disagree at k={k} with {kind} weights")
+                if not (celf.gains > 0).all():
+                    raise AssertionError(f"CELF selected a site without gain at k={k} with {kind} weights")
+                for mode, (seconds, selection) in results.items():
+                    speedup = results["naive"][0] / seconds
+                    covered = 100 * (total - selection.remaining) / total
+                    print(
+                        f"{cells:>8} {cover.nnz:>10} {k:>6} {kind:<8} {mode:<6} {seconds:>8.3f} {len(selection.sites):>6} "
+                        f"{selection.evaluations:>12} {covered:>9.1f} {speedup:>7.1f}x"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Seeded synthetic versions of the E-REDES, INE density and INE income files.
+
+The generated files have the layout the readers in :mod:`scripts` expect
+from the real downloads, so benchmarks exercise the same parsing, name
+resolution and filtering paths:
+
+* the E-REDES export is a ``;``-separated CSV with one row per charging
+  station and quarter. A few rows have no ``CodDistritoConcelho`` and an
+  upper-cased, accent-stripped or misspelled ``Concelho``.
+* the density export is an INE tabulator CSV with metadata lines, NUTS
+  aggregate rows, the year only on the first row of each year, decimal
+  commas, ``x`` for confidential values and a source footer. Rows beyond the
+  municipalities are parish rows, as in parish-level extracts.
+* the income workbook has a title row, a header row and rows for every
+  territorial level, of which only ``Município`` rows are read.
+
+The same ``seed`` always produces the same files.
+"""
+
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.eredes import CODE_COLUMN, POINTS_COLUMN, QUARTER_COLUMN
+from scripts.ine import INCOME_CODE_COLUMN, INCOME_COLUMN, INCOME_SHEET
+from scripts.municipalities import KEY, NAME
+from scripts.ranking import add_ranks
+
+# Rows per sheet in .xlsx files, minus the title and header rows
+EXCEL_MAX_ROWS = 1_048_576 - 2
+
+_SYLLABLES = ["vi", "la", "no", "va", "sa", "ma", "ri", "to", "fa", "ro", "ca", "mi", "ra", "gão", "ção", "çal"]
+_SUFFIXES = ["", "", "", " de Basto", " do Castelo", " da Beira", " de Sá", " a Velha", " dos Arcos"]
+
+
+def _strip_accents(name: str) -> str:
+    return unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+
+
+def municipalities(count: int = 308, seed: int = 0) -> pd.DataFrame:
+    """Municipalities with NUTS codes, unique names, density and income."""
+    rng = np.random.default_rng(seed)
+    names: list[str] = []
+    folded: set[str] = set()
+    while len(names) < count:
+        stem = "".join(rng.choice(_SYLLABLES, rng.integers(2, 5)))
+        name = stem.capitalize() + _SUFFIXES[rng.integers(len(_SUFFIXES))]
+        if _strip_accents(name).lower() not in folded:
+            folded.add(_strip_accents(name).lower())
+            names.append(name)
+
+    # Districts of up to 30 municipalities: DICO codes 0101, 0102, ..., 0201, ...
+    index = np.arange(count)
+    dico = (index // 30 + 1) * 100 + index % 30 + 1
+    nuts2 = 1 + index // 60 % 7
+    nuts3 = index // 15 % 10
+    return pd.DataFrame(
+        {
+            "Código_NUTS": [f"1{n2}{n3}{d:04d}" for n2, n3, d in zip(nuts2, nuts3, dico)],
+            "dico": dico,
+            NAME: names,
+            "density": np.round(rng.lognormal(4.3, 1.3, count), 1),
+            "income": np.round(rng.normal(22000, 4000, count), 0),
+        }
+    )
+
+
+def quarters(count: int, last: str = "2025T3") -> list[str]:
+    stop = int(last[:4]) * 4 + int(last[-1]) - 1
+    return [f"{q // 4}T{q % 4 + 1}" for q in range(stop - count + 1, stop + 1)]
+
+
+def eredes_export(munis: pd.DataFrame, rows: int, quarter_count: int = 8, seed: int = 0) -> pd.DataFrame:
+    """Charger rows spread over municipalities with a heavy-tailed popularity."""
+    rng = np.random.default_rng(seed + 1)
+    weights = 1 / np.arange(1, len(munis) + 1) ** 0.8
+    owner = rng.choice(len(munis), size=rows, p=weights / weights.sum())
+    names = munis[NAME].to_numpy(dtype=object)[owner]
+
+    # About 1% of rows lose their code and are written upper-cased, unaccented or with a typo
+    no_code = rng.random(rows) < 0.01
+    noisy = np.flatnonzero(no_code)
+    variants = {
+        "upper": np.vectorize(str.upper, otypes=[object]),
+        "ascii": np.vectorize(_strip_accents, otypes=[object]),
+        "typo": np.vectorize(lambda name: name[:-1] if len(name) > 8 else name, otypes=[object]),
+    }
+    for i, transform in enumerate(variants.values()):
+        picked = noisy[i::3]
+        if len(picked):
+            names[picked] = transform(names[picked])
+
+    codes = pd.array(munis["dico"].to_numpy()[owner], dtype="Int32")
+    codes[no_code] = pd.NA
+    return pd.DataFrame(
+        {
+            QUARTER_COLUMN: pd.Categorical.from_codes(
+                np.sort(rng.integers(0, quarter_count, rows)), quarters(quarter_count)
+            ),
+            "Distrito": np.array([f"Distrito {code // 100}" for code in munis["dico"]], dtype=object)[owner],
+            NAME: names,
+            CODE_COLUMN: codes,
+            "Nível de Tensão": rng.choice(["Baixa Tensão", "Média Tensão"], rows, p=[0.9, 0.1]),
+            POINTS_COLUMN: rng.geometric(0.35, rows),
+        }
+    )
+
+
+def join_df(munis: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """A ranked ``join_df`` for ``munis``, with charger counts loosely following density and income."""
+    rng = np.random.default_rng(seed + 2)
+    stations = np.maximum(
+        0, np.round(0.8 * np.log1p(munis["density"]) * munis["income"] / 5000 + rng.normal(0, 4, len(munis)))
+    ).astype(np.int64)
+    df = pd.DataFrame(
+        {
+            KEY: pd.array(munis["dico"], dtype="Int32"),
+            NAME: munis[NAME],
+            INCOME_COLUMN: munis["income"],
+            "Densidade_Populacional_km2": munis["density"],
+            "num_charging_stations": stations,
+            "total_charging_points": stations * 3 + rng.poisson(2, len(munis)),
+        }
+    )
+    return add_ranks(df)
+
+
+def write_eredes_csv(munis: pd.DataFrame, path: str | Path, rows: int, seed: int = 0) -> None:
+    eredes_export(munis, rows, seed=seed).to_csv(path, sep=";", index=False)
+
+
+def _decimal(value: float) -> str:
+    return f"{value:.1f}".replace(".", ",")
+
+
+def write_density_csv(munis: pd.DataFrame, path: str | Path, rows: int, years=(2024, 2023), seed: int = 0) -> None:
+    """INE tabulator export with ``rows`` data rows split over ``years``."""
+    rng = np.random.default_rng(seed + 2)
+    regions = ["PT: Portugal", "1: Continente"]
+    regions += sorted({f"1{code[1]}: NUTS II {code[1]}" for code in munis["Código_NUTS"]})
+    regions += sorted({f"1{code[1:3]}: NUTS III {code[1:3]}" for code in munis["Código_NUTS"]})
+    per_year = max(rows // len(years), len(regions) + len(munis))
+    extra = per_year - len(regions) - len(munis)
+    parishes = extra // len(munis) + (np.arange(len(munis)) < extra % len(munis))
+
+    with open(path, "w", encoding="latin-1", errors="replace", newline="") as f:
+        f.write("Densidade populacional (N.º/ km²) por Local de residência (NUTS - 2024); Anual\n")
+        f.write("Fonte: INE, Estimativas Anuais da População Residente\n\n")
+        f.write(
+            "Período de referência dos dados;Local de residência (NUTS - 2024);"
+            "Densidade populacional (N.º/ km²);Cidades;Freguesias;Vilas;\n"
+        )
+        for year in years:
+            density = munis["density"].to_numpy() * rng.uniform(0.97, 1.03, len(munis))
+            lines = [f";{region};{_decimal(rng.uniform(20, 400))};;;;" for region in regions]
+            rows_iter = munis[["Código_NUTS", NAME]].itertuples(index=False)
+            for (code, name), value, count in zip(rows_iter, density, parishes):
+                towns = "x" if rng.random() < 0.05 else rng.integers(0, 4)
+                lines.append(f";{code}: {name};{_decimal(value)};{rng.integers(0, 3)};{count};{towns};")
+                for parish in range(count):
+                    lines.append(f";{code}{parish:03d}: Freguesia {parish + 1} ({name});{_decimal(value * 0.8)};;;;")
+            lines[0] = f"{year}{lines[0]}"
+            f.write("\n".join(lines) + "\n")
+        f.write("\nÚltima atualização destes dados: 14 de junho de 2025\n")
+        f.write("Documentos metodológicos: https://www.ine.pt\n")
+
+
+def write_income_workbook(munis: pd.DataFrame, path: str | Path, rows: int, seed: int = 0) -> None:
+    """Income workbook with ``rows`` data rows (at most one Excel sheet's worth)."""
+    from openpyxl import Workbook
+
+    rng = np.random.default_rng(seed + 3)
+    rows = min(max(rows, len(munis) + 1), EXCEL_MAX_ROWS)
+    parishes = -(-(rows - len(munis) - 1) // len(munis))
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(INCOME_SHEET)
+    sheet.append(["Rendimento bruto declarado dos agregados fiscais, 2023"])
+    sheet.append(
+        [
+            INCOME_CODE_COLUMN,
+            "Designação",
+            "Nível territorial",
+            "Número de agregados fiscais",
+            INCOME_COLUMN,
+            "Rendimento bruto declarado mediano por agregado fiscal",
+        ]
+    )
+    sheet.append(["PT", "Portugal", "País", 5_400_000, 21000.0, 17000.0])
+    written = 1
+    for dico, name, income in munis[["dico", NAME, "income"]].itertuples(index=False):
+        households = int(rng.integers(2_000, 300_000))
+        sheet.append([f"{dico:04d}", name, "Município", households, float(income), round(income * 0.8)])
+        written += 1
+        for parish in range(parishes):
+            if written >= rows:
+                break
+            sheet.append(
+                [f"{dico:04d}{parish:02d}", f"Freguesia {parish + 1}", "Freguesia", households // 10, income, None]
+            )
+            written += 1
+    workbook.save(path)
+
+
+def write_sources(directory: str | Path, rows: int, municipality_count: int = 308, seed: int = 0) -> dict[str, Path]:
+    """Write all three sources with ``rows`` data rows each; reuses files from an earlier call."""
+    directory = Path(directory) / f"rows={rows}-municipalities={municipality_count}-seed={seed}"
+    paths = {
+        "eredes": directory / "eredes.csv",
+        "density": directory / "ine_densidade_populacional.csv",
+        "income": directory / "ERendimentoNLocal2023.xlsx",
+    }
+    done = directory / ".complete"
+    if done.exists():
+        return paths
+
+    directory.mkdir(parents=True, exist_ok=True)
+    munis = municipalities(municipality_count, seed)
+    write_eredes_csv(munis, paths["eredes"], rows, seed)
+    write_density_csv(munis, paths["density"], rows, seed=seed)
+    write_income_workbook(munis, paths["income"], rows, seed)
+    done.touch()
+    return paths
@@ -0,0 +1,95 @@
+"""Time full and incremental tile pyramid builds and report tile sizes per zoom.
+
+Synthetic chargers cluster around a few dozen centres over mainland
+Portugal's extent, each with 1-8 connection points. After a full build,
+``--change`` chargers get one more connection point and as many new
+chargers are added. The incremental rebuild is then timed and compared
+with a full rebuild of the same data: both must leave identical tiles.
+
+    python -m benchmarks.tiles --chargers 200000 --max-zoom 14 --format bin
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.point_in_polygon import EXTENT
+from scripts.tiles import build
+
+
+def synthetic_chargers(count: int, centres: int = 40, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = EXTENT
+    centre = rng.integers(centres, size=count)
+    centre_lon = rng.uniform(xmin, xmax, centres)
+    centre_lat = rng.uniform(ymin, ymax, centres)
+    spread = rng.uniform(0.02, 0.3, centres)
+    return pd.DataFrame(
+        {
+            "lon": np.clip(rng.normal(centre_lon[centre], spread[centre]), xmin, xmax),
+            "lat": np.clip(rng.normal(centre_lat[centre], spread[centre]), ymin, ymax),
+            "points": rng.integers(1, 9, count),
+        }
+    )
+
+
+def _tiles(directory: Path) -> dict[str, bytes]:
+    return {
+        str(path.relative_to(directory)): path.read_bytes()
+        for path in directory.rglob("*")
+        if path.is_file() and path.parts[len(directory.parts)].isdigit()
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chargers", type=int, default=200_000)
+    parser.add_argument("--change", type=int, default=100, help="chargers changed and added before the rebuild")
+    parser.add_argument("--max-zoom", type=int, default=14)
+    parser.add_argument("--grid-bits", type=int, default=6)
+    parser.add_argument("--format", choices=("json", "bin"), default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    chargers = synthetic_chargers(args.chargers, seed=args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    changed = chargers.copy()
+    changed.loc[rng.choice(len(changed), args.change, replace=False), "points"] += 1
+    changed = pd.concat([changed, synthetic_chargers(args.change, seed=args.seed + 2)], ignore_index=True)
+    options = {"max_zoom": args.max_zoom, "grid_bits": args.grid_bits, "fmt": args.format, "points_column": "points"}
+
+    with tempfile.TemporaryDirectory() as scratch:
+        incremental, rebuilt = Path(scratch) / "incremental", Path(scratch) / "full"
+        started = time.perf_counter()
+        full_reports = build(chargers, incremental, **options)
+        full_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        reports = build(changed, incremental, **options)
+        incremental_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        build(changed, rebuilt, **options)
+        rebuild_seconds = time.perf_counter() - started
+        assert _tiles(incremental) == _tiles(rebuilt), "incremental build differs from a full rebuild"
+
+    print(
+        f"{'zoom':>4} {'clusters':>9} {'tiles':>8} {'KiB':>9} {'mean B':>8} {'max B':>8} {'full s':>8} "
+        f"{'written':>8} {'deleted':>8} {'incr s':>8}"
+    )
+    for full, report in zip(full_reports, reports):
+        print(
+            f"{report.zoom:>4} {report.clusters:>9} {report.tiles:>8} {report.tile_bytes / 1024:>9.1f} "
+            f"{report.tile_bytes / max(report.tiles, 1):>8.0f} {report.max_tile_bytes:>8} {full.seconds:>8.3f} "
+            f"{report.written:>8} {report.deleted:>8} {report.seconds:>8.3f}"
+        )
+    print(
+        f"full build {full_seconds:.2f}s, incremental rebuild {incremental_seconds:.2f}s, "
+        f"full rebuild {rebuild_seconds:.2f}s ({rebuild_seconds / incremental_seconds:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Data acquisition and integration toolkit for EV charger analysis."""
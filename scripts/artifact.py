@@ -0,0 +1,142 @@
+"""Versioned Arrow IPC artifacts of the integrated dataset, read through memory maps.
+
+``run-pipeline --publish`` writes the ranked ``join_df`` (the notebook's
+``plot_df``) once. Notebook sessions, CLIs and the metrics service then
+load that file instead of rebuilding the frame from the three raw
+sources. Each dataset has its own directory:
+
+    data/published/join_df/
+        manifest.json       {"name": "join_df", "version": 3, "file": "v000003.arrow", ...}
+        v000002.arrow
+        v000003.arrow
+
+Files use the uncompressed Arrow IPC file format, so :func:`open_table`
+can memory-map one and hand out Arrow buffers that point straight into
+the OS page cache. Every process that maps the same version shares one
+copy of its pages instead of holding private frames. :func:`read`
+converts to pandas with ``split_blocks=True``:
+
+* numeric columns without missing values stay views of the mapping
+* strings and nullable integer columns are converted into private memory
+
+With ``arrow_dtypes=True`` every column is backed by the mapping, as
+``pd.ArrowDtype``.
+
+Publishing never changes a file that a reader may have mapped. A new
+version is written to a temporary file and renamed into place. Only then
+is the manifest replaced, also by rename. A reader therefore sees either
+the old manifest or the new one, and both name a complete file. Publishing
+a frame equal to the current version is a no-op. The newest ``keep``
+versions are kept, so readers that mapped an older one can finish with it.
+"""
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import pandas as pd
+
+DEFAULT_DIR = Path("data/published")
+DEFAULT_NAME = "join_df"
+DEFAULT_KEEP = 3
+MANIFEST = "manifest.json"
+
+
+@dataclass
+class Version:
+    """One entry of a dataset's manifest."""
+
+    name: str
+    version: int
+    file: str
+    rows: int
+    columns: list[str]
+    digest: str
+    published_at: float
+
+
+def dataset_dir(directory: str | Path = DEFAULT_DIR, name: str = DEFAULT_NAME) -> Path:
+    return Path(directory) / name
+
+
+def latest(directory: str | Path = DEFAULT_DIR, name: str = DEFAULT_NAME) -> Version | None:
+    """The newest published version of ``name``, or ``None`` before the first publish."""
+    path = dataset_dir(directory, name) / MANIFEST
+    try:
+        return Version(**json.loads(path.read_text()))
+    except FileNotFoundError:
+        return None
+
+
+def _replace(tmp_path: Path, path: Path) -> None:
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def publish(
+    df: pd.DataFrame,
+    directory: str | Path = DEFAULT_DIR,
+    name: str = DEFAULT_NAME,
+    keep: int = DEFAULT_KEEP,
+) -> Version:
+    """Write ``df`` as the next version of ``name`` and point the manifest at it."""
+    import pyarrow as pa
+
+    from scripts.cache import frame_digest
+
+    target = dataset_dir(directory, name)
+    target.mkdir(parents=True, exist_ok=True)
+    digest = frame_digest(df)
+    current = latest(directory, name)
+    if current is not None and current.digest == digest and (target / current.file).exists():
+        return current
+
+    number = (current.version if current is not None else 0) + 1
+    version = Version(name, number, f"v{number:06d}.arrow", len(df), [str(c) for c in df.columns], digest, time.time())
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = target / (version.file + ".tmp")
+    with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    _replace(tmp_path, target / version.file)
+
+    manifest_tmp = target / (MANIFEST + ".tmp")
+    manifest_tmp.write_text(json.dumps(asdict(version), indent=2))
+    _replace(manifest_tmp, target / MANIFEST)
+
+    versions = sorted(target.glob("v*.arrow"))
+    for old in versions[: max(len(versions) - keep, 0)]:
+        old.unlink()
+    return version
+
+
+def open_table(directory: str | Path = DEFAULT_DIR, name: str = DEFAULT_NAME, version: Version | None = None):
+    """The published table as a ``pyarrow.Table`` over a memory map of its file (latest version by default)."""
+    import pyarrow as pa
+
+    version = version or latest(directory, name)
+    if version is None:
+        raise FileNotFoundError(f"Nothing published as {name!r} in {directory}")
+    source = pa.memory_map(str(dataset_dir(directory, name) / version.file))
+    return pa.ipc.open_file(source).read_all()
+
+
+def read(
+    directory: str | Path = DEFAULT_DIR,
+    name: str = DEFAULT_NAME,
+    version: Version | None = None,
+    arrow_dtypes: bool = False,
+) -> pd.DataFrame:
+    """The published frame; see the module docstring for which columns stay in the shared mapping."""
+    table = open_table(directory, name, version)
+    if arrow_dtypes:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas(split_blocks=True)
+
+
+def read_manifest(path: str | Path, arrow_dtypes: bool = False) -> pd.DataFrame:
+    """The version a ``manifest.json`` points to, for callers that are given the manifest path."""
+    path = Path(path)
+    return read(path.parent.parent, path.parent.name, arrow_dtypes=arrow_dtypes)
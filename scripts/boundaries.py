@@ -0,0 +1,174 @@
+"""Assign points to municipality polygons from a boundary file.
+
+Boundaries are read from a GeoJSON FeatureCollection such as the CAOP
+(Carta Administrativa Oficial de Portugal) municipality layer, where
+``DICO`` is the district/municipality code used as ``Código_Concelho``.
+Points must be in the same coordinate reference system as the file.
+
+Assignment is fully vectorized:
+
+1. Points are sorted by x once; for each boundary, ``searchsorted`` on its
+   bounding box x-range and a y mask give the candidate points.
+2. Each boundary's edges are bucketed into horizontal bands, so a
+   candidate only has to be tested against the edges in its band.
+3. An even-odd ray cast over all (candidate, edge) pairs in one array
+   operation decides containment; holes and multipolygons are handled by
+   counting crossings over all rings of a boundary.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.municipalities import KEY, NAME
+
+CAOP_PATH = Path("data/caop_municipios.geojson")
+# Upper bound on (candidate, edge) pairs tested per batch
+MAX_PAIRS = 20_000_000
+# Target number of edges per horizontal band
+EDGES_PER_BAND = 4
+MAX_BANDS = 1 << 16
+
+
+def _rings(geometry: dict) -> list[np.ndarray]:
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        raise ValueError(f"Unsupported geometry type {geometry['type']}")
+    return [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon]
+
+
+class Boundaries:
+    """Polygon boundaries prepared for batched point-in-polygon queries."""
+
+    def __init__(self, keys, names, rings: list[list[np.ndarray]]):
+        self.keys = np.asarray(keys)
+        self.names = np.asarray(names, dtype=object)
+
+        x1, y1, x2, y2, owner = [], [], [], [], []
+        bbox = np.empty((len(rings), 4))
+        for feature, feature_rings in enumerate(rings):
+            for ring in feature_rings:
+                closed = ring if np.array_equal(ring[0], ring[-1]) else np.vstack([ring, ring[:1]])
+                x1.append(closed[:-1, 0])
+                y1.append(closed[:-1, 1])
+                x2.append(closed[1:, 0])
+                y2.append(closed[1:, 1])
+                owner.append(np.full(len(closed) - 1, feature))
+            stacked = np.vstack(feature_rings)
+            bbox[feature] = (*stacked.min(axis=0), *stacked.max(axis=0))
+        self.bbox = bbox
+
+        x1, y1, x2, y2, owner = (np.concatenate(a) for a in (x1, y1, x2, y2, owner))
+        # Horizontal edges never cross a horizontal ray
+        keep = y1 != y2
+        x1, y1, x2, y2, owner = x1[keep], y1[keep], x2[keep], y2[keep], owner[keep]
+
+        # Band each boundary into horizontal strips of a few edges each
+        edges_per_feature = np.bincount(owner, minlength=len(rings))
+        self.bands = np.clip(np.ceil(edges_per_feature / EDGES_PER_BAND), 1, MAX_BANDS).astype(np.int64)
+        self.band_offset = np.concatenate([[0], np.cumsum(self.bands)[:-1]])
+        height = bbox[:, 3] - bbox[:, 1]
+        self.band_height = np.where(height > 0, height / self.bands, 1.0)
+
+        low = self._band(owner, np.minimum(y1, y2))
+        high = self._band(owner, np.maximum(y1, y2))
+        spans = high - low + 1
+        edge = np.repeat(np.arange(len(x1)), spans)
+        within = np.arange(len(edge)) - np.repeat(np.cumsum(spans) - spans, spans)
+        band = self.band_offset[owner[edge]] + low[edge] + within
+
+        # Edge coordinates laid out contiguously in band order, with the inverse slope precomputed
+        edge = edge[np.argsort(band, kind="stable")]
+        self.band_x1 = x1[edge]
+        self.band_y1 = y1[edge]
+        self.band_y2 = y2[edge]
+        self.band_slope = (x2[edge] - x1[edge]) / (y2[edge] - y1[edge])
+        counts = np.bincount(band, minlength=int(self.bands.sum()))
+        self.band_start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self.band_count = counts
+
+    def _band(self, feature: np.ndarray, y: np.ndarray) -> np.ndarray:
+        band = np.floor((y - self.bbox[feature, 1]) / self.band_height[feature]).astype(np.int64)
+        return np.clip(band, 0, self.bands[feature] - 1)
+
+    @classmethod
+    def from_geojson(cls, path: str | Path = CAOP_PATH, key_property: str = "DICO", name_property: str = NAME):
+        with open(path, encoding="utf-8") as f:
+            collection = json.load(f)
+        features = collection["features"]
+        return cls(
+            keys=[int(feature["properties"][key_property]) for feature in features],
+            names=[feature["properties"].get(name_property) for feature in features],
+            rings=[_rings(feature["geometry"]) for feature in features],
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _candidates(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(point, boundary) pairs whose bounding box contains the point."""
+        order = np.argsort(x, kind="stable")
+        sorted_x = x[order]
+        points, features = [], []
+        for feature, (xmin, ymin, xmax, ymax) in enumerate(self.bbox):
+            lo = np.searchsorted(sorted_x, xmin, side="left")
+            hi = np.searchsorted(sorted_x, xmax, side="right")
+            inside = order[lo:hi]
+            inside = inside[(y[inside] >= ymin) & (y[inside] <= ymax)]
+            points.append(inside)
+            features.append(np.full(len(inside), feature))
+        return np.concatenate(points), np.concatenate(features)
+
+    def locate(self, x, y) -> np.ndarray:
+        """Index of the boundary containing each point, or -1."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        result = np.full(len(x), -1, dtype=np.int64)
+        if len(x) == 0:
+            return result
+        points, features = self._candidates(x, y)
+        if len(points) == 0:
+            return result
+
+        gband = self.band_offset[features] + self._band(features, y[points])
+        pairs_per_candidate = self.band_count[gband]
+
+        cumulative = np.cumsum(pairs_per_candidate)
+        start = 0
+        while start < len(points):
+            limit = (cumulative[start - 1] if start else 0) + MAX_PAIRS
+            stop = max(start + 1, int(np.searchsorted(cumulative, limit, side="right")))
+            chunk = slice(start, stop)
+            counts = pairs_per_candidate[chunk]
+            owner = np.repeat(np.arange(stop - start), counts)
+            within = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+            edge = self.band_start[gband[chunk]][owner] + within
+
+            px = x[points[chunk]][owner]
+            py = y[points[chunk]][owner]
+            y1 = self.band_y1[edge]
+            straddles = (y1 > py) != (self.band_y2[edge] > py)
+            x_cross = self.band_x1[edge] + (py - y1) * self.band_slope[edge]
+            crossings = np.bincount(owner[straddles & (px < x_cross)], minlength=stop - start)
+
+            inside = (crossings & 1).astype(bool)
+            hit = points[chunk][inside]
+            # Points on a shared border go to the first boundary that claims them
+            unassigned = result[hit] == -1
+            result[hit[unassigned]] = features[chunk][inside][unassigned]
+            start = stop
+        return result
+
+    def assign(self, df: pd.DataFrame, x: str = "lon", y: str = "lat") -> pd.DataFrame:
+        """Return ``df`` with the ``Código_Concelho`` and ``Concelho`` of the boundary containing each row."""
+        located = self.locate(df[x].to_numpy(), df[y].to_numpy())
+        found = located >= 0
+        keys = pd.array(np.where(found, self.keys[np.maximum(located, 0)], 0), dtype="Int32")
+        keys[~found] = pd.NA
+        names = pd.array(np.where(found, self.names[np.maximum(located, 0)], None), dtype="string")
+        return df.assign(**{KEY: keys, NAME: names})
@@ -0,0 +1,224 @@
+"""Persistent, revalidating on-disk cache for remote tabular datasets.
+
+Downloads are stored as Parquet files named after the SHA-256 of the raw
+payload (plus a short hash of the parse options), so re-exports with
+identical content are stored once. An ``index.json`` next to the files
+records, per URL, the validators returned by the server (``ETag`` and
+``Last-Modified``) and when the entry was last confirmed fresh.
+
+A lookup goes through three stages:
+
+1. Within the TTL the Parquet snapshot is read directly, without touching
+   the network.
+2. After the TTL a conditional GET is sent; a ``304 Not Modified`` only
+   refreshes the timestamp.
+3. A ``200`` streams the payload to disk, parses it once and stores the
+   typed columnar snapshot.
+
+In offline mode (or when the server cannot be reached) the last good
+snapshot is served instead.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("EV_CHARGERS_CACHE_DIR", "data/cache"))
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+class OfflineCacheMiss(LookupError):
+    """Raised when offline mode is requested but no snapshot is cached."""
+
+
+@dataclass
+class CacheEntry:
+    """Index record for one cached URL."""
+
+    url: str
+    filename: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+    used_at: float
+
+
+def file_digest(path: str | Path) -> str:
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """Return a SHA-256 hex digest of a frame's columns, dtypes and values."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _options_key(options: dict) -> str:
+    payload = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:8]
+
+
+class DatasetCache:
+    """Cache remote CSV exports as Parquet snapshots.
+
+    ``ttl`` is the number of seconds a snapshot is served without
+    revalidation, ``max_bytes`` caps the total size of stored snapshots
+    (least recently used ones are evicted first) and ``offline`` disables
+    the network entirely. Offline mode can also be enabled with the
+    ``EV_CHARGERS_OFFLINE=1`` environment variable.
+    """
+
+    def __init__(
+        self,
+        root: str | Path = DEFAULT_CACHE_DIR,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        offline: bool | None = None,
+        session: "requests.Session | None" = None,
+        timeout: float = 60,
+    ):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        if offline is None:
+            offline = os.environ.get("EV_CHARGERS_OFFLINE", "") not in ("", "0")
+        self.offline = offline
+        if session is None:
+            # requests (with urllib3 and certifi) is only needed once a fetch is made
+            import requests
+
+            session = requests.Session()
+        self.session = session
+        self.timeout = timeout
+        self._index_path = self.root / "index.json"
+
+    def read_csv(self, url: str, **read_csv_kwargs) -> pd.DataFrame:
+        """Return the CSV at ``url`` parsed with ``read_csv_kwargs``."""
+        key = f"{url}#{_options_key(read_csv_kwargs)}"
+        index = self._load_index()
+        entry = index.get(key)
+        if entry is not None and not (self.root / entry.filename).exists():
+            entry = None
+
+        if entry is not None and (self.offline or time.time() - entry.fetched_at < self.ttl):
+            return self._serve(index, key, entry)
+        if self.offline:
+            raise OfflineCacheMiss(f"No cached snapshot for {url}")
+
+        import requests
+
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        try:
+            response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+            if response.status_code == 304 and entry is not None:
+                response.close()
+                entry.fetched_at = time.time()
+                return self._serve(index, key, entry)
+            response.raise_for_status()
+            with response:
+                filename = self._store(response, read_csv_kwargs)
+        except requests.RequestException as exc:
+            if entry is None:
+                raise
+            logger.warning("Could not revalidate %s (%s), serving cached snapshot", url, exc)
+            return self._serve(index, key, entry)
+
+        now = time.time()
+        entry = CacheEntry(
+            url=url,
+            filename=filename,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            fetched_at=now,
+            used_at=now,
+        )
+        index[key] = entry
+        self._evict(index, keep=filename)
+        return self._serve(index, key, entry)
+
+    def _serve(self, index: dict, key: str, entry: CacheEntry) -> pd.DataFrame:
+        entry.used_at = time.time()
+        index[key] = entry
+        self._save_index(index)
+        return pd.read_parquet(self.root / entry.filename)
+
+    def _store(self, response: "requests.Response", read_csv_kwargs: dict) -> str:
+        """Stream the payload to disk, hash it and write the Parquet snapshot."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, raw_path = tempfile.mkstemp(dir=self.root, suffix=".download")
+        try:
+            with os.fdopen(fd, "wb") as raw:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    raw.write(chunk)
+
+            filename = f"{digest.hexdigest()[:32]}-{_options_key(read_csv_kwargs)}.parquet"
+            target = self.root / filename
+            if not target.exists():
+                df = pd.read_csv(raw_path, **read_csv_kwargs)
+                tmp_target = target.with_suffix(".parquet.tmp")
+                df.to_parquet(tmp_target, index=False)
+                os.replace(tmp_target, target)
+        finally:
+            os.unlink(raw_path)
+        return filename
+
+    def _evict(self, index: dict, keep: str) -> None:
+        """Drop least recently used snapshots until under ``max_bytes``."""
+        last_used: dict[str, float] = {}
+        for entry in index.values():
+            last_used[entry.filename] = max(last_used.get(entry.filename, 0), entry.used_at)
+
+        files = {path.name: path.stat().st_size for path in self.root.glob("*.parquet")}
+        total = sum(files.values())
+        for filename in sorted(files, key=lambda name: last_used.get(name, 0)):
+            if total <= self.max_bytes:
+                break
+            if filename == keep:
+                continue
+            (self.root / filename).unlink()
+            total -= files[filename]
+            for key in [k for k, e in index.items() if e.filename == filename]:
+                del index[key]
+
+    def _load_index(self) -> dict[str, CacheEntry]:
+        try:
+            raw = json.loads(self._index_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {key: CacheEntry(**value) for key, value in raw.items()}
+
+    def _save_index(self, index: dict[str, CacheEntry]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._index_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps({k: asdict(v) for k, v in index.items()}, indent=2))
+        os.replace(tmp_path, self._index_path)
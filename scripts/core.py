@@ -0,0 +1,138 @@
+"""Load, clean, join and rank the income, density and charger sources.
+
+This is the notebook's path to ``join_df`` without the notebook. It only
+needs pandas (plus openpyxl/pyarrow when reading files); plotting,
+statistics, spatial and profiling features live in their own modules and
+import matplotlib, plotly, scipy or ydata-profiling only when used, so
+importing this module stays cheap for batch jobs and short-lived CLIs.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+from scripts import eredes, ine, municipalities, ranking
+from scripts.cache import DatasetCache
+from scripts.instrument import instrumented
+
+EREDES_URL = "https://e-redes.opendatasoft.com/api/explore/v2.1/catalog/datasets/postos_carregamento_ves/exports/csv?lang=pt&timezone=Europe%2FLisbon&use_labels=true&delimiter=%3B"
+JOIN_COLUMNS = {"count_rows": "num_charging_stations", "sum_pontos_de_ligacao": "total_charging_points"}
+
+
+@instrumented
+def load_income(path: str = str(ine.INCOME_PATH)) -> pd.DataFrame:
+    """Average declared gross income per municipality."""
+    df = ine.read_income(path)
+    return df.filter(["Concelho", ine.INCOME_CODE_COLUMN, ine.INCOME_COLUMN])
+
+
+@instrumented
+def load_households(path: str = str(ine.INCOME_PATH), density: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Number of tax households per municipality (missing when the workbook has no such column).
+
+    With ``density`` the rows are keyed by ``Código_Concelho``, ready for
+    :func:`scripts.cube.build_cube`.
+    """
+    df = ine.read_income(path)
+    if ine.HOUSEHOLDS_COLUMN not in df:
+        df = df.assign(**{ine.HOUSEHOLDS_COLUMN: float("nan")})
+    df = df.filter(["Concelho", ine.INCOME_CODE_COLUMN, ine.HOUSEHOLDS_COLUMN])
+    if density is None:
+        return df
+    keyed = municipality_index(density).attach(df, code_column=ine.INCOME_CODE_COLUMN)
+    return keyed[[municipalities.KEY, ine.HOUSEHOLDS_COLUMN]]
+
+
+@instrumented
+def load_density(path: str = str(ine.DENSITY_PATH), year: int = 2024) -> pd.DataFrame:
+    """Population density per municipality for ``year``."""
+    df = ine.read_density(path, years={year}).data.rename(columns={"Região": "Concelho"})
+    return df[["Código_NUTS", "Concelho", "Densidade_Populacional_km2"]]
+
+
+@instrumented
+def load_chargers(url: str = EREDES_URL) -> pd.DataFrame:
+    """The E-REDES charger export, through the local cache."""
+    return DatasetCache().read_csv(url, sep=";")
+
+
+def municipality_index(density: pd.DataFrame) -> municipalities.MunicipalityIndex:
+    return municipalities.MunicipalityIndex.from_frame(density)
+
+
+@instrumented
+def aggregate_chargers(
+    raw: pd.DataFrame,
+    density: pd.DataFrame,
+    latest_only: bool = True,
+    boundaries: str | Path | None = None,
+) -> pd.DataFrame:
+    """Stations and connection points per municipality, for the latest quarter by default.
+
+    With a ``boundaries`` GeoJSON (e.g. CAOP municipalities) chargers are
+    attributed by their coordinates instead of their ``Concelho`` label.
+    """
+    if latest_only:
+        raw = raw[raw[eredes.QUARTER_COLUMN] == raw[eredes.QUARTER_COLUMN].max()]
+    if boundaries is not None:
+        from scripts.boundaries import Boundaries
+
+        return eredes.aggregate_located(raw, Boundaries.from_geojson(boundaries))
+    return eredes.aggregate_by_municipality(raw, municipality_index(density))
+
+
+@instrumented
+def aggregate_charger_files(
+    paths: str | Path | list[str | Path],
+    density: pd.DataFrame,
+    boundaries: str | Path | None = None,
+) -> pd.DataFrame:
+    """Like :func:`aggregate_chargers`, streaming export CSVs or downloaded partitions in constant memory.
+
+    The chunked aggregation only reads the label columns, so with
+    ``boundaries`` the files are loaded whole to get the coordinates.
+    """
+    if boundaries is not None:
+        paths = [paths] if isinstance(paths, (str, Path)) else paths
+        raw = pd.concat([pd.read_csv(path, sep=";") for path in paths], ignore_index=True)
+        return aggregate_chargers(raw, density, boundaries=boundaries)
+    return eredes.aggregate_csv(paths, municipality_index(density))
+
+
+@instrumented
+def join_outer(income: pd.DataFrame, density: pd.DataFrame, chargers: pd.DataFrame) -> pd.DataFrame:
+    """Outer join on ``Código_Concelho`` with an ``in_<source>`` flag per source."""
+    index = municipality_index(density)
+    return municipalities.join_sources(
+        index,
+        {
+            "INE": index.attach(income, code_column=ine.INCOME_CODE_COLUMN),
+            "densidade": index.attach(density, code_column="Código_NUTS").drop(columns="Código_NUTS"),
+            "EREDES": chargers,
+        },
+    )
+
+
+@instrumented
+def join(joined: pd.DataFrame) -> pd.DataFrame:
+    """Municipalities present in every source, with the notebook's column names."""
+    df = municipalities.inner(joined).drop(columns=ine.INCOME_CODE_COLUMN, errors="ignore")
+    return df.rename(columns=JOIN_COLUMNS)
+
+
+@instrumented
+def rank(join_df: pd.DataFrame) -> pd.DataFrame:
+    """``join_df`` with a ``rank_<metric>`` column per metric (the notebook's ``plot_df``)."""
+    return ranking.add_ranks(join_df)
+
+
+def build_join_df(
+    income_path: str = str(ine.INCOME_PATH),
+    density_path: str = str(ine.DENSITY_PATH),
+    eredes_url: str = EREDES_URL,
+    year: int = 2024,
+) -> pd.DataFrame:
+    """Load every source and return the ranked ``join_df``."""
+    density = load_density(density_path, year)
+    chargers = aggregate_chargers(load_chargers(eredes_url), density)
+    return rank(join(join_outer(load_income(income_path), density, chargers)))
@@ -0,0 +1,255 @@
+"""Pairwise correlations and OLS fits between municipality metrics, with uncertainty.
+
+Every statistic comes from covariance matrices, so all pairs of columns are
+handled by one batched matrix product instead of a fit per pair:
+
+* Pearson ``r`` is the covariance scaled by the standard deviations.
+* Spearman ``rho`` is Pearson on average ranks.
+* The OLS fit of ``y`` on ``x`` has slope ``cov(x, y) / var(x)`` and
+  passes through the means; its R² is ``r²``.
+
+Uncertainty is estimated by resampling. A bootstrap draws ``resamples``
+row resamples with replacement as one ``(resamples, rows, columns)`` array
+and computes all their covariance matrices at once, giving percentile
+confidence intervals for r, rho and the slope. Permutation p-values
+shuffle every column independently, which breaks every pairwise
+association at once. Resamples are processed in shards of bounded memory,
+and from ``POOL_THRESHOLD`` resamples on the shards run in a process pool.
+Each shard has its own seed from one ``SeedSequence``, so results do not
+depend on the number of workers.
+
+Rows with a missing value in any selected column are dropped.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+from scripts.instrument import instrumented
+from scripts.ranking import METRICS
+
+RESAMPLES = 10_000
+POOL_THRESHOLD = 10_000
+# Upper bound on values in one shard's (resamples, rows, columns) array
+SHARD_VALUES = 4_000_000
+
+
+def _covariance(batch: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Means ``(b, p)`` and covariance matrices ``(b, p, p)`` of a ``(b, n, p)`` batch."""
+    mean = batch.mean(axis=1)
+    centered = batch - mean[:, None, :]
+    cov = np.matmul(centered.transpose(0, 2, 1), centered) / (batch.shape[1] - 1)
+    return mean, cov
+
+
+def _correlation(cov: np.ndarray) -> np.ndarray:
+    std = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cov / (std[..., :, None] * std[..., None, :])
+
+
+def _slope(cov: np.ndarray) -> np.ndarray:
+    """``slope[..., i, j]`` of the OLS fit of column ``j`` on column ``i``."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cov / np.diagonal(cov, axis1=-2, axis2=-1)[..., :, None]
+
+
+def _resampled_ranks(levels: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Average ranks of every resample ``values[rows]`` without sorting them.
+
+    ``levels`` are the dense ranks (0, 1, ...) of the original columns. In a
+    resample, the average rank of a level is the number of drawn values
+    below it plus half of the tie block it forms, which a count of draws per
+    level and a cumulative sum give directly.
+    """
+    size, rows_per_resample = rows.shape
+    ranks = np.empty((size, rows_per_resample, levels.shape[1]))
+    offsets = np.arange(size)[:, None]
+    for column in range(levels.shape[1]):
+        count = int(levels[:, column].max()) + 1
+        drawn = offsets * count + levels[rows, column]
+        counts = np.bincount(drawn.ravel(), minlength=size * count).reshape(size, count)
+        average = np.cumsum(counts, axis=1) - (counts - 1) / 2
+        ranks[:, :, column] = np.take_along_axis(average, levels[rows, column], axis=1)
+    return ranks
+
+
+def _bootstrap_shard(values: np.ndarray, levels: np.ndarray | None, size: int, seed: np.random.SeedSequence):
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(values), size=(size, len(values)))
+    _, cov = _covariance(values[rows])
+    if levels is None:
+        return _correlation(cov), None, _slope(cov)
+    # Resampled rows repeat, so ranks (with ties averaged) differ per resample
+    _, rank_cov = _covariance(_resampled_ranks(levels, rows))
+    return _correlation(cov), _correlation(rank_cov), _slope(cov)
+
+
+def _permutation_shard(
+    values: np.ndarray,
+    ranks: np.ndarray | None,
+    size: int,
+    seed: np.random.SeedSequence,
+    observed: tuple[np.ndarray, np.ndarray],
+):
+    rng = np.random.default_rng(seed)
+    order = np.argsort(rng.random((size, *values.shape)), axis=1)
+    exceed = []
+    # Permuting rows does not change ranks, so the data can be ranked once
+    for data, statistic in zip((values, ranks), observed):
+        if data is None:
+            exceed.append(None)
+            continue
+        _, cov = _covariance(np.take_along_axis(data[None], order, axis=1))
+        exceed.append((np.abs(_correlation(cov)) >= np.abs(statistic) - 1e-12).sum(axis=0))
+    return tuple(exceed)
+
+
+def _shards(total: int, rows: int, columns: int, seed: np.random.SeedSequence) -> list[tuple[int, np.random.SeedSequence]]:
+    size = max(1, min(total, SHARD_VALUES // max(rows * columns, 1)))
+    sizes = [size] * (total // size) + ([total % size] if total % size else [])
+    return list(zip(sizes, seed.spawn(len(sizes))))
+
+
+@dataclass
+class Correlations:
+    """Pairwise statistics for ``columns``; matrices are indexed ``[x, y]``."""
+
+    columns: list[str]
+    rows: int
+    mean: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    pearson: np.ndarray
+    spearman: np.ndarray
+    slope: np.ndarray
+    pearson_ci: np.ndarray | None = None
+    spearman_ci: np.ndarray | None = None
+    slope_ci: np.ndarray | None = None
+    pearson_p: np.ndarray | None = None
+    spearman_p: np.ndarray | None = None
+    confidence: float = 0.95
+
+    def _at(self, column: str) -> int:
+        return self.columns.index(column)
+
+    def intercept(self, x: str, y: str) -> float:
+        i, j = self._at(x), self._at(y)
+        return self.mean[j] - self.slope[i, j] * self.mean[i]
+
+    def line(self, x: str, y: str, points: int = 2) -> pd.DataFrame:
+        """The OLS line of ``y`` on ``x`` over the observed range of ``x``, ready to plot."""
+        i, j = self._at(x), self._at(y)
+        xs = np.linspace(self.minimum[i], self.maximum[i], points)
+        return pd.DataFrame({x: xs, y: self.intercept(x, y) + self.slope[i, j] * xs})
+
+    def table(self) -> pd.DataFrame:
+        """One row per ordered pair of distinct columns."""
+        records = []
+        for i, x in enumerate(self.columns):
+            for j, y in enumerate(self.columns):
+                if i == j:
+                    continue
+                record = {
+                    "x": x,
+                    "y": y,
+                    "rows": self.rows,
+                    "pearson_r": self.pearson[i, j],
+                    "spearman_rho": self.spearman[i, j],
+                    "slope": self.slope[i, j],
+                    "intercept": self.intercept(x, y),
+                    "r2": self.pearson[i, j] ** 2,
+                }
+                for name in ("pearson", "spearman", "slope"):
+                    ci = getattr(self, f"{name}_ci")
+                    if ci is not None:
+                        record[f"{name}_low"], record[f"{name}_high"] = ci[0, i, j], ci[1, i, j]
+                for name in ("pearson", "spearman"):
+                    p_values = getattr(self, f"{name}_p")
+                    if p_values is not None:
+                        record[f"{name}_p"] = p_values[i, j]
+                records.append(record)
+        return pd.DataFrame(records)
+
+
+@instrumented
+def correlate(
+    df: pd.DataFrame,
+    columns: list[str] | None = None,
+    resamples: int = RESAMPLES,
+    permutations: int = RESAMPLES,
+    confidence: float = 0.95,
+    seed: int = 0,
+    jobs: int | None = None,
+    spearman: bool = True,
+) -> Correlations:
+    """Pearson, Spearman and OLS for every pair of ``columns`` (default: the ranking metrics).
+
+    Pass ``resamples=0`` or ``permutations=0`` to skip the bootstrap or the
+    permutation test, and ``spearman=False`` to skip ranking (Spearman
+    statistics are then NaN), which dominates the cost on large inputs.
+    """
+    columns = columns or [column for column in METRICS.values() if column in df]
+    values = df[columns].dropna().to_numpy(dtype=np.float64)
+    mean, cov = _covariance(values[None])
+    ranks = levels = None
+    rank_correlation = np.full_like(cov[0], np.nan)
+    if spearman:
+        ranks = rankdata(values, axis=0)
+        levels = (rankdata(values, method="dense", axis=0) - 1).astype(np.int64)
+        rank_correlation = _correlation(_covariance(ranks[None])[1][0])
+    result = Correlations(
+        columns=list(columns),
+        rows=len(values),
+        mean=mean[0],
+        minimum=values.min(axis=0),
+        maximum=values.max(axis=0),
+        pearson=_correlation(cov[0]),
+        spearman=rank_correlation,
+        slope=_slope(cov[0]),
+        confidence=confidence,
+    )
+
+    bootstrap_seed, permutation_seed = np.random.SeedSequence(seed).spawn(2)
+    tasks = []
+    if resamples:
+        tasks += [("bootstrap", size, shard) for size, shard in _shards(resamples, *values.shape, bootstrap_seed)]
+    if permutations:
+        tasks += [("permutation", size, shard) for size, shard in _shards(permutations, *values.shape, permutation_seed)]
+    if not tasks:
+        return result
+
+    observed = (result.pearson, result.spearman)
+
+    def submit(run, kind, size, shard):
+        if kind == "bootstrap":
+            return run(_bootstrap_shard, values, levels, size, shard)
+        return run(_permutation_shard, values, ranks, size, shard, observed)
+
+    if max(resamples, permutations) >= POOL_THRESHOLD and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [submit(pool.submit, *task) for task in tasks]
+            outputs = [future.result() for future in futures]
+    else:
+        outputs = [submit(lambda func, *args: func(*args), *task) for task in tasks]
+
+    boot = [output for (kind, _, _), output in zip(tasks, outputs) if kind == "bootstrap"]
+    if boot:
+        tail = 100 * (1 - confidence) / 2
+        for index, name in enumerate(("pearson", "spearman", "slope")):
+            if boot[0][index] is None:
+                continue
+            draws = np.concatenate([output[index] for output in boot])
+            setattr(result, f"{name}_ci", np.nanpercentile(draws, [tail, 100 - tail], axis=0))
+
+    perm = [output for (kind, _, _), output in zip(tasks, outputs) if kind == "permutation"]
+    if perm:
+        for index, name in enumerate(("pearson", "spearman")):
+            if perm[0][index] is None:
+                continue
+            exceed = sum(output[index] for output in perm)
+            setattr(result, f"{name}_p", (exceed + 1) / (permutations + 1))
+    return result
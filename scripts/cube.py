@@ -0,0 +1,149 @@
+"""Dense municipality x quarter x metric cube for temporal analysis.
+
+The E-REDES export has one row per charging station and quarter. Instead
+of re-running a groupby for every question, :func:`build_cube` scatters the
+rows once into a NumPy array of shape ``(municipalities, quarters,
+metrics)``. Quarters form a gapless sequence from the first to the last one
+in the data, so slicing a quarter, quarter-over-quarter growth and rolling
+windows are plain array operations.
+
+Density, income and households do not change between quarters and are
+broadcast along the quarter axis. Connection points per 1000 households
+use the number of tax households from the INE income workbook
+(:func:`scripts.core.load_households`); where it is missing they are NaN.
+None of the loaded sources gives municipality areas, so there are no
+per-km² metrics. The CAOP boundaries in :mod:`scripts.boundaries` could
+provide them, but are only used to attribute chargers so far.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from scripts.eredes import POINTS_COLUMN, QUARTER_COLUMN
+from scripts.ine import HOUSEHOLDS_COLUMN, INCOME_COLUMN
+from scripts.instrument import instrumented
+from scripts.municipalities import KEY
+
+METRICS = (
+    "stations",
+    "points",
+    "density",
+    "income",
+    "points_per_1000_households",
+)
+ATTRIBUTES = {
+    "density": "Densidade_Populacional_km2",
+    "income": INCOME_COLUMN,
+    "households": HOUSEHOLDS_COLUMN,
+}
+
+
+def quarter_range(first: str, last: str) -> list[str]:
+    """Every quarter from ``first`` to ``last`` inclusive, e.g. ``2024T4``, ``2025T1``."""
+    start = int(first[:4]) * 4 + int(first[-1]) - 1
+    stop = int(last[:4]) * 4 + int(last[-1]) - 1
+    return [f"{q // 4}T{q % 4 + 1}" for q in range(start, stop + 1)]
+
+
+@dataclass
+class MetricCube:
+    """Metrics indexed by municipality key, quarter and metric name."""
+
+    keys: np.ndarray
+    quarters: list[str]
+    metrics: list[str]
+    values: np.ndarray
+
+    def __post_init__(self):
+        self._key_at = {int(key): i for i, key in enumerate(self.keys)}
+        self._quarter_at = {quarter: i for i, quarter in enumerate(self.quarters)}
+        self._metric_at = {metric: i for i, metric in enumerate(self.metrics)}
+
+    @property
+    def latest_quarter(self) -> str:
+        return self.quarters[-1]
+
+    def at(self, key: int, quarter: str, metric: str) -> float:
+        return self.values[self._key_at[key], self._quarter_at[quarter], self._metric_at[metric]]
+
+    def quarter(self, quarter: str | None = None) -> pd.DataFrame:
+        """All metrics for one quarter (default: the latest), one row per municipality."""
+        quarter = quarter or self.latest_quarter
+        return pd.DataFrame(
+            self.values[:, self._quarter_at[quarter], :],
+            index=pd.Index(self.keys, name=KEY),
+            columns=self.metrics,
+        )
+
+    def metric(self, metric: str) -> pd.DataFrame:
+        """One metric over time, municipalities x quarters."""
+        return self._frame(self.values[:, :, self._metric_at[metric]], self.quarters)
+
+    def growth(self, metric: str, periods: int = 1) -> pd.DataFrame:
+        """Relative change over ``periods`` quarters (``NaN`` where the base is zero)."""
+        series = self.values[:, :, self._metric_at[metric]]
+        base = series[:, :-periods]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.where(base != 0, (series[:, periods:] - base) / base, np.nan)
+        return self._frame(change, self.quarters[periods:])
+
+    def rolling(self, metric: str, window: int, how: str = "mean") -> pd.DataFrame:
+        """Rolling ``sum`` or ``mean`` over ``window`` quarters, from cumulative sums."""
+        series = self.values[:, :, self._metric_at[metric]]
+        cumulative = np.cumsum(np.pad(series, ((0, 0), (1, 0))), axis=1)
+        sums = cumulative[:, window:] - cumulative[:, :-window]
+        return self._frame(sums / window if how == "mean" else sums, self.quarters[window - 1 :])
+
+    def _frame(self, values: np.ndarray, quarters: list[str]) -> pd.DataFrame:
+        return pd.DataFrame(
+            values,
+            index=pd.Index(self.keys, name=KEY),
+            columns=pd.Index(quarters, name=QUARTER_COLUMN),
+        )
+
+
+@instrumented
+def build_cube(chargers: pd.DataFrame, attributes: pd.DataFrame | None = None) -> MetricCube:
+    """Build the cube from keyed charger rows and per-municipality attributes.
+
+    ``chargers`` needs ``Código_Concelho``, ``Trimestre`` and the connection
+    points column; ``attributes`` is keyed by ``Código_Concelho`` and may
+    have any of the columns in ``ATTRIBUTES`` (``join_df`` merged with
+    :func:`scripts.core.load_households`).
+    """
+    chargers = chargers.dropna(subset=[KEY, QUARTER_COLUMN])
+    charger_keys = chargers[KEY].to_numpy(dtype=np.int64)
+    keys = np.unique(charger_keys)
+    if attributes is not None:
+        keys = np.union1d(keys, attributes[KEY].dropna().to_numpy(dtype=np.int64))
+
+    observed = chargers[QUARTER_COLUMN].astype(str)
+    quarters = quarter_range(observed.min(), observed.max())
+    key_index = np.searchsorted(keys, charger_keys)
+    quarter_index = pd.Index(quarters).get_indexer(observed)
+
+    # One scatter of every row into the (municipality, quarter) grid
+    cells = len(keys) * len(quarters)
+    flat = key_index * len(quarters) + quarter_index
+    points = pd.to_numeric(chargers[POINTS_COLUMN], errors="coerce").fillna(0).to_numpy()
+    stations = np.bincount(flat, minlength=cells).reshape(len(keys), len(quarters))
+    points = np.bincount(flat, weights=points, minlength=cells).reshape(len(keys), len(quarters))
+
+    static = {name: np.full(len(keys), np.nan) for name in ATTRIBUTES}
+    if attributes is not None:
+        attributes = attributes.dropna(subset=[KEY]).drop_duplicates(KEY)
+        positions = np.searchsorted(keys, attributes[KEY].to_numpy(dtype=np.int64))
+        for name, column in ATTRIBUTES.items():
+            if column in attributes:
+                static[name][positions] = pd.to_numeric(attributes[column], errors="coerce").to_numpy()
+
+    values = np.empty((len(keys), len(quarters), len(METRICS)))
+    values[:, :, 0] = stations
+    values[:, :, 1] = points
+    values[:, :, 2] = static["density"][:, None]
+    values[:, :, 3] = static["income"][:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values[:, :, 4] = 1000 * points / static["households"][:, None]
+    return MetricCube(keys=keys, quarters=quarters, metrics=list(METRICS), values=values)
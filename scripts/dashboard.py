@@ -0,0 +1,295 @@
+"""WebGL scatter dashboard of charging infrastructure against income and density.
+
+The notebook's 2x2 figure built four ``px.scatter`` figures, copied every
+trace into ``make_subplots`` and restyled them in loops, embedding each
+column once per panel. This module builds the same dashboard from one
+declarative panel spec:
+
+* markers are ``scattergl`` (WebGL) traces;
+* trendlines come from :func:`scripts.correlation.correlate`, fitted once
+  on all rows, not from plotly's per-trace OLS;
+* above ``max_points`` rows each panel is downsampled on the server: points
+  are binned on a grid over the panel's axes and every occupied cell keeps
+  a share of points proportional to its count (at least one), so dense
+  regions thin out, sparse regions and outliers stay, and the apparent
+  density is preserved. This is a single O(n) pass with no sorting.
+
+:func:`write_html` writes a standalone page whose payload holds every
+column once, as base64 float32 arrays, and builds the traces in the
+browser from that shared store, so panels reuse the same arrays instead of
+embedding copies.
+
+:func:`figure` returns a plotly figure for the notebook, and cannot share
+a store that way: plotly's figure JSON has no references between traces,
+so every trace serializes its own ``x``, ``y`` and ``text``. It keeps the
+copies small instead. Each panel holds only its downsampled rows, and the
+coordinates are float32 arrays, which plotly sends as base64 typed arrays.
+"""
+
+import base64
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.correlation import Correlations, correlate
+from scripts.ine import INCOME_COLUMN
+from scripts.instrument import instrumented
+from scripts.municipalities import NAME
+
+DENSITY_COLUMN = "Densidade_Populacional_km2"
+DEFAULT_MAX_POINTS = 20_000
+GRID_BINS = 128
+PLOTLY_JS = "https://cdn.plot.ly/plotly-2.35.2.min.js"
+
+
+@dataclass(frozen=True)
+class Panel:
+    x: str
+    y: str
+    title: str
+    color: str
+    x_title: str
+    y_title: str
+    hovertemplate: str
+
+
+_INCOME_HOVER = "Income: €%{x:,.0f}"
+_DENSITY_HOVER = "Density: %{x:.1f} per km²"
+PANELS = (
+    Panel(
+        INCOME_COLUMN, "num_charging_stations", "Income vs Charging Stations", "#3498db",
+        "Average Income per Household (€)", "Number of Charging Stations",
+        f"<b>%{{text}}</b><br>{_INCOME_HOVER}<br>Stations: %{{y}}<extra></extra>",
+    ),
+    Panel(
+        DENSITY_COLUMN, "num_charging_stations", "Population Density vs Charging Stations", "#e74c3c",
+        "Population Density (per km²)", "Number of Charging Stations",
+        f"<b>%{{text}}</b><br>{_DENSITY_HOVER}<br>Stations: %{{y}}<extra></extra>",
+    ),
+    Panel(
+        INCOME_COLUMN, "total_charging_points", "Income vs Total Charging Points", "#2ecc71",
+        "Average Income per Household (€)", "Total Charging Points",
+        f"<b>%{{text}}</b><br>{_INCOME_HOVER}<br>Points: %{{y}}<extra></extra>",
+    ),
+    Panel(
+        DENSITY_COLUMN, "total_charging_points", "Population Density vs Total Charging Points", "#f39c12",
+        "Population Density (per km²)", "Total Charging Points",
+        f"<b>%{{text}}</b><br>{_DENSITY_HOVER}<br>Points: %{{y}}<extra></extra>",
+    ),
+)
+MARKER = {"size": 10, "opacity": 0.6, "line": {"width": 1.5, "color": "white"}}
+LAYOUT = {
+    "title_font_size": 18,
+    "title_font_family": "Arial Black",
+    "showlegend": False,
+    "height": 900,
+    "width": 1200,
+    "plot_bgcolor": "white",
+    "hovermode": "closest",
+}
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int, bins: int = GRID_BINS, seed: int = 0) -> np.ndarray:
+    """Sorted indices of about ``max_points`` rows, keeping each grid cell's share and at least one row per cell."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) <= max_points:
+        return np.arange(len(x))
+
+    def cells(values):
+        low, high = np.nanmin(values), np.nanmax(values)
+        scaled = (values - low) / (high - low) if high > low else np.zeros_like(values)
+        return np.clip(np.nan_to_num(scaled * bins).astype(np.int64), 0, bins - 1)
+
+    cell = cells(x) * bins + cells(y)
+    # Every row is kept with the same probability, except that the row with
+    # the smallest key in each cell is always kept, so sparse cells survive
+    key = np.random.default_rng(seed).random(len(x))
+    smallest = np.full(bins * bins, np.inf)
+    np.minimum.at(smallest, cell, key)
+    keep = (key < max_points / len(x)) | (key == smallest[cell])
+    return np.flatnonzero(keep)
+
+
+def _selections(df: pd.DataFrame, max_points: int, seed: int) -> list[np.ndarray]:
+    return [downsample(df[panel.x].to_numpy(), df[panel.y].to_numpy(), max_points, seed=seed) for panel in PANELS]
+
+
+def _correlations(df: pd.DataFrame, correlations: Correlations | None) -> Correlations:
+    if correlations is not None:
+        return correlations
+    columns = list(dict.fromkeys(column for panel in PANELS for column in (panel.x, panel.y)))
+    return correlate(df, columns=columns, resamples=0, permutations=0, spearman=False)
+
+
+def _position(index: int) -> tuple[int, int]:
+    return index // 2 + 1, index % 2 + 1
+
+
+@instrumented
+def figure(
+    df: pd.DataFrame,
+    correlations: Correlations | None = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    seed: int = 0,
+):
+    """The 2x2 dashboard as a plotly figure with WebGL markers and precomputed trendlines."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    correlations = _correlations(df, correlations)
+    fig = make_subplots(
+        rows=2,
+        cols=2,
+        subplot_titles=[panel.title for panel in PANELS],
+        vertical_spacing=0.12,
+        horizontal_spacing=0.10,
+    )
+    names = df[NAME].to_numpy(dtype=object) if NAME in df else None
+    for index, (panel, rows) in enumerate(zip(PANELS, _selections(df, max_points, seed))):
+        row, col = _position(index)
+        fig.add_trace(
+            go.Scattergl(
+                x=df[panel.x].to_numpy(dtype=np.float32)[rows],
+                y=df[panel.y].to_numpy(dtype=np.float32)[rows],
+                text=None if names is None else names[rows],
+                mode="markers",
+                marker={**MARKER, "color": panel.color},
+                hovertemplate=panel.hovertemplate,
+            ),
+            row=row,
+            col=col,
+        )
+        line = correlations.line(panel.x, panel.y)
+        fig.add_trace(
+            go.Scattergl(
+                x=line[panel.x], y=line[panel.y], mode="lines", line={"color": panel.color, "width": 2}, hoverinfo="skip"
+            ),
+            row=row,
+            col=col,
+        )
+        fig.update_xaxes(title_text=panel.x_title, row=row, col=col, showgrid=True, gridcolor="lightgray")
+        fig.update_yaxes(title_text=panel.y_title, row=row, col=col, showgrid=True, gridcolor="lightgray")
+    fig.update_layout(**LAYOUT)
+    return fig
+
+
+def _encode(values: np.ndarray) -> str:
+    return base64.b64encode(np.ascontiguousarray(values, dtype="<f4").tobytes()).decode("ascii")
+
+
+def payload(
+    df: pd.DataFrame,
+    correlations: Correlations | None = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    seed: int = 0,
+) -> dict:
+    """The JSON document behind :func:`write_html`: one column store plus per-panel row selections."""
+    correlations = _correlations(df, correlations)
+    selections = _selections(df, max_points, seed)
+    used = np.unique(np.concatenate(selections))
+    # Panels index into the store, which only holds rows that some panel shows
+    store_position = np.full(len(df), -1, dtype=np.int64)
+    store_position[used] = np.arange(len(used))
+
+    columns = list(dict.fromkeys(column for panel in PANELS for column in (panel.x, panel.y)))
+    panels = []
+    for index, (panel, rows) in enumerate(zip(PANELS, selections)):
+        line = correlations.line(panel.x, panel.y)
+        row, col = _position(index)
+        panels.append(
+            {
+                "x": panel.x,
+                "y": panel.y,
+                "color": panel.color,
+                "hovertemplate": panel.hovertemplate,
+                "xaxis": "x" if index == 0 else f"x{index + 1}",
+                "yaxis": "y" if index == 0 else f"y{index + 1}",
+                # None means every row of the store, in order
+                "rows": None if len(rows) == len(used) else store_position[rows].tolist(),
+                "line": {"x": line[panel.x].tolist(), "y": line[panel.y].tolist()},
+                "title": panel.title,
+                "x_title": panel.x_title,
+                "y_title": panel.y_title,
+                "domain": {"row": row, "col": col},
+            }
+        )
+    return {
+        "rows": len(df),
+        "stored": len(used),
+        "columns": {column: _encode(df[column].to_numpy(dtype=np.float64)[used]) for column in columns},
+        "names": df[NAME].astype(str).to_numpy()[used].tolist() if NAME in df else None,
+        "panels": panels,
+        "marker": MARKER,
+        "layout": LAYOUT,
+    }
+
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Charging infrastructure by municipality</title>
+<script src="{plotly_js}"></script>
+</head>
+<body>
+<div id="dashboard"></div>
+<script>
+const data = {data};
+const decode = (text) => new Float32Array(Uint8Array.from(atob(text), (c) => c.charCodeAt(0)).buffer);
+const store = Object.fromEntries(Object.entries(data.columns).map(([name, text]) => [name, decode(text)]));
+const pick = (values, rows) => rows === null ? values : Float32Array.from(rows, (i) => values[i]);
+const traces = [];
+const layout = {{
+  title: {{font: {{size: data.layout.title_font_size, family: data.layout.title_font_family}}}},
+  showlegend: false, height: data.layout.height, width: data.layout.width,
+  plot_bgcolor: data.layout.plot_bgcolor, hovermode: data.layout.hovermode,
+  grid: {{rows: 2, columns: 2, pattern: "independent", xgap: 0.10, ygap: 0.12}},
+  annotations: [],
+}};
+data.panels.forEach((panel, index) => {{
+  const suffix = index === 0 ? "" : String(index + 1);
+  const text = data.names === null ? undefined : (panel.rows === null ? data.names : panel.rows.map((i) => data.names[i]));
+  traces.push({{
+    type: "scattergl", mode: "markers", xaxis: panel.xaxis, yaxis: panel.yaxis,
+    x: pick(store[panel.x], panel.rows), y: pick(store[panel.y], panel.rows), text: text,
+    marker: Object.assign({{color: panel.color}}, data.marker), hovertemplate: panel.hovertemplate,
+  }});
+  traces.push({{
+    type: "scattergl", mode: "lines", xaxis: panel.xaxis, yaxis: panel.yaxis,
+    x: panel.line.x, y: panel.line.y, line: {{color: panel.color, width: 2}}, hoverinfo: "skip",
+  }});
+  layout["xaxis" + suffix] = {{title: {{text: panel.x_title}}, showgrid: true, gridcolor: "lightgray"}};
+  layout["yaxis" + suffix] = {{title: {{text: panel.y_title}}, showgrid: true, gridcolor: "lightgray"}};
+  layout.annotations.push({{
+    text: panel.title, showarrow: false, font: {{size: 16}},
+    xref: "x" + suffix + " domain", yref: "y" + suffix + " domain", x: 0.5, y: 1.08,
+  }});
+}});
+Plotly.newPlot("dashboard", traces, layout);
+</script>
+</body>
+</html>
+"""
+
+
+@instrumented
+def write_html(
+    df: pd.DataFrame,
+    path: str | Path,
+    correlations: Correlations | None = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    seed: int = 0,
+    plotly_js: str = PLOTLY_JS,
+) -> int:
+    """Write the standalone dashboard page and return its size in bytes."""
+    data = json.dumps(payload(df, correlations, max_points, seed), ensure_ascii=False, separators=(",", ":"))
+    # Keep "</script>" inside names from closing the script element
+    html = _PAGE.format(plotly_js=plotly_js, data=data.replace("</", "<\\/"))
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(html, encoding="utf-8")
+    return len(html.encode("utf-8"))
@@ -0,0 +1,238 @@
+"""Download charger points from an ArcGIS FeatureServer layer into Parquet.
+
+ArcGIS caps every query at the layer's ``maxRecordCount``, so a layer is
+read by first asking for the total count and then requesting each
+``resultOffset`` page. Pages are fetched concurrently over one pooled
+``requests.Session``; a token bucket caps the request rate, failed pages
+are retried with exponential backoff and pages are written to the Parquet
+file in offset order as soon as they are ready, so at most a few pages per
+worker are held in memory.
+
+Point geometries are requested in WGS84 and stored as ``lon``/``lat``
+columns next to the layer attributes.
+"""
+
+import argparse
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+from requests.adapters import HTTPAdapter
+
+from scripts import instrument
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = Path("data/arcgis_chargers.parquet")
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 20.0
+DEFAULT_RETRIES = 5
+
+ESRI_TYPES = {
+    "esriFieldTypeOID": pa.int64(),
+    "esriFieldTypeInteger": pa.int64(),
+    "esriFieldTypeSmallInteger": pa.int64(),
+    "esriFieldTypeBigInteger": pa.int64(),
+    "esriFieldTypeDouble": pa.float64(),
+    "esriFieldTypeSingle": pa.float64(),
+    "esriFieldTypeDate": pa.timestamp("ms"),
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing ``rate`` requests per second."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FeatureServerClient:
+    """Minimal client for the ``query`` endpoint of one FeatureServer layer."""
+
+    def __init__(
+        self,
+        layer_url: str,
+        workers: int = DEFAULT_WORKERS,
+        rate: float = DEFAULT_RATE,
+        retries: int = DEFAULT_RETRIES,
+        timeout: float = 60,
+    ):
+        self.layer_url = layer_url.rstrip("/")
+        self.workers = workers
+        self.retries = retries
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate) if rate else None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, path: str, **params) -> dict:
+        """GET ``path`` as JSON, retrying HTTP and ArcGIS errors with backoff."""
+        params["f"] = "json"
+        for attempt in range(self.retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                response = self.session.get(f"{self.layer_url}{path}", params=params, timeout=self.timeout)
+                response.raise_for_status()
+                payload = response.json()
+                # ArcGIS reports most failures as HTTP 200 with an error body
+                if "error" in payload:
+                    raise RuntimeError(f"ArcGIS error: {payload['error']}")
+                return payload
+            except (requests.RequestException, RuntimeError, ValueError) as exc:
+                if attempt == self.retries:
+                    raise
+                delay = min(2**attempt, 30) * (0.5 + random.random())
+                logger.warning("Request to %s failed (%s), retrying in %.1fs", path, exc, delay)
+                time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    @instrument.instrumented
+    def layer_info(self) -> dict:
+        return self.get("")
+
+    @instrument.instrumented
+    def count(self, where: str = "1=1") -> int:
+        return self.get("/query", where=where, returnCountOnly="true")["count"]
+
+    def page(self, offset: int, page_size: int, where: str = "1=1", order_by: str | None = None) -> list[dict]:
+        params = {
+            "where": where,
+            "outFields": "*",
+            "returnGeometry": "true",
+            "outSR": 4326,
+            "resultOffset": offset,
+            "resultRecordCount": page_size,
+        }
+        if order_by:
+            params["orderByFields"] = order_by
+        with instrument.stage("fetch_page") as span:
+            features = self.get("/query", **params)["features"]
+            span.rows_out = len(features)
+        return features
+
+
+def arrow_schema(layer_info: dict) -> pa.Schema:
+    """Build the Parquet schema from the layer field definitions."""
+    fields = [
+        pa.field(field["name"], ESRI_TYPES.get(field["type"], pa.string()))
+        for field in layer_info["fields"]
+        if field["type"] != "esriFieldTypeGeometry"
+    ]
+    return pa.schema(fields + [pa.field("lon", pa.float64()), pa.field("lat", pa.float64())])
+
+
+def features_to_batch(features: list[dict], schema: pa.Schema) -> pa.RecordBatch:
+    """Convert one page of ArcGIS features to a record batch."""
+    columns = {name: [] for name in schema.names}
+    for feature in features:
+        attributes = feature.get("attributes", {})
+        geometry = feature.get("geometry") or {}
+        for name in schema.names[:-2]:
+            columns[name].append(attributes.get(name))
+        columns["lon"].append(geometry.get("x"))
+        columns["lat"].append(geometry.get("y"))
+    return pa.RecordBatch.from_pydict(
+        {name: _coerce(values, schema.field(name).type) for name, values in columns.items()},
+        schema=schema,
+    )
+
+
+def _coerce(values: list, type_: pa.DataType) -> pa.Array:
+    if pa.types.is_string(type_):
+        values = [None if value is None else str(value) for value in values]
+    return pa.array(values, type=type_)
+
+
+def download(
+    layer_url: str,
+    output: Path = DEFAULT_OUTPUT,
+    workers: int = DEFAULT_WORKERS,
+    rate: float = DEFAULT_RATE,
+    page_size: int | None = None,
+    where: str = "1=1",
+) -> int:
+    """Fetch every feature of ``layer_url`` into ``output``; return the row count."""
+    client = FeatureServerClient(layer_url, workers=workers, rate=rate)
+    info = client.layer_info()
+    page_size = min(page_size or info.get("maxRecordCount", 1000), info.get("maxRecordCount", 1000))
+    order_by = info.get("objectIdField")
+    schema = arrow_schema(info)
+    total = client.count(where)
+    offsets = range(0, total, page_size)
+    logger.info("%d features in %d pages of %d", total, len(offsets), page_size)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = output.with_suffix(output.suffix + ".tmp")
+    written = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool, pq.ParquetWriter(tmp_output, schema) as writer:
+        # Keep a bounded window of pages in flight and write them in order
+        pending: deque = deque()
+        next_offsets = iter(offsets)
+        for offset in next_offsets:
+            pending.append(pool.submit(client.page, offset, page_size, where, order_by))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            features = pending.popleft().result()
+            with instrument.stage("write_page", rows_in=len(features)):
+                writer.write_batch(features_to_batch(features, schema))
+            written += len(features)
+            offset = next(next_offsets, None)
+            if offset is not None:
+                pending.append(pool.submit(client.page, offset, page_size, where, order_by))
+
+    tmp_output.replace(output)
+    if written != total:
+        logger.warning("Expected %d features, wrote %d", total, written)
+    return written
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("layer_url", help="FeatureServer layer URL, e.g. .../FeatureServer/0")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="max requests per second (0 disables)")
+    parser.add_argument("--page-size", type=int, help="defaults to the layer maxRecordCount")
+    parser.add_argument("--where", default="1=1")
+    instrument.add_argument(parser, "download-arcgis-chargers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    started = time.perf_counter()
+    written = download(args.layer_url, args.output, args.workers, args.rate, args.page_size, args.where)
+    elapsed = time.perf_counter() - started
+    print(f"{written} features written to {args.output} in {elapsed:.1f}s ({written / elapsed:.0f}/s)")
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Download the E-REDES EV charger dataset, one CSV partition per quarter.
+
+The dataset is published on opendatasoft and is re-exported in full every
+quarter. Instead of downloading the whole export, this command lists the
+available ``Trimestre`` values through the records API and only fetches
+quarters newer than the newest partition already on disk. Each quarter is
+paged through the records API and appended to
+``<output-dir>/Trimestre=<quarter>.csv.partial`` as it arrives, so memory
+stays bounded by the page size. A small ``.state.json`` sidecar records how
+many records and bytes have been written; an interrupted run resumes from
+there and the partition is renamed into place once complete.
+
+The records API cannot page past ``MAX_RECORDS_WINDOW`` records. A quarter
+with more records is streamed from the exports endpoint instead, which has
+no such limit but cannot resume: an interrupted export starts over.
+
+Partitions use the same ``;``-separated layout and column labels as the
+full CSV export used by the notebook.
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from scripts import instrument
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://e-redes.opendatasoft.com/api/explore/v2.1/catalog/datasets/postos_carregamento_ves"
+DEFAULT_OUTPUT_DIR = Path("data/eredes")
+QUARTER_LABEL = "Trimestre"
+PAGE_SIZE = 100
+# opendatasoft rejects records queries where offset + limit exceeds this
+MAX_RECORDS_WINDOW = 10_000
+
+
+def make_session(retries: int = 5) -> requests.Session:
+    """Return a session that retries transient failures with backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET",),
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.mount("http://", HTTPAdapter(max_retries=retry))
+    return session
+
+
+def partition_path(output_dir: Path, quarter: str) -> Path:
+    return output_dir / f"{QUARTER_LABEL}={quarter}.csv"
+
+
+def local_quarters(output_dir: Path) -> list[str]:
+    """Return the quarters with a complete partition in ``output_dir``."""
+    prefix = f"{QUARTER_LABEL}="
+    return sorted(
+        path.name[len(prefix) : -len(".csv")] for path in output_dir.glob(f"{prefix}*.csv")
+    )
+
+
+@instrument.instrumented
+def fetch_fields(session: requests.Session, base_url: str) -> list[tuple[str, str]]:
+    """Return ``(name, label)`` pairs for the dataset fields, in export order."""
+    response = session.get(base_url, timeout=60)
+    response.raise_for_status()
+    return [(field["name"], field.get("label") or field["name"]) for field in response.json()["fields"]]
+
+
+@instrument.instrumented
+def fetch_quarters(session: requests.Session, base_url: str, quarter_field: str) -> list[str]:
+    """Return every quarter published in the dataset, oldest first."""
+    response = session.get(
+        f"{base_url}/records",
+        params={"select": quarter_field, "group_by": quarter_field, "limit": PAGE_SIZE},
+        timeout=60,
+    )
+    response.raise_for_status()
+    return sorted(row[quarter_field] for row in response.json()["results"] if row[quarter_field])
+
+
+@instrument.instrumented
+def count_records(session: requests.Session, base_url: str, where: str) -> int:
+    """Return how many records match ``where``."""
+    response = session.get(f"{base_url}/records", params={"where": where, "limit": 0}, timeout=60)
+    response.raise_for_status()
+    return response.json()["total_count"]
+
+
+@instrument.instrumented
+def export_quarter(
+    session: requests.Session,
+    base_url: str,
+    partial: Path,
+    where: str,
+    names: list[str],
+) -> None:
+    """Stream one quarter from the exports endpoint to ``partial``, from the start."""
+    params = {"where": where, "order_by": ", ".join(names), "delimiter": ";", "use_labels": "true"}
+    with session.get(f"{base_url}/exports/csv", params=params, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(partial, "wb") as raw:
+            for chunk in response.iter_content(1024 * 1024):
+                raw.write(chunk)
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+@instrument.instrumented
+def download_quarter(
+    session: requests.Session,
+    base_url: str,
+    output_dir: Path,
+    quarter: str,
+    fields: list[tuple[str, str]],
+    quarter_field: str,
+    page_size: int = PAGE_SIZE,
+) -> Path:
+    """Stream one quarter to its partition file, resuming a partial download."""
+    target = partition_path(output_dir, quarter)
+    partial = target.with_name(target.name + ".partial")
+    state_path = target.with_name(target.name + ".state.json")
+    where = f'{quarter_field} = "{quarter}"'
+    names = [name for name, _ in fields]
+
+    total = count_records(session, base_url, where)
+    if total > MAX_RECORDS_WINDOW:
+        logger.info("%s has %d records, more than the records API can page through; exporting it", quarter, total)
+        export_quarter(session, base_url, partial, where, names)
+        os.replace(partial, target)
+        state_path.unlink(missing_ok=True)
+        return target
+
+    state = {"offset": 0, "bytes": 0}
+    if partial.exists() and state_path.exists():
+        state = json.loads(state_path.read_text())
+        logger.info("Resuming %s at record %d", quarter, state["offset"])
+
+    with open(partial, "a+b") as raw:
+        # Drop anything written after the last recorded page
+        raw.truncate(state["bytes"])
+        raw.seek(state["bytes"])
+        if state["bytes"] == 0:
+            raw.write((";".join(label for _, label in fields) + "\n").encode())
+
+        offset = state["offset"]
+        while offset < total:
+            limit = min(page_size, MAX_RECORDS_WINDOW - offset)
+            if limit <= 0:
+                # Only if records were added since counting; the next run exports the quarter
+                raise RuntimeError(f"{quarter} grew past {MAX_RECORDS_WINDOW} records while downloading, run again")
+            with instrument.stage("fetch_page") as span:
+                response = session.get(
+                    f"{base_url}/records",
+                    params={
+                        "where": where,
+                        "order_by": ", ".join(names),
+                        "limit": limit,
+                        "offset": offset,
+                    },
+                    timeout=60,
+                )
+                response.raise_for_status()
+                page = response.json()
+                span.rows_out = len(page["results"])
+            total = page["total_count"]
+            if not page["results"]:
+                break
+
+            lines = io.StringIO()
+            writer = csv.writer(lines, delimiter=";", lineterminator="\n")
+            writer.writerows([record.get(name) for name in names] for record in page["results"])
+            raw.write(lines.getvalue().encode())
+            raw.flush()
+            os.fsync(raw.fileno())
+
+            offset += len(page["results"])
+            state = {"offset": offset, "bytes": raw.tell(), "total": total}
+            state_path.write_text(json.dumps(state))
+            logger.info("%s: %d/%d records", quarter, offset, total)
+
+    os.replace(partial, target)
+    state_path.unlink()
+    return target
+
+
+def download(
+    output_dir: Path = DEFAULT_OUTPUT_DIR,
+    base_url: str = BASE_URL,
+    full: bool = False,
+    page_size: int = PAGE_SIZE,
+    session: requests.Session | None = None,
+) -> list[Path]:
+    """Fetch every quarter newer than the newest local partition."""
+    session = session or make_session()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    fields = fetch_fields(session, base_url)
+    quarter_field = next((name for name, label in fields if label == QUARTER_LABEL), "trimestre")
+    available = fetch_quarters(session, base_url, quarter_field)
+
+    existing = local_quarters(output_dir)
+    newest = existing[-1] if existing and not full else ""
+    pending = [quarter for quarter in available if quarter > newest]
+    if not pending:
+        logger.info("Up to date, newest local quarter is %s", newest)
+        return []
+
+    return [
+        download_quarter(session, base_url, output_dir, quarter, fields, quarter_field, page_size)
+        for quarter in pending
+    ]
+
+
+def read_partitions(output_dir: Path = DEFAULT_OUTPUT_DIR, quarters: list[str] | None = None):
+    """Load the downloaded partitions as a single frame, like the full export."""
+    import pandas as pd
+
+    quarters = quarters or local_quarters(output_dir)
+    return pd.concat(
+        [pd.read_csv(partition_path(output_dir, quarter), sep=";") for quarter in quarters],
+        ignore_index=True,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--full", action="store_true", help="re-download every quarter")
+    instrument.add_argument(parser, "download-eredes-chargers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    written = download(args.output_dir, args.base_url, args.full, args.page_size)
+    for path in written:
+        print(path)
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
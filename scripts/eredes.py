@@ -0,0 +1,169 @@
+"""Cleaning and aggregation of the E-REDES EV charger export.
+
+:func:`aggregate_by_municipality` works on a loaded frame. For exports too
+large to load, :func:`aggregate_csv` streams the CSV in chunks of compact
+dtypes and produces the same result in constant memory.
+:func:`aggregate_located` attributes chargers by their coordinates, with a
+municipality boundary file, instead of by their ``Concelho`` label.
+"""
+
+import logging
+from collections.abc import Iterable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.instrument import instrumented
+from scripts.municipalities import KEY, NAME, MunicipalityIndex
+
+CODE_COLUMN = "CodDistritoConcelho"
+QUARTER_COLUMN = "Trimestre"
+POINTS_COLUMN = "Pontos de ligação para instalações de PCVE"
+LON_COLUMN = "Longitude"
+LAT_COLUMN = "Latitude"
+
+# Only the columns the aggregation needs, with categoricals for the repeated
+# strings. Codes (at most 4999) and connection points are small integers
+# that may be missing; float32 holds them exactly in half the memory of the
+# default float64 and parses about three times faster than Int16/Int32.
+COMPACT_DTYPES = {
+    QUARTER_COLUMN: "category",
+    NAME: "category",
+    CODE_COLUMN: np.float32,
+    POINTS_COLUMN: np.float32,
+}
+CHUNK_ROWS = 250_000
+
+logger = logging.getLogger(__name__)
+
+
+@instrumented
+def aggregate_by_municipality(df: pd.DataFrame, index: MunicipalityIndex) -> pd.DataFrame:
+    """Count stations and sum connection points per municipality key."""
+    keyed = index.attach(df, name_column=NAME, code_column=CODE_COLUMN)
+    unresolved = keyed[KEY].isna()
+    if unresolved.any():
+        names = keyed.loc[unresolved, NAME].unique().tolist()
+        logger.warning("Dropping %d rows with unknown municipality: %s", unresolved.sum(), names)
+    return aggregate_keyed(keyed)
+
+
+@instrumented
+def aggregate_located(
+    df: pd.DataFrame,
+    boundaries,
+    x: str = LON_COLUMN,
+    y: str = LAT_COLUMN,
+    points_column: str = POINTS_COLUMN,
+) -> pd.DataFrame:
+    """Like :func:`aggregate_by_municipality`, placing each row in the boundary that contains its point.
+
+    ``boundaries`` is a :class:`scripts.boundaries.Boundaries`; the
+    ``Concelho`` and ``CodDistritoConcelho`` columns are ignored.
+    """
+    located = boundaries.assign(df, x=x, y=y)
+    outside = located[KEY].isna()
+    if outside.any():
+        logger.warning("Dropping %d rows outside every boundary or without coordinates", outside.sum())
+    return aggregate_keyed(located[~outside], points_column)
+
+
+def aggregate_keyed(df: pd.DataFrame, points_column: str = POINTS_COLUMN) -> pd.DataFrame:
+    """Count stations and sum connection points for rows that already have a municipality key."""
+    return (
+        df.groupby(KEY, observed=True)
+        .agg(
+            count_rows=(KEY, "size"),
+            sum_pontos_de_ligacao=(points_column, "sum"),
+        )
+        .reset_index()
+    )
+
+
+def _partial_aggregate(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Rows, connection points and missing points per (quarter, code, name) in one chunk."""
+    points = chunk[POINTS_COLUMN]
+    partial = (
+        chunk.assign(
+            **{POINTS_COLUMN: points.fillna(0).astype(np.int32)},
+            missing_points=points.isna().astype(np.int32),
+        )
+        .groupby([QUARTER_COLUMN, CODE_COLUMN, NAME], observed=True, dropna=False)
+        .agg(
+            count_rows=(POINTS_COLUMN, "size"),
+            sum_pontos_de_ligacao=(POINTS_COLUMN, "sum"),
+            missing_points=("missing_points", "sum"),
+        )
+        .reset_index()
+    )
+    # Plain columns so partials with different categories line up when merged
+    return partial.astype(
+        {
+            QUARTER_COLUMN: object,
+            CODE_COLUMN: "Int32",
+            NAME: object,
+            "count_rows": np.int64,
+            "sum_pontos_de_ligacao": np.int64,
+            "missing_points": np.int64,
+        }
+    )
+
+
+def _merge(partials: list[pd.DataFrame]) -> pd.DataFrame:
+    return (
+        pd.concat(partials, ignore_index=True)
+        .groupby([QUARTER_COLUMN, CODE_COLUMN, NAME], dropna=False, sort=False)
+        .sum()
+        .reset_index()
+    )
+
+
+@instrumented
+def aggregate_csv(
+    paths: str | Path | Iterable[str | Path],
+    index: MunicipalityIndex,
+    quarter: str | None = None,
+    chunksize: int = CHUNK_ROWS,
+    sep: str = ";",
+) -> pd.DataFrame:
+    """Stream one or more export CSVs and aggregate ``quarter`` (default: the latest) per municipality.
+
+    Every chunk is reduced to one row per (quarter, code, name) and merged
+    into a running aggregate whose size depends on the number of quarters
+    and distinct names, not on the number of rows. Municipality keys are
+    resolved once, on that aggregate. The result equals filtering the full
+    export to ``quarter`` and calling :func:`aggregate_by_municipality`.
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    merged = None
+    for path in paths:
+        chunks = pd.read_csv(path, sep=sep, usecols=list(COMPACT_DTYPES), dtype=COMPACT_DTYPES, chunksize=chunksize)
+        for chunk in chunks:
+            partial = _partial_aggregate(chunk)
+            merged = partial if merged is None else _merge([merged, partial])
+    if merged is None:
+        raise ValueError("No charger rows to aggregate")
+
+    # A points column with any missing value is read as float, so its sums are float too
+    float_points = bool(merged["missing_points"].any())
+    quarter = quarter or merged[QUARTER_COLUMN].max()
+    merged = merged[merged[QUARTER_COLUMN] == quarter]
+    keyed = index.attach(merged, name_column=NAME, code_column=CODE_COLUMN)
+    unresolved = keyed[KEY].isna()
+    if unresolved.any():
+        names = keyed.loc[unresolved, NAME].unique().tolist()
+        logger.warning("Dropping %d rows with unknown municipality: %s", keyed.loc[unresolved, "count_rows"].sum(), names)
+
+    result = (
+        keyed[~unresolved]
+        .groupby(KEY)[["count_rows", "sum_pontos_de_ligacao", "missing_points"]]
+        .sum()
+        .reset_index()
+    )
+    # Same dtypes as aggregate_keyed, whose size over the nullable key column is nullable too
+    result = result.drop(columns="missing_points").astype({"count_rows": "Int64"})
+    if float_points:
+        result["sum_pontos_de_ligacao"] = result["sum_pontos_de_ligacao"].astype(np.float64)
+    return result
@@ -0,0 +1,337 @@
+"""Territorial hierarchy from NUTS II down to parishes (freguesias), with single-pass rollups.
+
+The INE density export has a row for every territorial unit. Its NUTS codes
+nest by prefix:
+
+* NUTS II: 2 characters (``11``)
+* NUTS III: 3 characters (``111``)
+* municipality: 7 characters (``1111601``), whose last four digits are
+  the district/municipality code (DICO)
+* parish: the municipality code followed by the parish number
+
+Parishes are keyed like municipalities, with an integer ``Código_Concelho``
+equal to the 6-digit DICOFRE code: DICO x 100 + parish number. The INE
+income workbook and CAOP parish boundaries use that code, so parish
+frames go through :func:`scripts.municipalities.join_sources`,
+:func:`scripts.core.join` and :func:`scripts.ranking.add_ranks`
+unchanged, with parish names in ``Concelho``.
+
+:func:`rollup` computes every coarser level from the parishes in one pass.
+The parishes are sorted once by NUTS code, which keeps every municipality,
+NUTS III and NUTS II region a contiguous run. Each level is then one
+``np.add.reduceat`` over the level below, as in :mod:`scripts.tiles`:
+
+* stations, connection points and households are summed
+* income is the mean of the children weighted by households
+* density is not additive without areas, so every unit keeps the density
+  INE reports for it
+
+    build-hierarchy --chargers data/eredes.csv --output-dir data/hierarchy
+"""
+
+import argparse
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts import core, eredes, ine, instrument, municipalities, ranking
+from scripts.instrument import instrumented
+from scripts.municipalities import KEY, NAME
+
+logger = logging.getLogger(__name__)
+
+CODE = "Código_NUTS"
+LEVEL = "Nível"
+LEVELS = ("nuts2", "nuts3", "municipality", "parish")
+PREFIX_LENGTHS = {"nuts2": 2, "nuts3": 3, "municipality": 7}
+PARISH_CODE_COLUMN = "CodDistritoConcelhoFreguesia"
+PARISHES = "parishes"
+HOUSEHOLDS = ine.HOUSEHOLDS_COLUMN
+STATIONS = ranking.METRICS["stations"]
+POINTS = ranking.METRICS["points"]
+DENSITY = ranking.METRICS["density"]
+INCOME = ranking.METRICS["income"]
+DEFAULT_OUTPUT_DIR = Path("data/hierarchy")
+
+
+def parish_keys(codes: pd.Series) -> pd.Series:
+    """Map DICOFRE codes or INE parish NUTS codes to integer parish keys.
+
+    DICOFRE codes have six digits, or five once read as integers. NUTS
+    parish codes are longer than the 7-character municipality code, whose
+    last four digits are the DICO. Anything else becomes ``<NA>``.
+    """
+    digits = codes.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    lengths = digits.str.len()
+    dicofre = pd.to_numeric(digits.where(lengths.isin([5, 6]) & digits.str.fullmatch(r"\d+", na=False)))
+    nuts = digits.where((lengths > 7) & digits.str[3:].str.fullmatch(r"\d+", na=False))
+    from_nuts = pd.to_numeric(nuts.str[3:7]) * 100 + pd.to_numeric(nuts.str[7:])
+    return dicofre.fillna(from_nuts).astype("Int32")
+
+
+@instrumented
+def read_units(path: str | Path = ine.DENSITY_PATH, year: int = 2024) -> pd.DataFrame:
+    """Every NUTS II, NUTS III, municipality and parish in the density export, with its reported density."""
+    data = ine.read_density(path, years={year}, nuts_length=None).data
+    lengths = data[CODE].str.len().to_numpy()
+    levels = np.select(
+        [lengths == 2, lengths == 3, lengths == 7, lengths > 7],
+        LEVELS,
+        default="",
+    )
+    keys = municipalities.codes_to_keys(data[CODE]).where(levels == "municipality")
+    keys = keys.fillna(parish_keys(data[CODE]).where(levels == "parish"))
+    units = pd.DataFrame(
+        {
+            LEVEL: levels,
+            CODE: data[CODE],
+            KEY: keys.astype("Int32"),
+            NAME: data["Região"],
+            DENSITY: data[DENSITY],
+        }
+    )
+    return units[levels != ""].reset_index(drop=True)
+
+
+def municipality_density(units: pd.DataFrame) -> pd.DataFrame:
+    """The municipality rows of ``units`` in the layout of :func:`scripts.core.load_density`."""
+    return units.loc[units[LEVEL] == "municipality", [CODE, NAME, DENSITY]].reset_index(drop=True)
+
+
+@instrumented
+def read_parish_income(path: str | Path = ine.INCOME_PATH) -> pd.DataFrame:
+    """Average declared gross income and households per parish."""
+    df = ine.read_income(path, level="Freguesia")
+    return df.assign(**{KEY: parish_keys(df[ine.INCOME_CODE_COLUMN])}).filter([KEY, NAME, INCOME, HOUSEHOLDS])
+
+
+@instrumented
+def aggregate_parish_chargers(
+    raw: pd.DataFrame,
+    boundaries=None,
+    points_column: str = eredes.POINTS_COLUMN,
+    latest_only: bool = True,
+) -> pd.DataFrame:
+    """Stations and connection points per parish key, for the latest quarter by default.
+
+    Rows are keyed by their ``CodDistritoConcelhoFreguesia`` code when the
+    export has one, and otherwise located in ``boundaries`` (a parish
+    :class:`scripts.boundaries.Boundaries`, keyed by ``DICOFRE``) by their
+    ``lon``/``lat``.
+    """
+    if latest_only and eredes.QUARTER_COLUMN in raw:
+        raw = raw[raw[eredes.QUARTER_COLUMN] == raw[eredes.QUARTER_COLUMN].max()]
+    if PARISH_CODE_COLUMN in raw:
+        keyed = raw.assign(**{KEY: parish_keys(raw[PARISH_CODE_COLUMN])})
+    elif boundaries is not None:
+        keyed = boundaries.assign(raw)
+    else:
+        raise ValueError(f"chargers need a {PARISH_CODE_COLUMN!r} column or parish boundaries to locate them")
+    unresolved = keyed[KEY].isna()
+    if unresolved.any():
+        logger.warning("Dropping %d chargers without a parish", unresolved.sum())
+    return eredes.aggregate_keyed(keyed[~unresolved], points_column)
+
+
+@instrumented
+def join_parishes(units: pd.DataFrame, income: pd.DataFrame, chargers: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Outer join of the parish sources, as :func:`scripts.core.join_outer` does for municipalities.
+
+    Without ``chargers`` the charger columns are missing values, so the
+    parishes still get income and density ranks.
+    """
+    parishes = units[units[LEVEL] == "parish"]
+    table = parishes[[KEY, NAME]].drop_duplicates(KEY).reset_index(drop=True)
+    index = municipalities.MunicipalityIndex(table.assign(name_key=municipalities.fold_names(table[NAME])))
+    sources = {"INE": income, "densidade": parishes[[KEY, DENSITY]]}
+    if chargers is not None:
+        sources["EREDES"] = chargers
+    joined = municipalities.join_sources(index, sources)
+    if chargers is None:
+        joined = joined.assign(**{column: pd.array([pd.NA] * len(joined), dtype="Int64") for column in core.JOIN_COLUMNS})
+    return joined
+
+
+def _runs(codes: np.ndarray) -> np.ndarray:
+    """Start index of every run of equal values in sorted ``codes``."""
+    if not len(codes):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+
+
+@dataclass
+class Level:
+    """Sums of one level's units, sorted by NUTS code.
+
+    Every metric is carried as a sum and a count of the children that
+    reported it, so a unit whose children are all missing stays missing.
+    Income is carried as its households-weighted sum and weight.
+    """
+
+    name: str
+    codes: np.ndarray
+    sums: dict[str, np.ndarray]
+
+    def parent(self, name: str) -> "Level":
+        # Truncating fixed-width strings gives each unit's parent code
+        codes = self.codes.astype(f"U{PREFIX_LENGTHS[name]}")
+        starts = _runs(codes)
+        return Level(name, codes[starts], {column: np.add.reduceat(values, starts) for column, values in self.sums.items()})
+
+    def replace(self, column: str, codes: np.ndarray, values: np.ndarray) -> None:
+        """Use ``values`` for ``column`` of the units in ``codes`` (other units become missing)."""
+        at = pd.Index(codes).get_indexer(self.codes)
+        found = at >= 0
+        self.sums[column] = np.where(found, values[np.maximum(at, 0)], 0.0)
+        self.sums[f"{column}_known"] = found.astype(np.float64)
+
+    def frame(self) -> pd.DataFrame:
+        sums = self.sums
+        with np.errstate(invalid="ignore", divide="ignore"):
+            income = sums["income_weighted"] / sums["income_weight"]
+        df = pd.DataFrame(
+            {
+                CODE: pd.array(self.codes, dtype="string"),
+                PARISHES: sums[PARISHES].astype(np.int64),
+                HOUSEHOLDS: np.where(sums[f"{HOUSEHOLDS}_known"] > 0, sums[HOUSEHOLDS], np.nan),
+                INCOME: np.where(sums["income_weight"] > 0, income, np.nan),
+            }
+        )
+        for column in (STATIONS, POINTS):
+            counts = pd.array(sums[column].round().astype(np.int64), dtype="Int64")
+            counts[sums[f"{column}_known"] == 0] = pd.NA
+            df[column] = counts
+        return df
+
+
+def _parish_level(parishes: pd.DataFrame, reference: pd.DataFrame) -> tuple[Level, pd.DataFrame]:
+    """The parish level sorted by NUTS code, and the parishes of the reference in the same order."""
+    parishes = parishes.rename(columns=core.JOIN_COLUMNS).drop_duplicates(KEY)
+    codes = reference[CODE].to_numpy(dtype=str)
+    order = np.argsort(codes, kind="stable")
+    reference = reference.iloc[order].reset_index(drop=True)
+    at = pd.Index(parishes[KEY]).get_indexer(reference[KEY])
+    found = at >= 0
+
+    def column(name: str) -> np.ndarray:
+        values = pd.to_numeric(parishes[name]).to_numpy(dtype=np.float64, na_value=np.nan)[np.maximum(at, 0)]
+        return np.where(found, values, np.nan)
+
+    sums = {PARISHES: np.ones(len(reference))}
+    for name in (STATIONS, POINTS, HOUSEHOLDS):
+        values = column(name) if name in parishes else np.full(len(reference), np.nan)
+        sums[name] = np.nan_to_num(values)
+        sums[f"{name}_known"] = (~np.isnan(values)).astype(np.float64)
+    income = column(INCOME) if INCOME in parishes else np.full(len(reference), np.nan)
+    # Without household counts every parish weighs the same
+    weight = column(HOUSEHOLDS) if HOUSEHOLDS in parishes else np.ones(len(reference))
+    weighted = ~np.isnan(income) & ~np.isnan(weight)
+    sums["income_weighted"] = np.where(weighted, income * weight, 0.0)
+    sums["income_weight"] = np.where(weighted, weight, 0.0)
+    return Level("parish", codes[order], sums), reference
+
+
+@instrumented
+def rollup(
+    parishes: pd.DataFrame,
+    units: pd.DataFrame,
+    municipal_chargers: pd.DataFrame | None = None,
+) -> dict[str, pd.DataFrame]:
+    """Metrics of every level, from the parish metrics in one sorted pass.
+
+    ``parishes`` has a parish ``Código_Concelho`` and any of the charger,
+    income and household columns, e.g. a :func:`join_parishes` result.
+    Every parish of ``units`` is included. ``municipal_chargers``, a
+    per-municipality aggregate such as :func:`scripts.core.aggregate_chargers`,
+    replaces the municipality charger counts, and the NUTS levels are then
+    summed from it. Returns a frame per level, coarsest first, with the
+    column names of ``join_df``.
+    """
+    references = {
+        name: reference.drop_duplicates(KEY if name in ("municipality", "parish") else CODE)[[CODE, KEY, NAME, DENSITY]]
+        for name, reference in units.groupby(LEVEL, sort=False)
+    }
+    level, reference = _parish_level(parishes, references["parish"])
+    frames = {"parish": pd.concat([reference, level.frame().drop(columns=CODE)], axis=1)}
+    for name in ("municipality", "nuts3", "nuts2"):
+        level = level.parent(name)
+        if name == "municipality" and municipal_chargers is not None:
+            counts = references[name][[CODE, KEY]].merge(municipal_chargers.rename(columns=core.JOIN_COLUMNS), on=KEY)
+            for column in (STATIONS, POINTS):
+                level.replace(column, counts[CODE].to_numpy(dtype=str), counts[column].to_numpy(dtype=np.float64))
+        reference = references[name] if name == "municipality" else references[name].drop(columns=KEY)
+        frames[name] = reference.merge(level.frame(), on=CODE, how="right")
+    return {name: frames[name] for name in LEVELS}
+
+
+def _write_csv(df: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _read_chargers(path: Path) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path, sep=";")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--density", default=str(ine.DENSITY_PATH), help="INE density export with parish rows")
+    parser.add_argument("--income", default=str(ine.INCOME_PATH), help="INE income workbook with parish rows")
+    parser.add_argument("--year", type=int, default=2024)
+    parser.add_argument(
+        "--chargers",
+        type=Path,
+        help=f"charger export with a {PARISH_CODE_COLUMN} column, or lon/lat chargers located with --parish-boundaries",
+    )
+    parser.add_argument("--parish-boundaries", type=Path, help="CAOP parish GeoJSON with DICOFRE codes")
+    parser.add_argument("--points-column", default=eredes.POINTS_COLUMN)
+    parser.add_argument(
+        "--eredes",
+        nargs="+",
+        type=Path,
+        help="E-REDES exports or partitions; their per-municipality counts replace the parish sums from the municipality up",
+    )
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--top", type=int, default=5, help="units printed per level")
+    instrument.add_argument(parser, "build-hierarchy")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    units = read_units(args.density, args.year)
+    parish_chargers = None
+    if args.chargers:
+        boundaries = None
+        if args.parish_boundaries:
+            from scripts.boundaries import Boundaries
+
+            boundaries = Boundaries.from_geojson(args.parish_boundaries, key_property="DICOFRE")
+        parish_chargers = aggregate_parish_chargers(_read_chargers(args.chargers), boundaries, args.points_column)
+    municipal_chargers = None
+    if args.eredes:
+        municipal_chargers = core.aggregate_charger_files(args.eredes, municipality_density(units))
+
+    joined = join_parishes(units, read_parish_income(args.income), parish_chargers)
+    levels = rollup(joined, units, municipal_chargers)
+    levels["parish"] = core.rank(core.join(joined)).merge(levels["parish"][[KEY, CODE]], on=KEY, how="left")
+    for name in LEVELS:
+        df = levels[name] if name == "parish" else ranking.add_ranks(levels[name])
+        _write_csv(df, args.output_dir / f"{name}.csv")
+        top = df.nlargest(args.top, "rank_points")
+        print(f"{name}: {len(df)} units, top {len(top)} by connection points")
+        print(top[[CODE, NAME, POINTS, STATIONS, INCOME, DENSITY]].to_string(index=False))
+    print(f"levels written to {args.output_dir}")
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Readers for the INE (Instituto Nacional de Estatística) exports.
+
+INE tabulator CSVs are laid out for spreadsheet users: a block of metadata
+lines, a column header, data rows where the year only appears on the first
+row of each year and the region is written as ``"<NUTS code>: <name>"``,
+``x`` for confidential values, decimal commas, and a footer with the source
+and last update. :func:`read_tabulator_csv` handles all of that in a single
+streaming pass over the file.
+
+The income workbooks are large Excel files of which only a few columns are
+used. :func:`read_income` streams the sheet in read-only mode, keeps the
+needed columns and rows, and stores the result as Parquet keyed by the
+workbook hash so later runs skip openpyxl entirely.
+"""
+
+import csv
+import hashlib
+import logging
+import os
+import re
+from collections.abc import Collection
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.cache import DEFAULT_CACHE_DIR, file_digest
+from scripts.instrument import instrumented
+
+logger = logging.getLogger(__name__)
+
+DENSITY_PATH = Path("data/ine_densidade_populacional.csv")
+MUNICIPALITY_NUTS_LENGTH = 7
+
+INCOME_PATH = Path("data/ERendimentoNLocal2023.xlsx")
+INCOME_SHEET = "Agregados_pub_2023"
+INCOME_COLUMN = "Rendimento bruto declarado médio por agregado fiscal"
+INCOME_CODE_COLUMN = "Código territorial"
+HOUSEHOLDS_COLUMN = "Número de agregados fiscais"
+# Bump when the cached income artifact layout changes
+_INCOME_CACHE_VERSION = 2
+
+# NUTS codes are "PT" or start with a digit ("1", "11", "111", "1111601", ...)
+_REGION = re.compile(r"^\s*(PT|\d[0-9A-Z]*)\s*:\s*(.*?)\s*$")
+_MISSING = {"", "x", "-", "..", "…"}
+
+
+@dataclass
+class TabulatorTable:
+    """Parsed INE tabulator export."""
+
+    data: pd.DataFrame
+    header: list[str] = field(default_factory=list)
+    footer: list[str] = field(default_factory=list)
+
+
+def _to_float(value: str) -> float:
+    value = value.strip()
+    if value in _MISSING:
+        return np.nan
+    try:
+        return float(value.replace(" ", "").replace(",", "."))
+    except ValueError:
+        return np.nan
+
+
+def read_tabulator_csv(
+    path: str | Path,
+    value_columns: dict[int, str],
+    years: Collection[int] | None = None,
+    nuts_length: int | None = None,
+    encoding: str = "latin-1",
+) -> TabulatorTable:
+    """Stream an INE tabulator CSV into typed columns.
+
+    ``value_columns`` maps column positions to output names; the first two
+    columns are always the year and the region. Rows outside ``years`` or
+    whose NUTS code does not have ``nuts_length`` characters are dropped
+    before their values are parsed. Lines before the first data row are
+    returned as ``header`` and lines after the last one as ``footer``.
+    """
+    header: list[str] = []
+    footer: list[str] = []
+    out_years: list[int] = []
+    codes: list[str] = []
+    names: list[str] = []
+    values: dict[str, list[float]] = {name: [] for name in value_columns.values()}
+
+    year = None
+    in_data = False
+    with open(path, newline="", encoding=encoding) as f:
+        for row in csv.reader(f, delimiter=";"):
+            match = _REGION.match(row[1]) if len(row) > 1 else None
+            if match is None:
+                if not any(cell.strip() for cell in row):
+                    continue
+                (footer if in_data else header).append(";".join(row).rstrip(";"))
+                continue
+
+            in_data = True
+            if row[0].strip():
+                year = int(row[0].strip())
+            if years is not None and year not in years:
+                continue
+            code, name = match.groups()
+            if nuts_length is not None and len(code) != nuts_length:
+                continue
+
+            out_years.append(year)
+            codes.append(code)
+            names.append(name)
+            for position, column in value_columns.items():
+                values[column].append(_to_float(row[position]) if position < len(row) else np.nan)
+
+    data = pd.DataFrame(
+        {
+            "Ano": np.array(out_years, dtype=np.int16),
+            "Código_NUTS": pd.array(codes, dtype="string"),
+            "Região": pd.array(names, dtype="string"),
+            **{column: np.array(column_values, dtype=np.float64) for column, column_values in values.items()},
+        }
+    )
+    return TabulatorTable(data=data, header=header, footer=footer)
+
+
+@instrumented
+def read_density(
+    path: str | Path = DENSITY_PATH,
+    years: Collection[int] | None = (2024,),
+    nuts_length: int | None = MUNICIPALITY_NUTS_LENGTH,
+) -> TabulatorTable:
+    """Read the population density export (persons per km², indicator 0011627)."""
+    return read_tabulator_csv(
+        path,
+        value_columns={2: "Densidade_Populacional_km2", 4: "Freguesias"},
+        years=years,
+        nuts_length=nuts_length,
+    )
+
+
+def _read_income_sheet(path: Path, sheet: str, header_row: int, level: str) -> pd.DataFrame:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet]
+        header_cells = next(worksheet.iter_rows(min_row=header_row + 1, max_row=header_row + 1, values_only=True))
+        header = [str(cell).strip() if cell is not None else "" for cell in header_cells]
+        level_at = header.index("Nível territorial")
+        name_at = header.index("Designação")
+        income_at = header.index(INCOME_COLUMN)
+        code_at = header.index(INCOME_CODE_COLUMN) if INCOME_CODE_COLUMN in header else None
+        if code_at is None:
+            logger.warning("%s has no %r column", path, INCOME_CODE_COLUMN)
+        households_at = header.index(HOUSEHOLDS_COLUMN) if HOUSEHOLDS_COLUMN in header else None
+
+        # Only materialize the span of columns that is actually used
+        used = [at for at in (level_at, name_at, income_at, code_at, households_at) if at is not None]
+        first, last = min(used), max(used)
+        level_at, name_at, income_at = level_at - first, name_at - first, income_at - first
+        if code_at is not None:
+            code_at -= first
+        if households_at is not None:
+            households_at -= first
+        rows = worksheet.iter_rows(min_row=header_row + 2, min_col=first + 1, max_col=last + 1, values_only=True)
+
+        codes, names, incomes, households = [], [], [], []
+        for row in rows:
+            if len(row) <= level_at or row[level_at] != level:
+                continue
+            names.append(str(row[name_at]).strip())
+            incomes.append(row[income_at])
+            if code_at is not None:
+                codes.append(None if row[code_at] is None else str(row[code_at]).strip())
+            if households_at is not None:
+                households.append(row[households_at])
+    finally:
+        workbook.close()
+
+    data = {"Concelho": pd.array(names, dtype="string")}
+    if code_at is not None:
+        data[INCOME_CODE_COLUMN] = pd.array(codes, dtype="string")
+    data[INCOME_COLUMN] = pd.to_numeric(pd.Series(incomes, dtype=object), errors="coerce").astype(np.float64)
+    if households_at is not None:
+        data[HOUSEHOLDS_COLUMN] = pd.to_numeric(pd.Series(households, dtype=object), errors="coerce").astype(np.float64)
+    return pd.DataFrame(data)
+
+
+@instrumented
+def read_income(
+    path: str | Path = INCOME_PATH,
+    sheet: str = INCOME_SHEET,
+    header_row: int = 1,
+    level: str = "Município",
+    cache_dir: str | Path | None = DEFAULT_CACHE_DIR / "ine",
+) -> pd.DataFrame:
+    """Read average declared gross income per household for one territorial level.
+
+    ``header_row`` is zero-based, like ``pd.read_excel(header=...)``. The
+    result is cached under ``cache_dir`` keyed by the workbook content hash
+    and the read options; pass ``cache_dir=None`` to always parse the file.
+    """
+    path = Path(path)
+    if cache_dir is None:
+        return _read_income_sheet(path, sheet, header_row, level)
+
+    options = f"{sheet}|{header_row}|{level}|{_INCOME_CACHE_VERSION}"
+    key = file_digest(path)[:32] + "-" + hashlib.sha256(options.encode()).hexdigest()[:8]
+    artifact = Path(cache_dir) / f"{path.stem}-{key}.parquet"
+    if artifact.exists():
+        return pd.read_parquet(artifact)
+
+    df = _read_income_sheet(path, sheet, header_row, level)
+    artifact.parent.mkdir(parents=True, exist_ok=True)
+    tmp_artifact = artifact.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp_artifact, index=False)
+    os.replace(tmp_artifact, artifact)
+    return df
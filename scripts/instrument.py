@@ -0,0 +1,305 @@
+"""Per-stage timing and memory instrumentation with Chrome trace output.
+
+A stage is a block of work, such as a download, a parse or a join, that
+gets one :class:`Span`. The span records:
+
+* wall time
+* process CPU time
+* rows in and rows out (the first dimension of frames and arrays)
+* the peak memory traced by ``tracemalloc`` while the stage ran, relative
+  to the traced memory when it started
+
+Stages nest: a stage's peak includes the peaks of the stages it contains.
+``tracemalloc`` traces the whole process, so while several threads run
+stages at once their peaks overlap.
+Stages are marked either with the :func:`stage` context manager or with
+the :func:`instrumented` decorator:
+
+    with instrument.stage("parse_income", rows_in=len(raw)) as span:
+        income = parse(raw)
+        span.rows_out = len(income)
+
+Recording is off unless a :class:`Profiler` is enabled. The CLIs enable
+one with ``--profile [TRACE]``. While recording is off, :func:`stage`
+returns a shared do-nothing object and a decorated function only adds one
+global lookup per call, so the hooks can stay in the code.
+
+Work done in worker processes is recorded there with :func:`recording`.
+The spans are sent back with the results and merged with
+:meth:`Profiler.extend`. :meth:`Profiler.write_trace` writes the Chrome
+trace event format, which ``chrome://tracing`` and https://ui.perfetto.dev
+can open, and :meth:`Profiler.summary` gives a per-stage table.
+
+Only the standard library is imported here, so the lightweight CLIs stay
+within their import-time budgets.
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_TRACE_DIR = Path("data/profile")
+
+
+@dataclass
+class Span:
+    """One recorded stage; ``start`` is a Unix timestamp, durations are in seconds."""
+
+    name: str
+    start: float
+    wall: float = 0.0
+    cpu: float = 0.0
+    rows_in: int | None = None
+    rows_out: int | None = None
+    peak_bytes: int | None = None
+    pid: int = 0
+    thread: int = 0
+
+
+def rows(value) -> int | None:
+    """Rows of a frame or array, summed over lists and tuples; ``None`` for anything else."""
+    shape = getattr(value, "shape", None)
+    if shape:
+        return int(shape[0])
+    if isinstance(value, (list, tuple)):
+        counts = [count for count in map(rows, value) if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+class Profiler:
+    """Collects spans; see the module docstring."""
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+
+    def start(self) -> None:
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self) -> None:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int | None = None) -> Iterator[Span]:
+        stack = self._local.__dict__.setdefault("stack", [])
+        span = Span(name, time.time(), rows_in=rows_in, pid=os.getpid(), thread=threading.get_ident())
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # The enclosing stage's peak so far must survive the reset
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            frame = [current, current]
+            stack.append(frame)
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.wall = time.perf_counter() - wall
+            span.cpu = time.process_time() - cpu
+            if tracing:
+                stack.pop()
+                peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+                span.peak_bytes = max(peak - frame[0], 0)
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], peak)
+                tracemalloc.reset_peak()
+            with self._lock:
+                self.spans.append(span)
+
+    def extend(self, spans: list[Span]) -> None:
+        """Add spans recorded elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self.spans.extend(spans)
+
+    def chrome_trace(self) -> dict:
+        """The spans as Chrome trace events (complete events, microseconds from the first span)."""
+        origin = min((span.start for span in self.spans), default=0.0)
+        main = os.getpid()
+        events = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "args": {"name": "main" if pid == main else f"worker {pid}"},
+            }
+            for pid in sorted({span.pid for span in self.spans})
+        ]
+        for span in sorted(self.spans, key=lambda span: span.start):
+            args = {"cpu_ms": round(span.cpu * 1000, 3)}
+            for field in ("rows_in", "rows_out", "peak_bytes"):
+                if getattr(span, field) is not None:
+                    args[field] = getattr(span, field)
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": round((span.start - origin) * 1e6, 1),
+                    "dur": round(span.wall * 1e6, 1),
+                    "pid": span.pid,
+                    "tid": span.thread,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(self.chrome_trace()))
+        os.replace(tmp_path, path)
+        return path
+
+    def summary(self) -> str:
+        """One line per stage name, in order of first appearance, with totals over its calls."""
+        totals: dict[str, dict] = {}
+        for span in sorted(self.spans, key=lambda span: span.start):
+            total = totals.setdefault(
+                span.name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "rows_in": None, "rows_out": None, "peak": None}
+            )
+            total["calls"] += 1
+            total["wall"] += span.wall
+            total["cpu"] += span.cpu
+            for field, value in (("rows_in", span.rows_in), ("rows_out", span.rows_out)):
+                if value is not None:
+                    total[field] = (total[field] or 0) + value
+            if span.peak_bytes is not None:
+                total["peak"] = max(total["peak"] or 0, span.peak_bytes)
+
+        def cell(value) -> str:
+            return "" if value is None else str(value)
+
+        lines = [f"{'stage':<40} {'calls':>5} {'wall s':>8} {'cpu s':>8} {'rows in':>10} {'rows out':>10} {'peak MiB':>9}"]
+        for name, total in totals.items():
+            peak = "" if total["peak"] is None else f"{total['peak'] / 2**20:.1f}"
+            lines.append(
+                f"{name:<40} {total['calls']:>5} {total['wall']:>8.3f} {total['cpu']:>8.3f} "
+                f"{cell(total['rows_in']):>10} {cell(total['rows_out']):>10} {peak:>9}"
+            )
+        return "\n".join(lines)
+
+
+class _Disabled:
+    """Stands in for both the context manager and the span while recording is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    def __setattr__(self, name, value) -> None:
+        pass
+
+
+_DISABLED = _Disabled()
+_active: Profiler | None = None
+
+
+def active() -> Profiler | None:
+    return _active
+
+
+def enable(memory: bool = True) -> Profiler:
+    """Start recording into a new profiler, which replaces any active one."""
+    global _active
+    if _active is not None:
+        _active.stop()
+    _active = Profiler(memory)
+    _active.start()
+    return _active
+
+
+def disable() -> Profiler | None:
+    """Stop recording and return the profiler that was active."""
+    global _active
+    profiler, _active = _active, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+@contextmanager
+def recording(memory: bool = True) -> Iterator[Profiler]:
+    """Record the block into a fresh profiler, then restore whatever was active before."""
+    global _active
+    previous = _active
+    profiler = Profiler(memory)
+    profiler.start()
+    _active = profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+        profiler.stop()
+
+
+def stage(name: str, rows_in: int | None = None):
+    """Record the enclosed block as a stage, or do nothing while recording is off."""
+    if _active is None:
+        return _DISABLED
+    return _active.stage(name, rows_in)
+
+
+def instrumented(func: Callable | None = None, *, name: str | None = None):
+    """Record every call of ``func`` as a stage, counting frame arguments as rows in and the result as rows out.
+
+    The stage is named ``<module>.<qualified name>`` unless ``name`` is given.
+    """
+    if func is None:
+        return functools.partial(instrumented, name=name)
+    label = name or f"{func.__module__.rpartition('.')[2]}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active is None:
+            return func(*args, **kwargs)
+        with _active.stage(label, rows((*args, *kwargs.values()))) as span:
+            result = func(*args, **kwargs)
+            span.rows_out = rows(result)
+            return result
+
+    return wrapper
+
+
+def add_argument(parser, name: str) -> None:
+    """Add ``--profile [TRACE]`` to a CLI; the trace defaults to ``data/profile/<name>.json``."""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        type=Path,
+        const=DEFAULT_TRACE_DIR / f"{name}.json",
+        metavar="TRACE",
+        help="record per-stage time and memory and write a Chrome trace (default %(const)s)",
+    )
+
+
+def report(profiler: Profiler | None, path: Path | None) -> None:
+    """Write the trace of a ``--profile`` run and print the summary table to stderr."""
+    if profiler is None or path is None:
+        return
+    profiler.write_trace(path)
+    print(profiler.summary(), file=sys.stderr)
+    print(f"trace written to {path}", file=sys.stderr)
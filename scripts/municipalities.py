@@ -0,0 +1,154 @@
+"""Canonical municipality reference and code-keyed joins.
+
+Every source identifies municipalities differently: the INE density export
+uses 7-digit NUTS 2013 codes (``1111601``), E-REDES uses the 4-digit
+district/municipality code ``CodDistritoConcelho`` (``1601``) and the
+names differ in casing, accents and typos. The last four digits of the
+NUTS code are the district/municipality code, so both map to the same
+integer key, ``Código_Concelho``.
+
+Rows without a usable code are resolved by name: first through an index of
+accent- and case-folded names, then with a fuzzy match for the few names
+that still differ.
+"""
+
+import difflib
+import logging
+from dataclasses import dataclass
+
+import pandas as pd
+
+from scripts.instrument import instrumented
+
+logger = logging.getLogger(__name__)
+
+KEY = "Código_Concelho"
+NAME = "Concelho"
+FUZZY_CUTOFF = 0.85
+
+
+def fold_names(names: pd.Series) -> pd.Series:
+    """Accent- and case-fold names so "Freixo de Espada À Cinta" matches "freixo de espada a cinta"."""
+    return (
+        names.astype("string")
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .str.lower()
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def codes_to_keys(codes: pd.Series) -> pd.Series:
+    """Map NUTS 2013 municipality codes or district/municipality codes to integer keys.
+
+    7-digit NUTS codes keep their last four digits; codes of up to four digits
+    are already district/municipality codes (integers lose the leading zero,
+    which does not matter for the key). Anything else becomes ``<NA>``.
+    """
+    digits = codes.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    lengths = digits.str.len()
+    keys = digits.where(lengths <= 4).fillna(digits.where(lengths == 7).str[3:])
+    keys = keys.where(keys.str.fullmatch(r"\d+", na=False))
+    return pd.to_numeric(keys, errors="coerce").astype("Int32")
+
+
+@dataclass
+class MunicipalityIndex:
+    """Reference table of municipalities with an integer key and a folded-name index."""
+
+    table: pd.DataFrame
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, name_column: str = NAME, code_column: str = "Código_NUTS"):
+        """Build the reference from a frame that has a code for every municipality."""
+        table = pd.DataFrame(
+            {
+                KEY: codes_to_keys(df[code_column]).to_numpy(),
+                NAME: df[name_column].astype("string").to_numpy(),
+            }
+        ).dropna(subset=[KEY])
+        table = table.drop_duplicates(KEY).reset_index(drop=True)
+        table["name_key"] = fold_names(table[NAME])
+        return cls(table)
+
+    def resolve(self, names: pd.Series, codes: pd.Series | None = None) -> pd.Series:
+        """Return the integer key for each row, preferring codes over names."""
+        if codes is not None:
+            keys = codes_to_keys(codes)
+            keys = keys.where(keys.isin(self.table[KEY]))
+        else:
+            keys = pd.Series(pd.NA, index=names.index, dtype="Int32")
+
+        missing = keys.isna()
+        if missing.any():
+            by_name = pd.Series(self.table[KEY].to_numpy(), index=self.table["name_key"].to_numpy())
+            by_name = by_name[~by_name.index.duplicated()]
+            folded = fold_names(names[missing])
+            keys[missing] = folded.map(by_name).astype("Int32")
+
+            unmatched = keys.isna() & names.notna()
+            if unmatched.any():
+                choices = by_name.index.tolist()
+                fuzzy = {}
+                for name in fold_names(names[unmatched]).unique():
+                    match = difflib.get_close_matches(name, choices, n=1, cutoff=FUZZY_CUTOFF)
+                    if match:
+                        fuzzy[name] = by_name[match[0]]
+                        logger.info("Fuzzy matched %r to %r", name, match[0])
+                keys[unmatched] = fold_names(names[unmatched]).map(fuzzy).astype("Int32")
+        return keys
+
+    def attach(self, df: pd.DataFrame, name_column: str = NAME, code_column: str | None = None) -> pd.DataFrame:
+        """Return ``df`` with a ``Código_Concelho`` column resolved from codes and names."""
+        codes = df[code_column] if code_column is not None and code_column in df else None
+        return df.assign(**{KEY: self.resolve(df[name_column], codes)})
+
+
+@instrumented
+def join_sources(index: MunicipalityIndex, sources: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Outer join keyed sources and flag which ones each municipality appears in.
+
+    Every frame in ``sources`` must have a ``Código_Concelho`` column; only
+    the first row of a municipality is kept and name columns are dropped in
+    favour of the canonical name. The union of the keys is built once and every
+    source is aligned to it in a single concat, and the ``in_<source>``
+    columns come from key membership, so they are always boolean. The inner
+    join and the lost records both come out of this single join.
+    """
+    frames = {}
+    for source, df in sources.items():
+        unresolved = df[KEY].isna()
+        if unresolved.any():
+            names = df.loc[unresolved, NAME].tolist() if NAME in df else unresolved.sum()
+            logger.warning("%s: no municipality found for %s", source, names)
+        df = df[~unresolved].drop(columns=[NAME], errors="ignore")
+        duplicated = df[KEY].duplicated()
+        if duplicated.any():
+            logger.warning("%s: keeping the first of several rows for %s", source, df.loc[duplicated, KEY].unique().tolist())
+            df = df[~duplicated]
+        # Nullable integers so missing municipalities do not turn counts into floats
+        counts = [c for c, dtype in df.dtypes.items() if c != KEY and pd.api.types.is_integer_dtype(dtype)]
+        frames[source] = df.astype(dict.fromkeys(counts, "Int64")).set_index(KEY)
+
+    reference = index.table[[KEY, NAME]].set_index(KEY)
+    keys = reference.index.append([frame.index for frame in frames.values()]).unique().sort_values()
+    columns = [reference.reindex(keys)]
+    for source, frame in frames.items():
+        columns.append(frame.reindex(keys))
+        columns.append(pd.DataFrame({f"in_{source}": keys.isin(frame.index).astype(bool)}, index=keys))
+    return pd.concat(columns, axis=1).rename_axis(KEY).reset_index()
+
+
+@instrumented
+def inner(joined: pd.DataFrame) -> pd.DataFrame:
+    """Municipalities present in every source of a :func:`join_sources` result."""
+    flags = [column for column in joined if column.startswith("in_")]
+    return joined[joined[flags].all(axis=1)].drop(columns=flags).reset_index(drop=True)
+
+
+def lost(joined: pd.DataFrame) -> pd.DataFrame:
+    """Municipalities missing from at least one source, with their presence flags."""
+    flags = [column for column in joined if column.startswith("in_")]
+    return joined.loc[~joined[flags].all(axis=1), [KEY, NAME, *flags]].reset_index(drop=True)
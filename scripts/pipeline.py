@@ -0,0 +1,364 @@
+"""Headless pipeline from the raw sources to the ranked ``join_df``.
+
+The notebook's cells are expressed as :class:`Stage` objects forming a DAG:
+
+    income ─────────────────────────┐
+    density ──┬─────────────────────┼── joined ── join ── ranked
+    eredes_raw ── eredes_agg ───────┘
+
+Every stage output is memoized as Parquet under ``data/cache/pipeline``,
+keyed by a fingerprint of the stage code (its source and the modules it
+depends on), its parameters, its input files and the fingerprints of its
+upstream stages. A stage only runs when that fingerprint changes, so
+downstream stages of an unchanged input are loaded from disk (or not
+loaded at all). Remote sources cannot be fingerprinted before fetching
+them, so they are marked ``volatile``: they always run (cheaply, through
+:class:`scripts.cache.DatasetCache`) and are keyed by the content of their
+output instead.
+
+Independent branches run concurrently in a process pool.
+
+With ``--eredes-dir`` the charger data comes from the quarterly partitions
+written by ``download-eredes-chargers`` instead of the remote export: the
+latest partition is aggregated in chunks by a single ``eredes_agg`` stage,
+fingerprinted by the partition file like any other input.
+
+With ``--boundaries`` (a municipality GeoJSON such as CAOP) chargers are
+attributed to the municipality whose polygon contains their coordinates
+rather than by their ``Concelho`` label; the boundary file is then an
+input of ``eredes_agg``.
+
+    run-pipeline --output data/join_df.parquet
+    run-pipeline --eredes-dir data/eredes --output data/join_df.parquet
+
+With ``--publish`` the ranked ``join_df`` is also published as a versioned,
+memory-mappable Arrow file (see :mod:`scripts.artifact`) for notebooks,
+CLIs and the metrics service to load instead of rebuilding it.
+
+With ``--profile`` every stage that runs is recorded (see
+:mod:`scripts.instrument`) and a Chrome trace plus a summary table are
+written at the end.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import ModuleType
+
+import pandas as pd
+
+from scripts import artifact, cache, core, eredes, ine, instrument, municipalities, ranking
+from scripts import boundaries as boundaries_module
+from scripts.cache import DEFAULT_CACHE_DIR, file_digest, frame_digest
+from scripts.download_eredes_chargers import local_quarters, partition_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PIPELINE_CACHE = DEFAULT_CACHE_DIR / "pipeline"
+EREDES_URL = core.EREDES_URL
+
+
+@dataclass
+class Stage:
+    """One transformation; ``func`` receives the upstream outputs in ``inputs`` order."""
+
+    name: str
+    func: Callable[..., pd.DataFrame]
+    inputs: tuple[str, ...] = ()
+    files: tuple[str, ...] = ()
+    code: tuple[ModuleType, ...] = ()
+    params: dict = field(default_factory=dict)
+    volatile: bool = False
+
+    def fingerprint(self, upstream: list[str]) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.name.encode())
+        digest.update(inspect.getsource(self.func).encode())
+        for module in self.code:
+            digest.update(file_digest(module.__file__).encode())
+        digest.update(json.dumps(self.params, sort_keys=True, default=str).encode())
+        for path in self.files:
+            digest.update(file_digest(path).encode())
+        for fingerprint in upstream:
+            digest.update(fingerprint.encode())
+        return digest.hexdigest()
+
+
+@dataclass
+class StageRun:
+    """What happened to one stage in a pipeline run."""
+
+    name: str
+    fingerprint: str
+    path: Path
+    status: str
+    rows: int | None = None
+    seconds: float = 0.0
+
+
+def income(path: str) -> pd.DataFrame:
+    # The stage output is already memoized, so skip the income reader's own cache
+    df = ine.read_income(path, cache_dir=None)
+    return df.filter(["Concelho", ine.INCOME_CODE_COLUMN, ine.INCOME_COLUMN])
+
+
+def density(path: str, year: int) -> pd.DataFrame:
+    return core.load_density(path, year)
+
+
+def eredes_raw(url: str) -> pd.DataFrame:
+    return core.load_chargers(url)
+
+
+def eredes_agg(raw: pd.DataFrame, density: pd.DataFrame, boundaries: str | None = None) -> pd.DataFrame:
+    return core.aggregate_chargers(raw, density, boundaries=boundaries)
+
+
+def eredes_stream(density: pd.DataFrame, path: str, boundaries: str | None = None) -> pd.DataFrame:
+    return core.aggregate_charger_files(path, density, boundaries=boundaries)
+
+
+def joined(income: pd.DataFrame, density: pd.DataFrame, chargers: pd.DataFrame) -> pd.DataFrame:
+    return core.join_outer(income, density, chargers)
+
+
+def join(joined: pd.DataFrame) -> pd.DataFrame:
+    return core.join(joined)
+
+
+def ranked(join: pd.DataFrame) -> pd.DataFrame:
+    return core.rank(join)
+
+
+def default_stages(
+    income_path: str = str(ine.INCOME_PATH),
+    density_path: str = str(ine.DENSITY_PATH),
+    density_year: int = 2024,
+    eredes_url: str = EREDES_URL,
+    eredes_dir: str | None = None,
+    boundaries: str | None = None,
+) -> list[Stage]:
+    """The notebook's transformations as a DAG."""
+    # Without a boundary file the fingerprints stay those of label-based attribution
+    boundary_files = (boundaries,) if boundaries else ()
+    boundary_params = {"boundaries": boundaries} if boundaries else {}
+    if eredes_dir is None:
+        chargers = [
+            Stage("eredes_raw", eredes_raw, code=(core, cache), params={"url": eredes_url}, volatile=True),
+            Stage(
+                "eredes_agg",
+                eredes_agg,
+                inputs=("eredes_raw", "density"),
+                files=boundary_files,
+                code=(core, eredes, municipalities, boundaries_module),
+                params=boundary_params,
+            ),
+        ]
+    else:
+        quarters = local_quarters(Path(eredes_dir))
+        if not quarters:
+            raise FileNotFoundError(f"No E-REDES partitions in {eredes_dir}")
+        latest = str(partition_path(Path(eredes_dir), quarters[-1]))
+        chargers = [
+            Stage(
+                "eredes_agg",
+                eredes_stream,
+                inputs=("density",),
+                files=(latest, *boundary_files),
+                code=(core, eredes, municipalities, boundaries_module),
+                params={"path": latest, **boundary_params},
+            )
+        ]
+    return [
+        Stage("income", income, files=(income_path,), code=(ine,), params={"path": income_path}),
+        Stage(
+            "density",
+            density,
+            files=(density_path,),
+            code=(core, ine),
+            params={"path": density_path, "year": density_year},
+        ),
+        *chargers,
+        Stage("joined", joined, inputs=("income", "density", "eredes_agg"), code=(core, municipalities)),
+        Stage("join", join, inputs=("joined",), code=(core, municipalities)),
+        Stage("ranked", ranked, inputs=("join",), code=(core, ranking)),
+    ]
+
+
+def _artifact(cache_dir: Path, name: str, fingerprint: str) -> Path:
+    return cache_dir / f"{name}-{fingerprint[:16]}.parquet"
+
+
+def _write(df: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _execute(
+    name: str,
+    func: Callable,
+    params: dict,
+    fingerprint: str | None,
+    input_paths: list[Path],
+    cache_dir: Path,
+    profile: bool = False,
+):
+    """Run one stage in a worker process, reading inputs from and writing its output to Parquet.
+
+    With ``profile`` the stage is recorded in the worker and its spans are
+    returned for the parent to merge.
+    """
+    with instrument.recording() if profile else contextlib.nullcontext() as profiler:
+        started = time.perf_counter()
+        with instrument.stage(name) as span:
+            with instrument.stage(f"{name}:read_inputs"):
+                frames = [pd.read_parquet(path) for path in input_paths]
+            span.rows_in = instrument.rows(frames)
+            df = func(*frames, **params)
+            span.rows_out = len(df)
+            if fingerprint is None:
+                fingerprint = frame_digest(df)
+            path = _artifact(cache_dir, name, fingerprint)
+            if not path.exists():
+                with instrument.stage(f"{name}:write_output", rows_in=len(df)):
+                    _write(df, path)
+    spans = profiler.spans if profiler is not None else []
+    return fingerprint, path, len(df), time.perf_counter() - started, spans
+
+
+def _prune(cache_dir: Path, name: str, keep: Path) -> None:
+    for path in cache_dir.glob(f"{name}-*.parquet"):
+        if path != keep:
+            path.unlink()
+
+
+def run(
+    stages: list[Stage],
+    cache_dir: Path = DEFAULT_PIPELINE_CACHE,
+    jobs: int | None = None,
+    force: set[str] | frozenset = frozenset(),
+) -> dict[str, StageRun]:
+    """Run ``stages``, reusing every memoized output whose fingerprint is unchanged.
+
+    While a profiler is active (see :mod:`scripts.instrument`), stages that
+    run are recorded in their workers and merged into it.
+    """
+    profiler = instrument.active()
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = set(stage.inputs) - set(by_name)
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {sorted(missing)}")
+
+    runs: dict[str, StageRun] = {}
+    running = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while len(runs) < len(stages):
+            progressed = False
+            for stage in stages:
+                if stage.name in runs or stage.name in running.values():
+                    continue
+                if not all(name in runs for name in stage.inputs):
+                    continue
+                upstream = [runs[name] for name in stage.inputs]
+                fingerprint = None
+                if not stage.volatile:
+                    fingerprint = stage.fingerprint([run.fingerprint for run in upstream])
+                    path = _artifact(cache_dir, stage.name, fingerprint)
+                    if path.exists() and stage.name not in force:
+                        runs[stage.name] = StageRun(stage.name, fingerprint, path, "cached")
+                        progressed = True
+                        continue
+                inputs = [run.path for run in upstream]
+                future = pool.submit(
+                    _execute, stage.name, stage.func, stage.params, fingerprint, inputs, cache_dir, profiler is not None
+                )
+                running[future] = stage.name
+                progressed = True
+
+            if progressed:
+                continue
+            if not running:
+                raise ValueError("Pipeline has a dependency cycle")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                fingerprint, path, rows, seconds, spans = future.result()
+                if profiler is not None:
+                    profiler.extend(spans)
+                runs[name] = StageRun(name, fingerprint, path, "ran", rows, seconds)
+                _prune(cache_dir, name, path)
+                logger.info("%s: ran in %.2fs (%d rows)", name, seconds, rows)
+    return runs
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, help="write the ranked join_df here (.parquet or .csv)")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_PIPELINE_CACHE)
+    parser.add_argument("--jobs", type=int, help="parallel processes (default: CPU count)")
+    parser.add_argument("--force", nargs="*", default=[], help="stages to recompute even if unchanged")
+    parser.add_argument("--income", default=str(ine.INCOME_PATH))
+    parser.add_argument("--density", default=str(ine.DENSITY_PATH))
+    parser.add_argument("--density-year", type=int, default=2024)
+    parser.add_argument("--eredes-url", default=EREDES_URL)
+    parser.add_argument("--eredes-dir", help="aggregate downloaded quarterly partitions instead of the remote export")
+    parser.add_argument("--boundaries", help="municipality GeoJSON; attribute chargers by coordinates, not Concelho")
+    parser.add_argument(
+        "--publish",
+        nargs="?",
+        type=Path,
+        const=artifact.DEFAULT_DIR,
+        metavar="DIR",
+        help="publish the ranked join_df as a versioned Arrow artifact (default %(const)s)",
+    )
+    instrument.add_argument(parser, "run-pipeline")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    stages = default_stages(
+        args.income, args.density, args.density_year, args.eredes_url, args.eredes_dir, args.boundaries
+    )
+    started = time.perf_counter()
+    with instrument.stage("pipeline"):
+        runs = run(stages, args.cache_dir, args.jobs, set(args.force))
+
+    for stage in stages:
+        result = runs[stage.name]
+        timing = f"{result.seconds:.2f}s" if result.status == "ran" else ""
+        print(f"{stage.name:<12} {result.status:<7} {timing:>8}  {result.path}")
+    print(f"total {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    if args.output or args.publish:
+        final = pd.read_parquet(runs[stages[-1].name].path)
+    if args.output:
+        with instrument.stage("write_output", rows_in=len(final)):
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            if args.output.suffix == ".csv":
+                final.to_csv(args.output, index=False)
+            else:
+                final.to_parquet(args.output, index=False)
+    if args.publish:
+        with instrument.stage("publish", rows_in=len(final)):
+            version = artifact.publish(final, args.publish)
+        path = artifact.dataset_dir(args.publish, version.name) / version.file
+        print(f"published {version.name} version {version.version}: {path}")
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
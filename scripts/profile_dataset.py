@@ -0,0 +1,203 @@
+"""Generate ydata-profiling HTML reports, skipping unchanged inputs.
+
+Each report is written next to a ``.json`` sidecar holding the content hash
+of the profiled frame and the profiling configuration. A report is only
+regenerated when either changes (or with ``--force``). Several datasets are
+profiled in parallel in a process pool, and large inputs can be sampled
+down to ``--sample-rows`` rows and profiled in minimal mode, which skips
+correlations and interactions.
+
+Reports are named after the file stem plus a short hash of its path
+(``profile_<stem>-<hash>.html``), so ``2025T2/export.csv`` and
+``2025T3/export.csv`` get a report each.
+
+    profile-dataset data/cache/income.parquet data/eredes/*.csv --sep ";" --minimal
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from scripts import instrument
+from scripts.cache import frame_digest
+
+DEFAULT_OUTPUT_DIR = Path("reports")
+DEFAULT_SAMPLE_ROWS = 100_000
+
+
+@dataclass
+class ProfileResult:
+    """Outcome of profiling one dataset.
+
+    ``rows`` counts the rows of the dataset and ``profiled_rows`` those the
+    report was built from, fewer when it was sampled.
+    """
+
+    name: str
+    output: Path
+    rows: int
+    profiled_rows: int
+    skipped: bool
+    seconds: float
+
+
+def _config(title: str, minimal: bool, sample_rows: int | None) -> dict:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        profiler_version = version("ydata-profiling")
+    except PackageNotFoundError:
+        profiler_version = None
+    return {
+        "title": title,
+        "minimal": minimal,
+        "sample_rows": sample_rows,
+        "ydata_profiling": profiler_version,
+    }
+
+
+@instrument.instrumented
+def profile_frame(
+    df: pd.DataFrame,
+    title: str,
+    output: str | Path,
+    minimal: bool = False,
+    sample_rows: int | None = None,
+    force: bool = False,
+) -> ProfileResult:
+    """Write a profile report of ``df`` to ``output`` unless it is up to date."""
+    started = time.perf_counter()
+    output = Path(output)
+    sidecar = output.with_suffix(".json")
+    config = _config(title, minimal, sample_rows)
+    fingerprint = {"frame": frame_digest(df), "config": config}
+    rows = len(df)
+    if sample_rows is not None and rows > sample_rows:
+        profiled_rows = sample_rows
+    else:
+        profiled_rows = rows
+
+    if not force and output.exists() and sidecar.exists():
+        if json.loads(sidecar.read_text()) == fingerprint:
+            return ProfileResult(title, output, rows, profiled_rows, True, time.perf_counter() - started)
+
+    if profiled_rows < rows:
+        df = df.sample(n=profiled_rows, random_state=0)
+
+    from ydata_profiling import ProfileReport
+
+    # Minimal mode turns off correlations, interactions and other expensive sections
+    report = ProfileReport(df, title=title, minimal=minimal)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report.to_file(output)
+    tmp_sidecar = sidecar.with_suffix(".json.tmp")
+    tmp_sidecar.write_text(json.dumps(fingerprint, indent=2))
+    os.replace(tmp_sidecar, sidecar)
+    return ProfileResult(title, output, rows, profiled_rows, False, time.perf_counter() - started)
+
+
+@instrument.instrumented
+def load_dataset(path: Path, sep: str = ",", encoding: str | None = None) -> pd.DataFrame:
+    """Load a CSV, Parquet or Excel file by extension."""
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    if path.suffix in (".xlsx", ".xls"):
+        return pd.read_excel(path)
+    return pd.read_csv(path, sep=sep, encoding=encoding)
+
+
+def report_path(path: Path, output_dir: Path) -> Path:
+    """Where the report of ``path`` goes, unique per input path rather than per file name."""
+    resolved = path.resolve()
+    try:
+        key = resolved.relative_to(Path.cwd().resolve())
+    except ValueError:
+        key = resolved
+    digest = hashlib.sha256(key.as_posix().encode()).hexdigest()[:8]
+    return output_dir / f"profile_{path.stem}-{digest}.html"
+
+
+def _profile_path(
+    path: Path,
+    output_dir: Path,
+    sep: str,
+    encoding: str | None,
+    minimal: bool,
+    sample_rows: int | None,
+    force: bool,
+    profile: bool = False,
+) -> tuple[ProfileResult, list[instrument.Span]]:
+    with instrument.recording() if profile else contextlib.nullcontext() as profiler:
+        started = time.perf_counter()
+        df = load_dataset(path, sep, encoding)
+        result = profile_frame(
+            df,
+            title=f"Profiling Report {path}",
+            output=report_path(path, output_dir),
+            minimal=minimal,
+            sample_rows=sample_rows,
+            force=force,
+        )
+        result.seconds = time.perf_counter() - started
+    return result, profiler.spans if profiler is not None else []
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("datasets", nargs="+", type=Path, help="CSV, Parquet or Excel files")
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--sep", default=",", help="CSV separator")
+    parser.add_argument("--encoding", help="CSV encoding")
+    parser.add_argument("--minimal", action="store_true", help="skip correlations and interactions")
+    parser.add_argument(
+        "--sample-rows",
+        type=int,
+        help=f"profile a random sample of at most this many rows (default {DEFAULT_SAMPLE_ROWS} with --minimal)",
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="parallel processes")
+    parser.add_argument("--force", action="store_true", help="regenerate even if unchanged")
+    instrument.add_argument(parser, "profile-dataset")
+    args = parser.parse_args(argv)
+
+    sample_rows = args.sample_rows
+    if sample_rows is None and args.minimal:
+        sample_rows = DEFAULT_SAMPLE_ROWS
+
+    # The same file listed twice would have two processes write one report
+    datasets = list({path.resolve(): path for path in args.datasets}.values())
+    profiler = instrument.enable() if args.profile else None
+    with ProcessPoolExecutor(max_workers=min(args.jobs, len(datasets))) as pool:
+        futures = [
+            pool.submit(
+                _profile_path,
+                path,
+                args.output_dir,
+                args.sep,
+                args.encoding,
+                args.minimal,
+                sample_rows,
+                args.force,
+                profiler is not None,
+            )
+            for path in datasets
+        ]
+        for future in futures:
+            result, spans = future.result()
+            if profiler is not None:
+                profiler.extend(spans)
+            status = "up to date" if result.skipped else "generated"
+            sampled = f", {result.profiled_rows} profiled" if result.profiled_rows < result.rows else ""
+            print(f"{result.output}: {status} ({result.rows} rows{sampled}, {result.seconds:.1f}s)")
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
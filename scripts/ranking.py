@@ -0,0 +1,114 @@
+"""Vectorized rankings and top-N comparisons between municipality metrics.
+
+Ranks follow the notebook convention: ascending with ties broken by order
+(``method="first"``), so the best of ``M`` municipalities has rank ``M``.
+The *position* ``M + 1 - rank`` is the 1-based place in the league table.
+
+A municipality is in the top N of a metric when its position is at most N,
+so the values of N for which it is "in the top N of X but not of Y" form
+the interval ``[position_X, position_Y)``. :func:`top_n_intervals`
+computes those intervals for every row at once, which answers the question
+for every N without recomputing ``nlargest``.
+"""
+
+import numpy as np
+import pandas as pd
+
+from scripts.instrument import instrumented
+
+METRICS = {
+    "stations": "num_charging_stations",
+    "points": "total_charging_points",
+    "density": "Densidade_Populacional_km2",
+    "income": "Rendimento bruto declarado médio por agregado fiscal",
+}
+
+
+@instrumented
+def add_ranks(df: pd.DataFrame, metrics: dict[str, str] = METRICS) -> pd.DataFrame:
+    """Return ``df`` with a ``rank_<name>`` column for every metric, ranked in one call."""
+    ranks = df[list(metrics.values())].rank(ascending=True, method="first")
+    ranks.columns = [f"rank_{name}" for name in metrics]
+    return pd.concat([df, ranks], axis=1)
+
+
+def positions(df: pd.DataFrame, names: list[str]) -> np.ndarray:
+    """League table positions (1 = best) as an ``(rows, len(names))`` array.
+
+    Rows with a missing metric have no rank and a NaN position. The others
+    are placed among the rows that have the metric, as ``nlargest`` would.
+    """
+    ranks = df[[f"rank_{name}" for name in names]].to_numpy(dtype=np.float64)
+    return np.count_nonzero(~np.isnan(ranks), axis=0) + 1 - ranks
+
+
+def compressed_ranks(ranks: pd.Series, total: int, top_n: int) -> pd.Series:
+    """Ranks for a slope chart of ``top_n`` rows, with outsiders packed below the top.
+
+    Rows in the top ``top_n`` keep their rank; the others are placed on
+    consecutive slots just below it, in the same order, so the chart does
+    not stretch over the whole table.
+    """
+    threshold = total + 1 - top_n
+    outside = ranks < threshold
+    packed = threshold - ranks[outside].rank(ascending=False, method="first")
+    return ranks.where(~outside, packed)
+
+
+def slope_chart_frame(df: pd.DataFrame, left: str, right: str, top_n: int = 10) -> pd.DataFrame:
+    """Top ``top_n`` rows by ``left`` with a ``rank_<right>_adjusted`` column for plotting."""
+    selected = df.nlargest(top_n, f"rank_{left}").copy()
+    selected[f"rank_{right}_adjusted"] = compressed_ranks(selected[f"rank_{right}"], len(df), top_n)
+    return selected
+
+
+def top_n_intervals(df: pd.DataFrame, include: list[str], exclude: list[str]) -> pd.DataFrame:
+    """For each row, the range of N where it is in the top N of every ``include`` metric but no ``exclude`` one.
+
+    Returns ``start`` and ``stop`` columns (N in ``[start, stop)``); rows that
+    never qualify have ``start >= stop``. A missing metric counts as position
+    ``len(df) + 1``: never in the top N of an ``include`` metric, always
+    outside the top N of an ``exclude`` one.
+    """
+    outside = len(df) + 1
+    start = np.nan_to_num(positions(df, include), nan=outside).max(axis=1)
+    if exclude:
+        stop = np.nan_to_num(positions(df, exclude), nan=outside).min(axis=1)
+    else:
+        stop = np.full(len(df), len(df) + 1)
+    return pd.DataFrame({"start": start, "stop": stop}, index=df.index).astype(np.int64)
+
+
+def top_n_membership(
+    df: pd.DataFrame,
+    include: list[str],
+    exclude: list[str],
+    n_values: np.ndarray | None = None,
+) -> pd.DataFrame:
+    """Boolean matrix with one row per N and one column per row of ``df``.
+
+    ``n_values`` defaults to every N from 1 to ``len(df)``.
+    """
+    intervals = top_n_intervals(df, include, exclude)
+    if n_values is None:
+        n_values = np.arange(1, len(df) + 1)
+    n = np.asarray(n_values)[:, None]
+    matrix = (n >= intervals["start"].to_numpy()) & (n < intervals["stop"].to_numpy())
+    return pd.DataFrame(matrix, index=pd.Index(n_values, name="N"), columns=df.index)
+
+
+def top_n_counts(df: pd.DataFrame, include: list[str], exclude: list[str]) -> pd.Series:
+    """Number of qualifying rows for every N, without building the full matrix."""
+    intervals = top_n_intervals(df, include, exclude)
+    valid = intervals[intervals["start"] < intervals["stop"]]
+    delta = np.zeros(len(df) + 2, dtype=np.int64)
+    np.add.at(delta, valid["start"].to_numpy(), 1)
+    np.add.at(delta, valid["stop"].to_numpy(), -1)
+    return pd.Series(np.cumsum(delta)[1 : len(df) + 1], index=pd.RangeIndex(1, len(df) + 1, name="N"))
+
+
+def top_n_names(df: pd.DataFrame, n: int, include: list[str], exclude: list[str], name_column: str = "Concelho") -> set:
+    """Names of the rows in the top ``n`` of every ``include`` metric but no ``exclude`` one."""
+    intervals = top_n_intervals(df, include, exclude)
+    mask = (intervals["start"] <= n) & (n < intervals["stop"])
+    return set(df.loc[mask, name_column])
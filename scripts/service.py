@@ -0,0 +1,372 @@
+"""Local HTTP query service over the ranked ``join_df``.
+
+The artifact written by ``run-pipeline --output`` (Parquet or CSV; rank
+columns are added if it has none), or the ``manifest.json`` of one
+published with ``run-pipeline --publish``, is loaded once into a
+:class:`Snapshot`.
+Each municipality becomes a JSON-ready record with its metrics and league
+positions (1 = best). The snapshot also holds indexes by code and by
+folded name, and a best-first order for every metric. Queries are then
+dictionary lookups and slices:
+
+    GET /health
+    GET /municipalities/<code or name>      e.g. /municipalities/1106, /municipalities/lisboa
+    GET /top?metric=points&n=10             metric: stations, points, density or income
+    GET /gaps?n=10                          top N by income and density, not by points
+    GET /gaps?n=20&include=income&exclude=points,stations
+
+``/gaps`` uses the intervals from :func:`scripts.ranking.top_n_intervals`.
+They are computed once per combination of metrics and then answer the
+question for any N.
+
+Encoded responses are kept in an LRU cache. A background thread watches
+the artifact's modification time and size. When they change it builds a
+new snapshot, swaps it in and clears the cache. A published manifest is
+replaced by rename on every publish, so watching it follows new versions. A half-written file fails
+to load, so the old snapshot stays in use until the next check.
+
+    serve-metrics --artifact data/join_df.parquet --port 8000
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from scripts import instrument
+from scripts.municipalities import KEY, NAME, fold_names
+from scripts.ranking import METRICS, add_ranks, positions, top_n_intervals
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARTIFACT = Path("data/join_df.parquet")
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_TOP_N = 10
+
+
+class QueryError(ValueError):
+    """A request that cannot be answered, with the HTTP status to report."""
+
+    def __init__(self, message: str, status: HTTPStatus = HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def _value(value):
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def _position(value) -> int | None:
+    return None if math.isnan(value) else int(value)
+
+
+@instrument.instrumented
+def read_artifact(path: str | Path) -> pd.DataFrame:
+    path = Path(path)
+    if path.suffix == ".csv":
+        return pd.read_csv(path)
+    if path.suffix == ".json":
+        from scripts import artifact
+
+        # Arrow-backed columns keep strings in the shared mapping too
+        return artifact.read_manifest(path, arrow_dtypes=True)
+    return pd.read_parquet(path)
+
+
+@dataclass
+class Snapshot:
+    """An immutable, indexed view of one version of the artifact."""
+
+    df: pd.DataFrame
+    version: int
+    loaded_at: float
+    records: list[dict] = field(init=False)
+    by_code: dict[int, int] = field(init=False)
+    by_name: dict[str, int] = field(init=False)
+    orders: dict[str, np.ndarray] = field(init=False)
+    _intervals: dict = field(init=False, default_factory=dict)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        df = self.df.reset_index(drop=True)
+        if not all(f"rank_{name}" in df for name in METRICS if METRICS[name] in df):
+            df = add_ranks(df, {name: column for name, column in METRICS.items() if column in df})
+        self.df = df
+        metrics = [name for name in METRICS if METRICS[name] in df]
+        table = positions(df, metrics)
+        self.records = []
+        for row, (key, name) in enumerate(zip(df[KEY], df[NAME])):
+            self.records.append(
+                {
+                    "code": _value(key),
+                    "name": name,
+                    "metrics": {metric: _value(df.at[row, METRICS[metric]]) for metric in metrics},
+                    "positions": {metric: _position(table[row, column]) for column, metric in enumerate(metrics)},
+                }
+            )
+        self.by_code = {int(key): row for row, key in enumerate(df[KEY]) if not pd.isna(key)}
+        self.by_name = {folded: row for row, folded in enumerate(fold_names(df[NAME])) if not pd.isna(folded)}
+        # Best first; unranked rows (missing metric) go last
+        self.orders = {
+            metric: np.argsort(np.nan_to_num(table[:, column], nan=np.inf), kind="stable")
+            for column, metric in enumerate(metrics)
+        }
+
+    def municipality(self, query: str) -> dict:
+        # isdigit() accepts characters such as "²" that int() rejects
+        code = query.strip()
+        row = self.by_code.get(int(code)) if code.isascii() and code.isdecimal() else None
+        if row is None:
+            row = self.by_name.get(fold_names(pd.Series([query])).iloc[0])
+        if row is None:
+            raise QueryError(f"Unknown municipality {query!r}", HTTPStatus.NOT_FOUND)
+        return self.records[row]
+
+    def _metric(self, metric: str) -> str:
+        if metric not in self.orders:
+            raise QueryError(f"Unknown metric {metric!r}; expected one of {sorted(self.orders)}")
+        return metric
+
+    def top(self, metric: str, n: int) -> list[dict]:
+        order = self.orders[self._metric(metric)]
+        return [self.records[row] for row in order[:n] if self.records[row]["positions"][metric] is not None]
+
+    def gaps(self, n: int, include: tuple[str, ...], exclude: tuple[str, ...]) -> list[dict]:
+        """Rows in the top ``n`` of every ``include`` metric and of no ``exclude`` metric."""
+        if not include:
+            raise QueryError("include needs at least one metric")
+        for metric in include + exclude:
+            self._metric(metric)
+        key = (include, exclude)
+        with self._lock:
+            intervals = self._intervals.get(key)
+            if intervals is None:
+                frame = top_n_intervals(self.df, list(include), list(exclude))
+                intervals = self._intervals[key] = (frame["start"].to_numpy(), frame["stop"].to_numpy())
+        start, stop = intervals
+        rows = np.flatnonzero((start <= n) & (n < stop))
+        return [self.records[row] for row in rows[np.argsort(start[rows], kind="stable")]]
+
+
+class ResponseCache:
+    """Thread-safe LRU of encoded responses."""
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: str, body: bytes) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MetricsService:
+    """Holds the current snapshot and response cache and reloads them when the artifact changes."""
+
+    def __init__(
+        self,
+        artifact: str | Path,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+    ):
+        self.artifact = Path(artifact)
+        self.poll_seconds = poll_seconds
+        self.cache = ResponseCache(cache_size)
+        self._signature = self._stat()
+        self._failed: tuple[int, int] | None = None
+        self.snapshot = Snapshot(read_artifact(self.artifact), version=1, loaded_at=time.time())
+        self._stop = threading.Event()
+        self._watcher: threading.Thread | None = None
+
+    def _stat(self) -> tuple[int, int]:
+        stat = os.stat(self.artifact)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self) -> bool:
+        try:
+            signature = self._stat()
+        except FileNotFoundError:
+            return False
+        if signature in (self._signature, self._failed):
+            return False
+        try:
+            df = read_artifact(self.artifact)
+        except Exception as exc:
+            # Retried once the file changes again, e.g. when its writer finishes
+            self._failed = signature
+            logger.warning("Could not reload %s (%s); keeping version %d", self.artifact, exc, self.snapshot.version)
+            return False
+        # Swapping the reference is atomic, so requests see either snapshot whole
+        self.snapshot = Snapshot(df, version=self.snapshot.version + 1, loaded_at=time.time())
+        self._signature = signature
+        self.cache.clear()
+        logger.info("Reloaded %s as version %d (%d rows)", self.artifact, self.snapshot.version, len(df))
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            self.reload_if_changed()
+
+    def start_watching(self) -> None:
+        self._watcher = threading.Thread(target=self._watch, name="artifact-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+    def answer(self, target: str) -> bytes:
+        """The encoded JSON response for a request target such as ``/top?metric=income&n=5``."""
+        body = self.cache.get(target)
+        if body is not None:
+            return body
+        snapshot = self.snapshot
+        body = json.dumps(self._route(snapshot, target), ensure_ascii=False, separators=(",", ":")).encode()
+        # A reload may have happened meanwhile; don't cache an answer from the old version
+        if snapshot is self.snapshot:
+            self.cache.put(target, body)
+        return body
+
+    def _route(self, snapshot: Snapshot, target: str):
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/")
+
+        def number(name: str, default: int) -> int:
+            try:
+                n = int(query.get(name, default))
+            except ValueError:
+                raise QueryError(f"{name} must be an integer") from None
+            if n < 1:
+                raise QueryError(f"{name} must be positive")
+            return n
+
+        def names(name: str, default: str) -> tuple[str, ...]:
+            return tuple(item for item in query.get(name, default).split(",") if item)
+
+        if path == "/health":
+            return {"version": snapshot.version, "rows": len(snapshot.records), "loaded_at": snapshot.loaded_at}
+        if path.startswith("/municipalities/"):
+            return snapshot.municipality(unquote(path[len("/municipalities/") :]))
+        if path == "/top":
+            metric = query.get("metric", "points")
+            return {"metric": metric, "results": snapshot.top(metric, number("n", DEFAULT_TOP_N))}
+        if path == "/gaps":
+            n = number("n", DEFAULT_TOP_N)
+            include, exclude = names("include", "income,density"), names("exclude", "points")
+            return {"n": n, "include": include, "exclude": exclude, "results": snapshot.gaps(n, include, exclude)}
+        raise QueryError(f"Unknown path {url.path}", HTTPStatus.NOT_FOUND)
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive connections; every response sets Content-Length
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle the body waits for a delayed ACK
+    disable_nagle_algorithm = True
+    server: "MetricsServer"
+
+    def do_GET(self) -> None:
+        try:
+            body, status = self.server.service.answer(self.path), HTTPStatus.OK
+        except QueryError as exc:
+            body, status = json.dumps({"error": str(exc)}).encode(), exc.status
+        except Exception:
+            # Answer instead of letting socketserver drop the connection
+            logger.exception("Failed to answer %s", self.path)
+            body, status = json.dumps({"error": "internal error"}).encode(), HTTPStatus.INTERNAL_SERVER_ERROR
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: MetricsService):
+        super().__init__(address, Handler)
+        self.service = service
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--artifact", type=Path, default=DEFAULT_ARTIFACT, help="ranked join_df (.parquet, .csv or published manifest.json)"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="cached responses (0 disables)")
+    parser.add_argument("--poll", type=float, default=DEFAULT_POLL_SECONDS, help="seconds between artifact checks")
+    instrument.add_argument(parser, "serve-metrics")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    service = MetricsService(args.artifact, args.cache_size, args.poll)
+    service.start_watching()
+    with MetricsServer((args.host, args.port), service) as server:
+        logger.info(
+            "Serving %d municipalities from %s on http://%s:%d",
+            len(service.snapshot.records),
+            args.artifact,
+            args.host,
+            server.server_address[1],
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.stop_watching()
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Recommend new charger sites by greedy maximum coverage.
+
+Demand is a set of points weighted by population. It can come from a
+population grid, or from :func:`density_grid`, which spreads each
+municipality's density over a regular grid inside its boundary. A demand
+point is covered when a charger lies within ``radius_km`` great-circle
+distance of it. Points already covered by existing chargers count as
+served. Choosing ``k`` new sites among candidate points (by default the
+demand points themselves) to maximize the newly covered population is
+maximum coverage. Greedy selection is within ``1 - 1/e`` of the optimum.
+
+Coverage is a sparse candidate -> demand incidence (CSR arrays built from
+one KD-tree radius query, see :mod:`scripts.spatial`). Selecting a site
+sets the weight of the demand it covers to zero. :func:`greedy` is lazy
+greedy (CELF):
+
+* a max-heap holds every candidate's gain as of the round it was last
+  computed in. Gains only decrease as demand gets covered, so a stale
+  entry is an upper bound.
+* a popped entry computed in the current round is the best candidate and
+  is selected. A stale one gets its gain recomputed from the remaining
+  demand of its own coverage and is pushed back. Most candidates are
+  never looked at again once they fall behind.
+
+``lazy=False`` is the naive greedy baseline. It recomputes every
+candidate's gain in each round, at ``O(nnz)`` per site. Both sum a
+candidate's remaining weights in the same order with ``np.add.reduceat``,
+so gains are bit-identical between them and exactly zero once all of a
+candidate's demand is covered, also for float weights. Both select the
+same sites: ties go to the lowest candidate index.
+"""
+
+import argparse
+import heapq
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from scripts import instrument
+from scripts.instrument import instrumented
+from scripts.municipalities import KEY
+from scripts.spatial import EARTH_RADIUS_KM, ChargerIndex, km_to_chord, to_unit_vectors
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RADIUS_KM = 5.0
+DEFAULT_SPACING_DEG = 0.02
+CHUNK_SIZE = 100_000
+
+
+@dataclass
+class Coverage:
+    """Sparse incidence between candidates and the demand points within the radius."""
+
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    @property
+    def candidates(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+
+def _csr(rows: int, owners: np.ndarray, columns: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(owners, kind="stable")
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(owners, minlength=rows))])
+    return indptr, columns[order].astype(np.int64)
+
+
+def _gains(cover: Coverage, remaining: np.ndarray) -> np.ndarray:
+    """Remaining covered weight of every candidate."""
+    # The trailing zero makes every start a valid reduceat index and adds exactly nothing
+    values = np.append(remaining[cover.indices], 0.0)
+    gains = np.add.reduceat(values, cover.indptr[:-1])
+    gains[np.diff(cover.indptr) == 0] = 0.0
+    return gains
+
+
+def _gain(cover: Coverage, remaining: np.ndarray, site: int) -> float:
+    """Remaining covered weight of one candidate, summed in the same order as :func:`_gains`."""
+    start, stop = cover.indptr[site], cover.indptr[site + 1]
+    if start == stop:
+        return 0.0
+    return float(np.add.reduceat(remaining[cover.indices[start:stop]], [0])[0])
+
+
+@instrumented
+def coverage(candidate_lon, candidate_lat, demand_lon, demand_lat, radius_km: float = DEFAULT_RADIUS_KM) -> Coverage:
+    """Which demand points lie within ``radius_km`` of each candidate."""
+    tree = cKDTree(to_unit_vectors(demand_lon, demand_lat))
+    candidates = to_unit_vectors(candidate_lon, candidate_lat)
+    radius = km_to_chord(radius_km)
+    owners, columns = [], []
+    for start in range(0, len(candidates), CHUNK_SIZE):
+        neighbours = tree.query_ball_point(candidates[start : start + CHUNK_SIZE], radius, workers=-1)
+        lengths = np.fromiter((len(n) for n in neighbours), dtype=np.int64, count=len(neighbours))
+        owners.append(np.repeat(np.arange(start, start + len(neighbours)), lengths))
+        columns.append(np.concatenate(neighbours).astype(np.int64) if lengths.sum() else np.empty(0, dtype=np.int64))
+    owners, columns = np.concatenate(owners), np.concatenate(columns)
+    return Coverage(*_csr(len(candidates), owners, columns))
+
+
+@dataclass
+class Selection:
+    """Greedy result: selected candidates in order and the weight each newly covered."""
+
+    sites: np.ndarray
+    gains: np.ndarray
+    remaining: float
+    evaluations: int
+
+    @property
+    def covered(self) -> float:
+        return float(self.gains.sum())
+
+
+@instrumented
+def greedy(cover: Coverage, weights, k: int, lazy: bool = True) -> Selection:
+    """Pick up to ``k`` candidates maximizing the covered ``weights``; stops early once nothing is left to cover.
+
+    ``evaluations`` counts marginal-gain evaluations: heap pops for lazy
+    greedy, ``candidates`` per round for the naive one.
+    """
+    remaining = np.asarray(weights, dtype=np.float64).copy()
+    sites, gains = [], []
+    if not lazy:
+        evaluations = 0
+        for _ in range(k):
+            marginal = _gains(cover, remaining)
+            evaluations += cover.candidates
+            site = int(np.argmax(marginal))
+            if marginal[site] <= 0:
+                break
+            sites.append(site)
+            gains.append(marginal[site])
+            remaining[cover.indices[cover.indptr[site] : cover.indptr[site + 1]]] = 0
+        return Selection(np.array(sites, dtype=np.int64), np.array(gains), float(remaining.sum()), evaluations)
+
+    # Entries are (-gain, candidate, round the gain was computed in)
+    heap = [(-gain, site, 0) for site, gain in enumerate(_gains(cover, remaining).tolist()) if gain > 0]
+    heapq.heapify(heap)
+    evaluations = 0
+    while heap and len(sites) < k:
+        negative, site, computed = heapq.heappop(heap)
+        evaluations += 1
+        if computed != len(sites):
+            gain = _gain(cover, remaining, site)
+            if gain > 0:
+                heapq.heappush(heap, (-gain, site, len(sites)))
+            continue
+        sites.append(site)
+        gains.append(-negative)
+        remaining[cover.indices[cover.indptr[site] : cover.indptr[site + 1]]] = 0
+    return Selection(np.array(sites, dtype=np.int64), np.array(gains), float(remaining.sum()), evaluations)
+
+
+def recommend(
+    demand: pd.DataFrame,
+    k: int,
+    radius_km: float = DEFAULT_RADIUS_KM,
+    chargers: pd.DataFrame | None = None,
+    candidates: pd.DataFrame | None = None,
+    weight: str = "population",
+    lazy: bool = True,
+) -> pd.DataFrame:
+    """Up to ``k`` new sites with the population each newly covers and the cumulative coverage share.
+
+    ``demand`` has ``lon``, ``lat`` and ``weight`` columns; ``chargers`` and
+    ``candidates`` have ``lon`` and ``lat``. Candidates default to the
+    demand points.
+    """
+    demand = demand.dropna(subset=["lon", "lat", weight]).reset_index(drop=True)
+    candidates = demand if candidates is None else candidates.dropna(subset=["lon", "lat"]).reset_index(drop=True)
+    weights = demand[weight].to_numpy(dtype=np.float64)
+    total = weights.sum()
+    if chargers is not None and len(chargers):
+        served = ChargerIndex.from_frame(chargers).count_within(demand["lon"], demand["lat"], radius_km) > 0
+        weights = np.where(served, 0.0, weights)
+        # Demand weights may all be zero
+        share = 100 * (total - weights.sum()) / (total or 1)
+        logger.info("Existing chargers cover %.1f%% of the population", share)
+    already = total - weights.sum()
+
+    cover = coverage(candidates["lon"], candidates["lat"], demand["lon"], demand["lat"], radius_km)
+    selection = greedy(cover, weights, k, lazy)
+    result = candidates.iloc[selection.sites].reset_index(drop=True)
+    result.insert(0, "order", np.arange(1, len(result) + 1))
+    result["covered_population"] = selection.gains
+    result["coverage_share"] = (already + np.cumsum(selection.gains)) / total
+    return result
+
+
+def density_grid(
+    boundaries,
+    density: pd.DataFrame,
+    column: str = "Densidade_Populacional_km2",
+    spacing_deg: float = DEFAULT_SPACING_DEG,
+) -> pd.DataFrame:
+    """Demand points on a regular lon/lat grid, weighted by their municipality's density times the cell area.
+
+    ``boundaries`` is a :class:`scripts.boundaries.Boundaries` in WGS84 whose
+    keys match ``density[Código_Concelho]``.
+    """
+    xmin, ymin = boundaries.bbox[:, 0].min(), boundaries.bbox[:, 1].min()
+    xmax, ymax = boundaries.bbox[:, 2].max(), boundaries.bbox[:, 3].max()
+    lon, lat = np.meshgrid(
+        np.arange(xmin + spacing_deg / 2, xmax, spacing_deg), np.arange(ymin + spacing_deg / 2, ymax, spacing_deg)
+    )
+    lon, lat = lon.ravel(), lat.ravel()
+    located = boundaries.locate(lon, lat)
+    inside = located >= 0
+    lon, lat, keys = lon[inside], lat[inside], boundaries.keys[located[inside]]
+    per_key = density.dropna(subset=[KEY]).set_index(KEY)[column]
+    cell_km2 = (np.radians(spacing_deg) * EARTH_RADIUS_KM) ** 2 * np.cos(np.radians(lat))
+    return pd.DataFrame(
+        {
+            "lon": lon,
+            "lat": lat,
+            KEY: keys,
+            "population": per_key.reindex(keys).to_numpy(dtype=np.float64) * cell_km2,
+        }
+    )
+
+
+def _read(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path) if path.suffix == ".csv" else pd.read_parquet(path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", type=int, default=10, help="number of new sites")
+    parser.add_argument("--radius-km", type=float, default=DEFAULT_RADIUS_KM)
+    parser.add_argument("--demand", type=Path, help="lon, lat, population points (.csv or .parquet)")
+    parser.add_argument("--boundaries", type=Path, help="municipality GeoJSON for a density grid instead of --demand")
+    parser.add_argument("--density", type=Path, help="join_df with Código_Concelho and density, for --boundaries")
+    parser.add_argument("--spacing", type=float, default=DEFAULT_SPACING_DEG, help="density grid spacing in degrees")
+    parser.add_argument("--chargers", type=Path, help="existing chargers with lon, lat (e.g. data/arcgis_chargers.parquet)")
+    parser.add_argument("--candidates", type=Path, help="candidate sites with lon, lat (default: the demand points)")
+    parser.add_argument("--output", type=Path, help="write the recommendations here (.csv or .parquet)")
+    instrument.add_argument(parser, "site-chargers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    if args.demand:
+        demand = _read(args.demand)
+    elif args.boundaries and args.density:
+        from scripts.boundaries import Boundaries
+
+        demand = density_grid(Boundaries.from_geojson(args.boundaries), _read(args.density), spacing_deg=args.spacing)
+    else:
+        parser.error("either --demand or --boundaries with --density is required")
+    chargers = _read(args.chargers) if args.chargers else None
+    candidates = _read(args.candidates) if args.candidates else None
+
+    result = recommend(demand, args.k, args.radius_km, chargers, candidates)
+    print(result.head(20).to_string(index=False))
+    if len(result):
+        print(f"{len(result)} sites, coverage {result['coverage_share'].iloc[-1]:.1%}")
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        if args.output.suffix == ".csv":
+            result.to_csv(args.output, index=False)
+        else:
+            result.to_parquet(args.output, index=False)
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
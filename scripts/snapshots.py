@@ -0,0 +1,307 @@
+"""Diff two E-REDES releases and update the charger aggregates from the changes.
+
+Every quarter the export is republished in full, and most of its records
+are the same as in the previous quarter. Rather than aggregating the new
+release from scratch, :func:`diff` matches its records against the
+previous release and :func:`municipality_deltas` turns only the
+differences into per-municipality changes of stations and connection
+points. Those changes are then applied to the existing outputs:
+
+* :func:`apply_deltas` updates the per-municipality aggregate, as returned
+  by :func:`scripts.eredes.aggregate_by_municipality`.
+* :func:`update_join_df` updates the ranked ``join_df``.
+
+The records carry no identifier, so they are matched by hashing their
+columns (``pd.util.hash_pandas_object``, which is stable across runs):
+
+1. Records equal in every column except the quarter are unchanged. Copies
+   of the same record are told apart by their occurrence number, so
+   duplicates are compared as a multiset.
+2. The remaining records are matched by the hash of their key columns,
+   ``CodDistritoConcelho`` plus the location columns present (see
+   :data:`LOCATION_COLUMNS`), and again by occurrence. Matched pairs are
+   *changed*. Unmatched records are *removed* from the old release or
+   *added* in the new one.
+
+Municipality names are resolved only for the changed records. That is
+what makes an update cheap: over the whole export, resolution costs much
+more than hashing. The changes are written as a change log per release:
+one CSV of changed records and one of per-municipality totals and league
+table positions.
+
+    diff-snapshots --eredes-dir data/eredes --aggregate data/eredes_agg.parquet --join-df data/join_df.parquet
+"""
+
+import argparse
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts.eredes import CODE_COLUMN, POINTS_COLUMN, QUARTER_COLUMN
+from scripts import instrument
+from scripts.instrument import instrumented
+from scripts.municipalities import KEY, NAME, MunicipalityIndex
+from scripts.ranking import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Columns that describe where a charger is, used with the code as its key when present
+LOCATION_COLUMNS = ("Distrito", NAME, "Freguesia", "Morada", "Localização", "Latitude", "Longitude")
+DEFAULT_CHANGELOG_DIR = Path("data/changelog")
+STATIONS = METRICS["stations"]
+POINTS = METRICS["points"]
+# Metrics whose values come from the charger export
+CHARGER_METRICS = ("stations", "points")
+
+
+def read_snapshot(path: str | Path, quarter: str | None = None, sep: str = ";") -> pd.DataFrame:
+    """One release of the export, as strings so the record hashes do not depend on type inference.
+
+    A file holding several quarters is reduced to ``quarter``, by default the
+    latest.
+    """
+    df = pd.read_csv(path, sep=sep, dtype=str)
+    if QUARTER_COLUMN in df:
+        df = df[df[QUARTER_COLUMN] == (quarter or df[QUARTER_COLUMN].max())].reset_index(drop=True)
+    return df
+
+
+def key_columns(df: pd.DataFrame) -> list[str]:
+    return [CODE_COLUMN, *(column for column in LOCATION_COLUMNS if column in df)]
+
+
+def _hash(df: pd.DataFrame) -> np.ndarray:
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _identify(hashes: np.ndarray) -> np.ndarray:
+    """Make repeated hashes unique by hashing each with its occurrence number."""
+    occurrence = pd.Series(hashes).groupby(hashes, sort=False).cumcount().to_numpy()
+    return _hash(pd.DataFrame({"hash": hashes, "occurrence": occurrence}))
+
+
+def _isin(values: np.ndarray, others: np.ndarray) -> np.ndarray:
+    # A hash table lookup; np.isin sorts both arrays and is several times slower here
+    return pd.Series(values).isin(others).to_numpy()
+
+
+@dataclass
+class SnapshotDiff:
+    """Records of two releases, split by what happened to them.
+
+    ``before`` and ``after`` hold the old and new versions of the changed
+    records, row for row. Every frame has a ``record`` column with the
+    record's id: the hash of its key columns and occurrence number.
+    """
+
+    added: pd.DataFrame
+    removed: pd.DataFrame
+    before: pd.DataFrame
+    after: pd.DataFrame
+    unchanged: int
+
+    @property
+    def changed(self) -> int:
+        return len(self.after)
+
+    def records(self) -> pd.DataFrame:
+        """The change log of records: new values for added and changed records, old ones for removed records."""
+        columns = [column for column in self.after if column not in (QUARTER_COLUMN, "record", POINTS_COLUMN)]
+        frames = [
+            self.added.assign(change="added", points_before=None, points_after=self.added[POINTS_COLUMN]),
+            self.removed.assign(change="removed", points_before=self.removed[POINTS_COLUMN], points_after=None),
+            self.after.assign(
+                change="changed",
+                points_before=self.before[POINTS_COLUMN].to_numpy(),
+                points_after=self.after[POINTS_COLUMN],
+            ),
+        ]
+        log = pd.concat(frames, ignore_index=True)
+        log["record"] = [f"{record:016x}" for record in log["record"]]
+        return log[["change", "record", *columns, "points_before", "points_after"]]
+
+
+@instrumented
+def diff(old: pd.DataFrame, new: pd.DataFrame, keys: list[str] | None = None) -> SnapshotDiff:
+    """Added, removed and changed records between two releases read with :func:`read_snapshot`."""
+    keys = keys or key_columns(new)
+    columns = [column for column in new if column != QUARTER_COLUMN]
+    if sorted(columns) != sorted(column for column in old if column != QUARTER_COLUMN):
+        raise ValueError("Releases have different columns")
+
+    old_ids, new_ids = _identify(_hash(old[columns])), _identify(_hash(new[columns]))
+    old_left, new_left = ~_isin(old_ids, new_ids), ~_isin(new_ids, old_ids)
+    old, new = old[old_left].reset_index(drop=True), new[new_left].reset_index(drop=True)
+
+    old_records, new_records = _identify(_hash(old[keys])), _identify(_hash(new[keys]))
+    old = old.assign(record=old_records)
+    new = new.assign(record=new_records)
+    matched_old, matched_new = _isin(old_records, new_records), _isin(new_records, old_records)
+    before = old[matched_old].sort_values("record", kind="stable").reset_index(drop=True)
+    after = new[matched_new].sort_values("record", kind="stable").reset_index(drop=True)
+    return SnapshotDiff(
+        added=new[~matched_new].reset_index(drop=True),
+        removed=old[~matched_old].reset_index(drop=True),
+        before=before,
+        after=after,
+        unchanged=int((~old_left).sum()),
+    )
+
+
+def _points(df: pd.DataFrame) -> np.ndarray:
+    return pd.to_numeric(df[POINTS_COLUMN], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+
+@instrumented
+def municipality_deltas(changes: SnapshotDiff, index: MunicipalityIndex) -> pd.DataFrame:
+    """Change in station count and connection points per municipality key; unchanged municipalities are left out."""
+    parts = [
+        (changes.added, 1, 1),
+        (changes.removed, -1, -1),
+        (changes.after, 0, 1),
+        (changes.before, 0, -1),
+    ]
+    frames = []
+    for df, stations, sign in parts:
+        keyed = index.attach(df, name_column=NAME, code_column=CODE_COLUMN)
+        frames.append(
+            pd.DataFrame({KEY: keyed[KEY], "stations": np.full(len(df), stations), "points": sign * _points(df)})
+        )
+    deltas = pd.concat(frames, ignore_index=True)
+    unresolved = deltas[KEY].isna()
+    if unresolved.any():
+        logger.warning("Ignoring %d changed records with unknown municipality", unresolved.sum())
+    deltas = deltas[~unresolved].groupby(KEY)[["stations", "points"]].sum().reset_index()
+    return deltas[(deltas["stations"] != 0) | (deltas["points"] != 0)].reset_index(drop=True)
+
+
+@instrumented
+def apply_deltas(aggregate: pd.DataFrame, deltas: pd.DataFrame) -> pd.DataFrame:
+    """:func:`scripts.eredes.aggregate_by_municipality` of the new release, from that of the old one and the deltas."""
+    merged = aggregate.merge(deltas, on=KEY, how="outer")
+    count = merged["count_rows"].fillna(0) + merged["stations"].fillna(0)
+    points = merged["sum_pontos_de_ligacao"].fillna(0) + merged["points"].fillna(0)
+    result = pd.DataFrame({KEY: merged[KEY], "count_rows": count, "sum_pontos_de_ligacao": points})
+    # A municipality whose last charger was removed has no row, as in a full aggregation
+    result = result[count > 0].sort_values(KEY).reset_index(drop=True)
+    return result.astype(aggregate.dtypes.to_dict())
+
+
+@instrumented
+def update_join_df(join_df: pd.DataFrame, deltas: pd.DataFrame) -> pd.DataFrame:
+    """The ranked ``join_df`` with the deltas applied to its charger counts and ranks.
+
+    The ranks are not patched: both charger metrics (stations and points)
+    are re-ranked in full with ``rank()`` over every municipality, which is
+    cheap next to the diff. Density and income ranks are kept, unless a
+    municipality lost its last charger. It then leaves ``join_df``, as in a
+    full join, and every metric is re-ranked. A municipality that gains its
+    first chargers is absent from ``join_df``, so it can only be added by a
+    full pipeline run.
+    """
+    missing = deltas[~deltas[KEY].isin(join_df[KEY])]
+    if len(missing):
+        logger.warning(
+            "Not in join_df, rerun the pipeline if they gained their first chargers: %s", missing[KEY].tolist()
+        )
+    change = join_df[[KEY]].merge(deltas, on=KEY, how="left").fillna({"stations": 0, "points": 0})
+    df = join_df.copy()
+    df[STATIONS] = (df[STATIONS] + change["stations"].to_numpy()).astype(join_df[STATIONS].dtype)
+    df[POINTS] = (df[POINTS] + change["points"].to_numpy()).astype(join_df[POINTS].dtype)
+
+    remaining = df[STATIONS] > 0
+    names = CHARGER_METRICS if remaining.all() else tuple(METRICS)
+    df = df[remaining].reset_index(drop=True)
+    ranks = df[[METRICS[name] for name in names]].rank(ascending=True, method="first")
+    for name, column in zip(names, ranks):
+        df[f"rank_{name}"] = ranks[column]
+    return df
+
+
+def municipality_changes(before: pd.DataFrame, after: pd.DataFrame, deltas: pd.DataFrame) -> pd.DataFrame:
+    """Change log per municipality: charger counts and league table positions before and after."""
+    log = deltas[[KEY]]
+    for df, suffix in ((before, "before"), (after, "after")):
+        table = pd.DataFrame(
+            {
+                KEY: df[KEY],
+                f"name_{suffix}": df[NAME],
+                f"stations_{suffix}": df[STATIONS].astype("Int64"),
+                f"points_{suffix}": df[POINTS],
+                **{f"position_{name}_{suffix}": len(df) + 1 - df[f"rank_{name}"] for name in CHARGER_METRICS},
+            }
+        )
+        log = log.merge(table.drop_duplicates(KEY), on=KEY, how="left")
+    log.insert(1, NAME, log.pop("name_before").fillna(log.pop("name_after")))
+    return log.astype({column: "Int64" for column in log if column.startswith("position_")})
+
+
+def _write_csv(df: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _write_parquet(df: pd.DataFrame, path: Path) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def main(argv: list[str] | None = None) -> None:
+    from scripts import core, ine
+    from scripts.download_eredes_chargers import DEFAULT_OUTPUT_DIR, local_quarters, partition_path
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("releases", nargs="*", type=Path, help="old and new release CSVs (default: the two latest partitions)")
+    parser.add_argument("--eredes-dir", type=Path, default=DEFAULT_OUTPUT_DIR, help="partitions from download-eredes-chargers")
+    parser.add_argument("--density", default=str(ine.DENSITY_PATH), help="INE density export, for municipality names")
+    parser.add_argument("--aggregate", type=Path, help="per-municipality charger aggregate of the old release, updated in place")
+    parser.add_argument("--join-df", type=Path, help="ranked join_df of the old release, updated in place")
+    parser.add_argument("--changelog-dir", type=Path, default=DEFAULT_CHANGELOG_DIR)
+    instrument.add_argument(parser, "diff-snapshots")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    if not args.releases:
+        quarters = local_quarters(args.eredes_dir)
+        if len(quarters) < 2:
+            parser.error(f"need two partitions in {args.eredes_dir}")
+        args.releases = [partition_path(args.eredes_dir, quarter) for quarter in quarters[-2:]]
+    elif len(args.releases) != 2:
+        parser.error("give exactly two releases: old and new")
+    old, new = (read_snapshot(path) for path in args.releases)
+    release = new[QUARTER_COLUMN].iloc[0] if QUARTER_COLUMN in new and len(new) else args.releases[1].stem
+
+    changes = diff(old, new)
+    print(
+        f"{release}: {len(changes.added)} added, {len(changes.removed)} removed, "
+        f"{changes.changed} changed, {changes.unchanged} unchanged"
+    )
+    deltas = municipality_deltas(changes, core.municipality_index(core.load_density(args.density)))
+    _write_csv(changes.records(), args.changelog_dir / f"{release}-records.csv")
+
+    if args.aggregate:
+        _write_parquet(apply_deltas(pd.read_parquet(args.aggregate), deltas), args.aggregate)
+    if args.join_df:
+        before = pd.read_parquet(args.join_df)
+        after = update_join_df(before, deltas)
+        _write_parquet(after, args.join_df)
+        log = municipality_changes(before, after, deltas)
+        _write_csv(log, args.changelog_dir / f"{release}-municipalities.csv")
+        print(log.head(20).to_string(index=False))
+    else:
+        print(deltas.head(20).to_string(index=False))
+    print(f"change log written to {args.changelog_dir}")
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Spatial index over charger locations for batched accessibility queries.
+
+Longitude/latitude points are projected onto the unit sphere (3D Cartesian
+coordinates) and indexed with a ``scipy.spatial.cKDTree``. Straight-line
+(chord) distance on the sphere is monotonic in great-circle distance, so
+k-nearest and radius queries on the tree are exact great-circle queries
+after converting the radius to a chord length. This covers the whole
+country, islands included, without picking a projected CRS.
+
+All queries take arrays of origins and are answered by the tree in C,
+in chunks so memory stays bounded for tens of millions of origins.
+Query results index chargers by position; :attr:`ChargerIndex.labels`
+maps positions back to the rows of the frame the index was built from.
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+CHUNK_SIZE = 1_000_000
+
+
+def to_unit_vectors(lon, lat) -> np.ndarray:
+    """Convert degrees to ``(n, 3)`` points on the unit sphere."""
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=np.float64), np.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+
+def chord_to_km(chord):
+    """Great-circle km of a chord length; an infinite chord (no neighbour) stays infinite."""
+    chord = np.asarray(chord, dtype=np.float64)
+    return np.where(np.isinf(chord), np.inf, 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1)))
+
+
+class ChargerIndex:
+    """KD-tree over charger points, optionally weighted (e.g. by connection points).
+
+    ``labels`` holds, for every charger position returned by the queries,
+    the label of its row in the source (``0..n-1`` when built from arrays).
+    """
+
+    def __init__(self, lon, lat, weights=None, labels=None):
+        self.points = to_unit_vectors(lon, lat)
+        self.tree = cKDTree(self.points)
+        self.weights = None if weights is None else np.asarray(weights, dtype=np.float64)
+        self.labels = np.arange(len(self.points)) if labels is None else np.asarray(labels)
+
+    @classmethod
+    def from_frame(cls, df, lon: str = "lon", lat: str = "lat", weight: str | None = None):
+        """Index the rows of ``df`` with both coordinates; ``labels`` keeps their ``df.index`` labels."""
+        df = df.dropna(subset=[lon, lat])
+        return cls(
+            df[lon].to_numpy(),
+            df[lat].to_numpy(),
+            None if weight is None else df[weight].to_numpy(),
+            labels=df.index.to_numpy(),
+        )
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def nearest(self, lon, lat, k: int = 1, workers: int = -1) -> tuple[np.ndarray, np.ndarray]:
+        """Distances in km and charger indices of the ``k`` nearest chargers, shape ``(n, k)``.
+
+        With fewer than ``k`` chargers the missing neighbours have an
+        infinite distance and index ``-1``.
+        """
+        origins = to_unit_vectors(lon, lat)
+        distances = np.empty((len(origins), k))
+        indices = np.empty((len(origins), k), dtype=np.intp)
+        for start in range(0, len(origins), CHUNK_SIZE):
+            chunk = slice(start, start + CHUNK_SIZE)
+            chord, index = self.tree.query(origins[chunk], k=k, workers=workers)
+            distances[chunk] = chord_to_km(chord).reshape(-1, k)
+            indices[chunk] = np.asarray(index).reshape(-1, k)
+        # cKDTree reports a missing neighbour as index n
+        indices[indices == len(self.points)] = -1
+        return distances, indices
+
+    def distance_to_nearest(self, lon, lat, workers: int = -1) -> np.ndarray:
+        """Great-circle distance in km from every origin to its nearest charger."""
+        return self.nearest(lon, lat, k=1, workers=workers)[0][:, 0]
+
+    def count_within(self, lon, lat, radius_km: float, weighted: bool = False, workers: int = -1) -> np.ndarray:
+        """Number of chargers (or sum of their weights) within ``radius_km`` of every origin."""
+        origins = to_unit_vectors(lon, lat)
+        radius = km_to_chord(radius_km)
+        counts = np.empty(len(origins), dtype=np.float64 if weighted else np.int64)
+        for start in range(0, len(origins), CHUNK_SIZE):
+            chunk = slice(start, start + CHUNK_SIZE)
+            if not weighted or self.weights is None:
+                counts[chunk] = self.tree.query_ball_point(origins[chunk], radius, workers=workers, return_length=True)
+                continue
+            # Every (origin, charger) pair within the radius as flat arrays, without per-origin Python lists
+            pairs = cKDTree(origins[chunk]).sparse_distance_matrix(self.tree, radius, output_type="ndarray")
+            counts[chunk] = np.bincount(pairs["i"], weights=self.weights[pairs["j"]], minlength=len(origins[chunk]))
+        return counts
+
+    def within(self, lon, lat, radius_km: float, workers: int = -1) -> list[list[int]]:
+        """Charger indices within ``radius_km`` of every origin."""
+        return self.tree.query_ball_point(to_unit_vectors(lon, lat), km_to_chord(radius_km), workers=workers).tolist()
@@ -0,0 +1,396 @@
+"""Precompute charger clusters for every zoom level as static z/x/y tiles.
+
+Chargers are projected to Web Mercator and clustered on a grid nested in
+the tile pyramid: at zoom ``z`` every tile is split into ``2**grid_bits``
+cells per side (64 by default, i.e. 4 px cells on 256 px tiles), and all
+chargers in a cell form one cluster. The cluster carries its station
+count, its connection point total and the mean position of its chargers.
+Cells of zoom ``z`` are exactly four cells of zoom ``z + 1``, so, as in
+supercluster, each level is built from the one below it rather than from
+the raw points:
+
+1. Every charger gets the Morton (Z-order) code of its cell at the
+   deepest zoom. One sort by that code groups chargers by cell, and
+   ``np.add.reduceat`` sums each run into the deepest level.
+2. A parent's code is its child's code shifted right by two bits, and
+   Morton order keeps children contiguous. Each coarser level is then one
+   more ``reduceat`` over the level below, and a tile is a contiguous run
+   of cells.
+
+Tiles are written to ``<output>/<z>/<x>/<y>.json`` as
+``{"clusters": [[px, py, stations, points], ...]}``, or to ``.bin`` files
+of little-endian ``uint16 px, uint16 py, uint32 stations, uint32 points``
+records, with pixel positions in a ``TILE_EXTENT`` grid. ``tiles.json``
+describes the pyramid for map clients.
+
+Rebuilds are incremental. The deepest level and the size of every tile
+are saved next to the tiles. The next build compares the new deepest
+level with it, and only tiles containing a changed cell are encoded and
+written, or deleted once they are empty. Changing the zoom range, grid or
+format rebuilds everything.
+
+    build-tiles data/arcgis_chargers.parquet --output data/tiles --max-zoom 14
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scripts import instrument
+from scripts.instrument import instrumented
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = Path("data/tiles")
+DEFAULT_MIN_ZOOM = 0
+DEFAULT_MAX_ZOOM = 14
+DEFAULT_GRID_BITS = 6
+TILE_EXTENT = 4096
+MAX_LATITUDE = 85.05112878
+STATE_FILE = ".build-state.npz"
+RECORD = np.dtype([("px", "<u2"), ("py", "<u2"), ("stations", "<u4"), ("points", "<u4")])
+
+
+def mercator(lon, lat) -> tuple[np.ndarray, np.ndarray]:
+    """Web Mercator coordinates scaled to ``[0, 1)``, with y growing southwards."""
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (lon + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2
+    return np.clip(x, 0, np.nextafter(1, 0)), np.clip(y, 0, np.nextafter(1, 0))
+
+
+# (shift, mask) steps that interleave 32-bit integers with zero bits, and back
+_SPREAD = (
+    (16, 0x0000FFFF0000FFFF),
+    (8, 0x00FF00FF00FF00FF),
+    (4, 0x0F0F0F0F0F0F0F0F),
+    (2, 0x3333333333333333),
+    (1, 0x5555555555555555),
+)
+_COMPACT = (
+    (1, 0x3333333333333333),
+    (2, 0x0F0F0F0F0F0F0F0F),
+    (4, 0x00FF00FF00FF00FF),
+    (8, 0x0000FFFF0000FFFF),
+    (16, 0x00000000FFFFFFFF),
+)
+
+
+def _spread(v: np.ndarray) -> np.ndarray:
+    """Insert a zero bit after each of the low 32 bits."""
+    v = np.asarray(v).astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in _SPREAD:
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def _compact(v: np.ndarray) -> np.ndarray:
+    """Inverse of :func:`_spread`: keep the even bits."""
+    v = np.asarray(v).astype(np.uint64) & np.uint64(0x5555555555555555)
+    for shift, mask in _COMPACT:
+        v = (v | (v >> np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return _spread(x) | (_spread(y) << np.uint64(1))
+
+
+def _runs(keys: np.ndarray) -> np.ndarray:
+    """Start index of every run of equal values in sorted ``keys``."""
+    if not len(keys):
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+
+
+@dataclass
+class Level:
+    """Clusters of one zoom level, sorted by the Morton code of their cell."""
+
+    zoom: int
+    keys: np.ndarray
+    stations: np.ndarray
+    points: np.ndarray
+    sum_x: np.ndarray
+    sum_y: np.ndarray
+
+    def parent(self) -> "Level":
+        parents = self.keys >> np.uint64(2)
+        starts = _runs(parents)
+        return Level(
+            self.zoom - 1,
+            parents[starts],
+            *(np.add.reduceat(values, starts) for values in (self.stations, self.points, self.sum_x, self.sum_y)),
+        )
+
+
+def deepest_level(x: np.ndarray, y: np.ndarray, points: np.ndarray, max_zoom: int, grid_bits: int) -> Level:
+    scale = 2 ** (max_zoom + grid_bits)
+    keys = morton((x * scale).astype(np.uint64), (y * scale).astype(np.uint64))
+    order = np.argsort(keys, kind="stable")
+    keys, x, y, points = keys[order], x[order], y[order], points[order]
+    starts = _runs(keys)
+    if not len(starts):
+        return Level(max_zoom, keys, np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0))
+    return Level(
+        max_zoom,
+        keys[starts],
+        np.diff(np.append(starts, len(keys))),
+        np.add.reduceat(points, starts),
+        np.add.reduceat(x, starts),
+        np.add.reduceat(y, starts),
+    )
+
+
+def encode(level: Level, cells: slice, tile_x: int, tile_y: int, fmt: str) -> bytes:
+    """One tile's clusters, positioned in ``TILE_EXTENT`` pixels of the tile."""
+    stations = level.stations[cells]
+    scale = 2**level.zoom
+    px = np.clip((level.sum_x[cells] / stations * scale - tile_x) * TILE_EXTENT, 0, TILE_EXTENT - 1).astype(np.int64)
+    py = np.clip((level.sum_y[cells] / stations * scale - tile_y) * TILE_EXTENT, 0, TILE_EXTENT - 1).astype(np.int64)
+    points = np.round(level.points[cells]).astype(np.int64)
+    if fmt == "bin":
+        records = np.empty(len(stations), dtype=RECORD)
+        records["px"], records["py"], records["stations"], records["points"] = px, py, stations, points
+        return records.tobytes()
+    clusters = np.column_stack([px, py, stations, points]).tolist()
+    return json.dumps({"clusters": clusters}, separators=(",", ":")).encode()
+
+
+@dataclass
+class ZoomReport:
+    zoom: int
+    clusters: int
+    tiles: int
+    written: int
+    deleted: int
+    bytes_written: int
+    tile_bytes: int
+    max_tile_bytes: int
+    seconds: float
+
+
+def _lookup(level: Level, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Whether each key is in ``level`` and its values (stations, points, sums) where it is."""
+    if not len(level.keys):
+        return np.zeros(len(keys), dtype=bool), np.zeros((len(keys), 4))
+    index = np.minimum(np.searchsorted(level.keys, keys), len(level.keys) - 1)
+    found = level.keys[index] == keys
+    values = np.column_stack([level.stations[index], level.points[index], level.sum_x[index], level.sum_y[index]])
+    return found, np.where(found[:, None], values, 0)
+
+
+def _lookup_sizes(tiles: np.ndarray, sizes: np.ndarray, keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Which ``keys`` are among the sorted ``tiles``, and their sizes."""
+    if not len(tiles):
+        return np.zeros(len(keys), dtype=bool), np.empty(0, dtype=np.int64)
+    index = np.minimum(np.searchsorted(tiles, keys), len(tiles) - 1)
+    found = tiles[index] == keys
+    return found, sizes[index[found]]
+
+
+def changed_cells(old: Level, new: Level) -> np.ndarray:
+    """Deepest-level cell codes that were added, removed or whose clusters differ."""
+    keys = np.union1d(old.keys, new.keys)
+    old_found, old_values = _lookup(old, keys)
+    new_found, new_values = _lookup(new, keys)
+    return keys[(old_found != new_found) | (old_values != new_values).any(axis=1)]
+
+
+def _tile_path(output: Path, zoom: int, x: int, y: int, fmt: str) -> Path:
+    return output / str(zoom) / str(x) / f"{y}.{fmt}"
+
+
+def _load_state(output: Path, params: dict) -> tuple[Level, dict[int, tuple[np.ndarray, np.ndarray]]] | None:
+    """The previous build's deepest level and, per zoom, its tile codes and sizes in bytes."""
+    path = output / STATE_FILE
+    if not path.exists():
+        return None
+    with np.load(path) as state:
+        if json.loads(str(state["params"])) != params:
+            return None
+        level = Level(params["max_zoom"], state["keys"], state["stations"], state["points"], state["sum_x"], state["sum_y"])
+        sizes = {
+            zoom: (state[f"tiles_{zoom}"], state[f"sizes_{zoom}"])
+            for zoom in range(params["min_zoom"], params["max_zoom"] + 1)
+        }
+    return level, sizes
+
+
+def _save_state(output: Path, params: dict, level: Level, sizes: dict[int, tuple[np.ndarray, np.ndarray]]) -> None:
+    tmp_path = output / (STATE_FILE + ".tmp.npz")
+    np.savez(
+        tmp_path,
+        params=json.dumps(params, sort_keys=True),
+        keys=level.keys,
+        stations=level.stations,
+        points=level.points,
+        sum_x=level.sum_x,
+        sum_y=level.sum_y,
+        **{f"tiles_{zoom}": tiles for zoom, (tiles, _) in sizes.items()},
+        **{f"sizes_{zoom}": values for zoom, (_, values) in sizes.items()},
+    )
+    os.replace(tmp_path, output / STATE_FILE)
+
+
+@instrumented
+def build(
+    df: pd.DataFrame,
+    output: str | Path = DEFAULT_OUTPUT,
+    min_zoom: int = DEFAULT_MIN_ZOOM,
+    max_zoom: int = DEFAULT_MAX_ZOOM,
+    grid_bits: int = DEFAULT_GRID_BITS,
+    fmt: str = "json",
+    points_column: str | None = None,
+    lon: str = "lon",
+    lat: str = "lat",
+    full: bool = False,
+) -> list[ZoomReport]:
+    """Write the tile pyramid for the chargers in ``df``, rewriting only tiles that changed since the last build.
+
+    ``points_column`` holds connection points per charger; without it every
+    charger counts as one point.
+    """
+    if max_zoom + grid_bits > 32:
+        raise ValueError("max_zoom + grid_bits must be at most 32")
+    output = Path(output)
+    output.mkdir(parents=True, exist_ok=True)
+    params = {"min_zoom": min_zoom, "max_zoom": max_zoom, "grid_bits": grid_bits, "format": fmt}
+
+    df = df.dropna(subset=[lon, lat])
+    x, y = mercator(df[lon].to_numpy(), df[lat].to_numpy())
+    if points_column is None:
+        points = np.ones(len(df))
+    else:
+        points = pd.to_numeric(df[points_column], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+    started = time.perf_counter()
+    deepest = level = deepest_level(x, y, points, max_zoom, grid_bits)
+    deepest_seconds = time.perf_counter() - started
+    state = None if full else _load_state(output, params)
+    if state is None:
+        # Unknown or different previous layout: start from an empty pyramid
+        for zoom_dir in output.iterdir():
+            if zoom_dir.is_dir() and zoom_dir.name.isdigit():
+                shutil.rmtree(zoom_dir)
+        dirty, previous_sizes = None, {}
+    else:
+        previous, previous_sizes = state
+        dirty = changed_cells(previous, level)
+        logger.info("%d of %d deepest cells changed", len(dirty), len(level.keys))
+    sizes = {}
+
+    reports = []
+    for zoom in range(max_zoom, min_zoom - 1, -1):
+        started = time.perf_counter()
+        if zoom < max_zoom:
+            level = level.parent()
+        tile_keys = level.keys >> np.uint64(2 * grid_bits)
+        starts = _runs(tile_keys)
+        stops = np.append(starts[1:], len(tile_keys))
+        present = tile_keys[starts]
+
+        if dirty is None:
+            targets = np.arange(len(present))
+            vanished = np.empty(0, np.uint64)
+        else:
+            dirty_tiles = np.unique(dirty >> np.uint64(2 * (max_zoom - zoom + grid_bits)))
+            targets = np.flatnonzero(np.isin(present, dirty_tiles))
+            vanished = np.setdiff1d(dirty_tiles, present)
+
+        tile_sizes = np.zeros(len(present), dtype=np.int64)
+        if zoom in previous_sizes:
+            old_tiles, old_sizes = previous_sizes[zoom]
+            found, values = _lookup_sizes(old_tiles, old_sizes, present)
+            tile_sizes[found] = values
+        tile_x, tile_y = _compact(present), _compact(present >> np.uint64(1))
+        written = bytes_written = 0
+        for i in targets:
+            tx, ty = int(tile_x[i]), int(tile_y[i])
+            body = encode(level, slice(starts[i], stops[i]), tx, ty, fmt)
+            path = _tile_path(output, zoom, tx, ty, fmt)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(path.name + ".tmp")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+            tile_sizes[i] = len(body)
+            written += 1
+            bytes_written += len(body)
+        for key in vanished:
+            _tile_path(output, zoom, int(_compact(key)), int(_compact(key >> np.uint64(1))), fmt).unlink(missing_ok=True)
+
+        sizes[zoom] = (present, tile_sizes)
+        tile_bytes = int(tile_sizes.sum())
+        seconds = time.perf_counter() - started + (deepest_seconds if zoom == max_zoom else 0)
+        reports.append(
+            ZoomReport(
+                zoom,
+                len(level.keys),
+                len(present),
+                written,
+                len(vanished),
+                bytes_written,
+                tile_bytes,
+                int(tile_sizes.max(initial=0)),
+                seconds,
+            )
+        )
+
+    _save_state(output, params, deepest, sizes)
+    tilejson = {
+        "tilejson": "3.0.0",
+        "tiles": [f"{{z}}/{{x}}/{{y}}.{fmt}"],
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "bounds": [float(df[lon].min()), float(df[lat].min()), float(df[lon].max()), float(df[lat].max())]
+        if len(df)
+        else [-180, -85, 180, 85],
+        "extent": TILE_EXTENT,
+        "grid_bits": grid_bits,
+        "fields": ["px", "py", "stations", "points"],
+    }
+    (output / "tiles.json").write_text(json.dumps(tilejson, indent=2))
+    return reports[::-1]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("chargers", type=Path, help="charger points with lon, lat (.parquet or .csv)")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--min-zoom", type=int, default=DEFAULT_MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=DEFAULT_MAX_ZOOM)
+    parser.add_argument("--grid-bits", type=int, default=DEFAULT_GRID_BITS, help="cluster cells per tile side, log2")
+    parser.add_argument("--format", choices=("json", "bin"), default="json")
+    parser.add_argument("--points-column", help="connection points per charger (default: one per charger)")
+    parser.add_argument("--full", action="store_true", help="rewrite every tile")
+    instrument.add_argument(parser, "build-tiles")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.profile:
+        instrument.enable()
+    df = pd.read_csv(args.chargers) if args.chargers.suffix == ".csv" else pd.read_parquet(args.chargers)
+    reports = build(
+        df, args.output, args.min_zoom, args.max_zoom, args.grid_bits, args.format, args.points_column, full=args.full
+    )
+    print(f"{'zoom':>4} {'clusters':>9} {'tiles':>8} {'written':>8} {'deleted':>8} {'KiB':>9} {'mean B':>8} {'max B':>8} {'seconds':>8}")
+    for report in reports:
+        mean = report.tile_bytes / report.tiles if report.tiles else 0
+        print(
+            f"{report.zoom:>4} {report.clusters:>9} {report.tiles:>8} {report.written:>8} {report.deleted:>8} "
+            f"{report.tile_bytes / 1024:>9.1f} {mean:>8.0f} {report.max_tile_bytes:>8} {report.seconds:>8.2f}"
+        )
+    instrument.report(instrument.disable(), args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Publishing and reading versioned Arrow artifacts."""
+
+import pandas as pd
+import pytest
+
+from scripts import artifact
+from scripts.municipalities import KEY, NAME
+
+
+def join_df(income: float = 30000.0) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            KEY: pd.array([1106, 1312, None], dtype="Int32"),
+            NAME: ["Lisboa", "Porto", "Águeda"],
+            "total_charging_points": [30, 10, 20],
+            "Rendimento bruto declarado médio por agregado fiscal": [income, 25000.0, float("nan")],
+        }
+    )
+
+
+def test_round_trip_keeps_dtypes(tmp_path):
+    df = join_df()
+    version = artifact.publish(df, tmp_path)
+    assert (version.version, version.file, version.rows) == (1, "v000001.arrow", 3)
+    assert artifact.latest(tmp_path) == version
+
+    out = artifact.read(tmp_path)
+    pd.testing.assert_frame_equal(out, df)
+    assert out[KEY].dtype == "Int32"
+
+    arrow = artifact.read(tmp_path, arrow_dtypes=True)
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in arrow.dtypes)
+    assert arrow[KEY].isna().tolist() == [False, False, True]
+
+
+def test_nothing_published(tmp_path):
+    assert artifact.latest(tmp_path) is None
+    with pytest.raises(FileNotFoundError):
+        artifact.read(tmp_path)
+
+
+def test_republishing_an_equal_frame_is_a_no_op(tmp_path):
+    first = artifact.publish(join_df(), tmp_path)
+    assert artifact.publish(join_df(), tmp_path) == first
+
+
+def test_keeps_the_newest_versions(tmp_path):
+    for i in range(5):
+        artifact.publish(join_df(income=30000.0 + i), tmp_path)
+    files = sorted(path.name for path in artifact.dataset_dir(tmp_path).iterdir())
+    assert files == ["manifest.json", "v000003.arrow", "v000004.arrow", "v000005.arrow"]
+    assert artifact.latest(tmp_path).version == 5
+    assert artifact.read(tmp_path)["Rendimento bruto declarado médio por agregado fiscal"][0] == 30004.0
+
+
+def test_mapped_versions_outlive_later_publishes(tmp_path):
+    artifact.publish(join_df(), tmp_path)
+    table = artifact.open_table(tmp_path)
+
+    # Enough publishes to prune the mapped file
+    for i in range(1, 5):
+        artifact.publish(join_df(income=30000.0 + i), tmp_path)
+    assert not (artifact.dataset_dir(tmp_path) / "v000001.arrow").exists()
+
+    pd.testing.assert_frame_equal(table.to_pandas(), join_df())
+    assert artifact.read(tmp_path)["Rendimento bruto declarado médio por agregado fiscal"][0] == 30004.0
@@ -0,0 +1,74 @@
+"""Attributing chargers to municipalities by their coordinates."""
+
+import json
+
+import pandas as pd
+import pytest
+
+from scripts import core
+from scripts.boundaries import Boundaries
+from scripts.eredes import CODE_COLUMN, LAT_COLUMN, LON_COLUMN, POINTS_COLUMN, QUARTER_COLUMN
+from scripts.municipalities import KEY, NAME
+
+
+def square(x0: float, y0: float, size: float = 1.0) -> dict:
+    ring = [[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size], [x0, y0]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+@pytest.fixture
+def boundary_file(tmp_path):
+    # Two side by side municipalities, the second with a hole
+    west = square(0, 0)
+    east = square(1, 0)
+    east["coordinates"].append([[1.4, 0.4], [1.6, 0.4], [1.6, 0.6], [1.4, 0.6], [1.4, 0.4]])
+    features = [
+        {"type": "Feature", "properties": {"DICO": "0101", NAME: "Aveiro"}, "geometry": west},
+        {"type": "Feature", "properties": {"DICO": "0102", NAME: "Braga"}, "geometry": east},
+    ]
+    path = tmp_path / "caop.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    return path
+
+
+@pytest.fixture
+def density():
+    return pd.DataFrame({"Código_NUTS": ["1110101", "1110102"], NAME: ["Aveiro", "Braga"], "Densidade_Populacional_km2": [1.0, 2.0]})
+
+
+def chargers() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            QUARTER_COLUMN: ["2025T3"] * 5,
+            # Every label says Aveiro, but only the first charger is there
+            NAME: ["Aveiro"] * 5,
+            CODE_COLUMN: [101] * 5,
+            LON_COLUMN: [0.5, 1.2, 1.8, 1.5, 5.0],
+            LAT_COLUMN: [0.5, 0.5, 0.9, 0.5, 5.0],
+            POINTS_COLUMN: [2, 3, 4, 8, 16],
+        }
+    )
+
+
+def test_locate_handles_holes_and_outside_points(boundary_file):
+    boundaries = Boundaries.from_geojson(boundary_file)
+    assert boundaries.locate([0.5, 1.2, 1.5, 5.0], [0.5, 0.5, 0.5, 5.0]).tolist() == [0, 1, -1, -1]
+
+
+def test_chargers_follow_their_coordinates_not_their_label(boundary_file, density):
+    by_label = core.aggregate_chargers(chargers(), density)
+    assert by_label[KEY].tolist() == [101]
+
+    by_location = core.aggregate_chargers(chargers(), density, boundaries=boundary_file)
+    assert by_location[KEY].tolist() == [101, 102]
+    assert by_location["count_rows"].tolist() == [1, 2]
+    assert by_location["sum_pontos_de_ligacao"].tolist() == [2, 7]
+
+
+def test_charger_files_with_boundaries(boundary_file, density, tmp_path):
+    path = tmp_path / "Trimestre=2025T3.csv"
+    chargers().to_csv(path, sep=";", index=False)
+    pd.testing.assert_frame_equal(
+        core.aggregate_charger_files(path, density, boundaries=boundary_file),
+        core.aggregate_chargers(chargers(), density, boundaries=boundary_file),
+    )
@@ -0,0 +1,143 @@
+"""DatasetCache against a local ``http.server`` standing in for the export API."""
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+import requests
+
+from scripts.cache import DatasetCache, OfflineCacheMiss
+
+
+class ExportServer(ThreadingHTTPServer):
+    """Serves ``payloads[path]`` with an ETag and answers matching conditional GETs with 304."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), ExportHandler)
+        self.payloads: dict[str, bytes] = {}
+        self.statuses: list[int] = []
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        payload = self.server.payloads.get(self.path)
+        if payload is None:
+            status, body, etag = 404, b"", None
+        else:
+            etag = f'"{hashlib.sha256(payload).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+            else:
+                status, body = 200, payload
+        self.server.statuses.append(status)
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ExportServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def csv(rows: int) -> bytes:
+    return ("Concelho;Pontos\n" + "".join(f"C{i};{i}\n" for i in range(rows))).encode()
+
+
+def test_fresh_then_not_modified_then_changed(server, tmp_path):
+    server.payloads["/export.csv"] = csv(3)
+    url = server.url("/export.csv")
+
+    df = DatasetCache(tmp_path, ttl=3600).read_csv(url, sep=";")
+    assert df["Pontos"].tolist() == [0, 1, 2]
+    assert server.statuses == [200]
+
+    # Within the TTL the snapshot is served without a request
+    pd.testing.assert_frame_equal(DatasetCache(tmp_path, ttl=3600).read_csv(url, sep=";"), df)
+    assert server.statuses == [200]
+
+    # Past the TTL the conditional GET is answered with 304 and the snapshot reused
+    (entry,) = DatasetCache(tmp_path)._load_index().values()
+    fetched_at = entry.fetched_at
+    pd.testing.assert_frame_equal(DatasetCache(tmp_path, ttl=0).read_csv(url, sep=";"), df)
+    assert server.statuses == [200, 304]
+    (entry,) = DatasetCache(tmp_path)._load_index().values()
+    assert entry.fetched_at > fetched_at
+
+    server.payloads["/export.csv"] = csv(4)
+    assert DatasetCache(tmp_path, ttl=0).read_csv(url, sep=";")["Pontos"].tolist() == [0, 1, 2, 3]
+    assert server.statuses == [200, 304, 200]
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
+
+
+def test_parse_options_are_cached_separately(server, tmp_path):
+    server.payloads["/export.csv"] = csv(2)
+    url = server.url("/export.csv")
+    cache = DatasetCache(tmp_path, ttl=3600)
+    assert list(cache.read_csv(url, sep=";").columns) == ["Concelho", "Pontos"]
+    assert list(cache.read_csv(url, sep=",").columns) == ["Concelho;Pontos"]
+    assert server.statuses == [200, 200]
+
+
+def test_offline_serves_last_snapshot(server, tmp_path, monkeypatch):
+    server.payloads["/export.csv"] = csv(3)
+    url = server.url("/export.csv")
+    expected = DatasetCache(tmp_path).read_csv(url, sep=";")
+    server.payloads["/export.csv"] = csv(5)
+
+    pd.testing.assert_frame_equal(DatasetCache(tmp_path, ttl=0, offline=True).read_csv(url, sep=";"), expected)
+    monkeypatch.setenv("EV_CHARGERS_OFFLINE", "1")
+    pd.testing.assert_frame_equal(DatasetCache(tmp_path, ttl=0).read_csv(url, sep=";"), expected)
+    assert server.statuses == [200]
+
+    with pytest.raises(OfflineCacheMiss):
+        DatasetCache(tmp_path).read_csv(server.url("/other.csv"), sep=";")
+
+
+def test_unreachable_server_serves_last_snapshot(server, tmp_path):
+    server.payloads["/export.csv"] = csv(3)
+    url = server.url("/export.csv")
+    expected = DatasetCache(tmp_path).read_csv(url, sep=";")
+    server.shutdown()
+    server.server_close()
+
+    pd.testing.assert_frame_equal(DatasetCache(tmp_path, ttl=0, timeout=5).read_csv(url, sep=";"), expected)
+    with pytest.raises(requests.RequestException):
+        DatasetCache(tmp_path, ttl=0, timeout=5).read_csv(server.url("/other.csv"), sep=";")
+
+
+def test_evicts_least_recently_used(server, tmp_path):
+    for name in ("a", "b", "c"):
+        server.payloads[f"/{name}.csv"] = csv(200 + ord(name))
+    urls = {name: server.url(f"/{name}.csv") for name in ("a", "b", "c")}
+
+    cache = DatasetCache(tmp_path, ttl=3600)
+    cache.read_csv(urls["a"], sep=";")
+    size = next(tmp_path.glob("*.parquet")).stat().st_size
+    # Room for two snapshots: reading c evicts b, the least recently used
+    cache.max_bytes = int(size * 2.5)
+    cache.read_csv(urls["b"], sep=";")
+    cache.read_csv(urls["a"], sep=";")
+    cache.read_csv(urls["c"], sep=";")
+
+    assert len(list(tmp_path.glob("*.parquet"))) == 2
+    assert sorted(entry.url for entry in cache._load_index().values()) == [urls["a"], urls["c"]]
+    assert server.statuses == [200, 200, 200]
+    cache.read_csv(urls["b"], sep=";")
+    assert server.statuses == [200, 200, 200, 200]
@@ -0,0 +1,73 @@
+"""Batched correlations against scipy, and reproducibility of the resampling."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import spearmanr
+
+from scripts import correlation
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(7)
+    x = rng.integers(0, 12, 40).astype(float)  # many ties
+    return pd.DataFrame(
+        {
+            "x": x,
+            "y": 2 * x + rng.normal(0, 4, 40),
+            "z": rng.exponential(1.0, 40).round(1),
+        }
+    )
+
+
+def test_statistics_match_scipy_and_numpy(df):
+    result = correlation.correlate(df, ["x", "y", "z"], resamples=0, permutations=0)
+    np.testing.assert_allclose(result.spearman, spearmanr(df).statistic)
+    np.testing.assert_allclose(result.pearson, np.corrcoef(df.to_numpy(), rowvar=False))
+    slope, intercept = np.polyfit(df["x"], df["y"], 1)
+    assert result.slope[0, 1] == pytest.approx(slope)
+    assert result.intercept("x", "y") == pytest.approx(intercept)
+
+
+def test_resampled_ranks_match_scipy(df):
+    values = df.to_numpy()
+    levels = (pd.DataFrame(values).rank(method="dense").to_numpy() - 1).astype(np.int64)
+    rows = np.random.default_rng(0).integers(0, len(values), size=(5, len(values)))
+    _, cov = correlation._covariance(correlation._resampled_ranks(levels, rows))
+    batched = correlation._correlation(cov)
+    for resample, drawn in enumerate(rows):
+        np.testing.assert_allclose(batched[resample], spearmanr(values[drawn]).statistic)
+
+
+def resampled(df, **kwargs) -> correlation.Correlations:
+    return correlation.correlate(df, ["x", "y", "z"], resamples=300, permutations=300, **kwargs)
+
+
+def test_same_seed_same_result_for_any_number_of_jobs(df, monkeypatch):
+    # Many small shards, run in a process pool
+    monkeypatch.setattr(correlation, "SHARD_VALUES", 40 * 3 * 25)
+    monkeypatch.setattr(correlation, "POOL_THRESHOLD", 100)
+    results = [resampled(df, seed=11, jobs=jobs) for jobs in (1, 3)]
+    monkeypatch.setattr(correlation, "POOL_THRESHOLD", 10**9)
+    results.append(resampled(df, seed=11))
+
+    first = results[0]
+    for other in results[1:]:
+        for name in ("pearson_ci", "spearman_ci", "slope_ci", "pearson_p", "spearman_p"):
+            np.testing.assert_array_equal(getattr(other, name), getattr(first, name), err_msg=name)
+
+    other_seed = resampled(df, seed=12)
+    assert not np.array_equal(other_seed.pearson_ci, first.pearson_ci)
+
+
+def test_intervals_and_p_values(df):
+    result = resampled(df)
+    low, high = result.pearson_ci[:, 0, 1]
+    assert low < result.pearson[0, 1] < high
+    # y depends on x; z is independent of both
+    assert result.pearson_p[0, 1] == pytest.approx(1 / 301)
+    assert result.spearman_p[0, 2] > 0.05
+    table = result.table()
+    assert len(table) == 6
+    assert {"pearson_low", "spearman_high", "slope_low", "pearson_p", "spearman_p"} <= set(table)
@@ -0,0 +1,66 @@
+"""The municipality x quarter x metric cube."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts.cube import ATTRIBUTES, METRICS, build_cube, quarter_range
+from scripts.eredes import POINTS_COLUMN, QUARTER_COLUMN
+from scripts.municipalities import KEY
+
+
+@pytest.fixture
+def cube():
+    # Municipality 105 has no chargers in 2025T2
+    chargers = pd.DataFrame(
+        {
+            KEY: [101, 101, 105, 101, 101, 101, 105, 105],
+            QUARTER_COLUMN: ["2025T1", "2025T1", "2025T1", "2025T2", "2025T3", "2025T3", "2025T3", "2025T3"],
+            POINTS_COLUMN: [2, 4, 3, 6, 6, 3, 1, 2],
+        }
+    )
+    attributes = pd.DataFrame(
+        {
+            KEY: [101, 105],
+            ATTRIBUTES["density"]: [300.0, 60.0],
+            ATTRIBUTES["income"]: [17000.0, 15000.0],
+            ATTRIBUTES["households"]: [3000.0, None],
+        }
+    )
+    return build_cube(chargers, attributes)
+
+
+def test_quarter_range_crosses_years():
+    assert quarter_range("2024T3", "2025T2") == ["2024T3", "2024T4", "2025T1", "2025T2"]
+
+
+def test_build_cube(cube):
+    assert cube.keys.tolist() == [101, 105]
+    assert cube.quarters == ["2025T1", "2025T2", "2025T3"]
+    assert cube.metrics == list(METRICS)
+    assert cube.values.shape == (2, 3, len(METRICS))
+    assert cube.metric("stations").to_numpy().tolist() == [[2, 1, 2], [1, 0, 2]]
+    assert cube.metric("points").to_numpy().tolist() == [[6, 6, 9], [3, 0, 3]]
+    assert cube.at(105, "2025T2", "density") == 60.0
+
+    latest = cube.quarter()
+    assert latest.loc[101, "points_per_1000_households"] == 3.0
+    # Missing households leave the ratio missing
+    assert np.isnan(latest.loc[105, "points_per_1000_households"])
+    assert latest["income"].tolist() == [17000.0, 15000.0]
+
+
+def test_growth(cube):
+    growth = cube.growth("points")
+    assert growth.columns.tolist() == ["2025T2", "2025T3"]
+    np.testing.assert_array_equal(growth.loc[101], [0.0, 0.5])
+    # No growth rate from a quarter without chargers
+    np.testing.assert_array_equal(growth.loc[105], [-1.0, np.nan])
+    np.testing.assert_array_equal(cube.growth("points", periods=2).to_numpy(), [[0.5], [0.0]])
+
+
+def test_rolling(cube):
+    mean = cube.rolling("points", window=2)
+    assert mean.columns.tolist() == ["2025T2", "2025T3"]
+    assert mean.to_numpy().tolist() == [[6.0, 7.5], [1.5, 1.5]]
+    assert cube.rolling("stations", window=3, how="sum").to_numpy().tolist() == [[5], [3]]
@@ -0,0 +1,120 @@
+"""download-eredes-chargers against a local ``http.server`` standing in for opendatasoft."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+from scripts import download_eredes_chargers as eredes
+
+FIELDS = [("trimestre", "Trimestre"), ("coddistritoconcelho", "CodDistritoConcelho"), ("pontos", "Pontos")]
+
+
+class OpendatasoftServer(ThreadingHTTPServer):
+    """Records API with a paging window of ``window`` records, plus the CSV exports endpoint."""
+
+    def __init__(self, records: list[dict], window: int):
+        super().__init__(("127.0.0.1", 0), OpendatasoftHandler)
+        self.records = records
+        self.window = window
+        self.paths: list[str] = []
+        self.offsets: list[int] = []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/dataset"
+
+
+class OpendatasoftHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.server.paths.append(url.path)
+        records = self.server.records
+        if "where" in params:
+            quarter = params["where"].split('"')[1]
+            records = [record for record in records if record["trimestre"] == quarter]
+
+        if url.path == "/dataset":
+            self._send(json.dumps({"fields": [{"name": name, "label": label} for name, label in FIELDS]}))
+        elif url.path == "/dataset/records" and "group_by" in params:
+            quarters = sorted({record["trimestre"] for record in records})
+            self._send(json.dumps({"results": [{"trimestre": quarter} for quarter in quarters]}))
+        elif url.path == "/dataset/records":
+            offset, limit = int(params.get("offset", 0)), int(params["limit"])
+            if limit:
+                self.server.offsets.append(offset)
+            if offset + limit > self.server.window:
+                self._send(json.dumps({"error": "offset + limit too large"}), status=400)
+                return
+            self._send(json.dumps({"total_count": len(records), "results": records[offset : offset + limit]}))
+        elif url.path == "/dataset/exports/csv":
+            lines = [";".join(label for _, label in FIELDS)]
+            lines += [";".join(str(record[name]) for name, _ in FIELDS) for record in records]
+            self._send("\n".join(lines) + "\n")
+        else:
+            self._send("", status=404)
+
+    def _send(self, body: str, status: int = 200):
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(eredes, "MAX_RECORDS_WINDOW", 10)
+    records = [{"trimestre": "2025T2", "coddistritoconcelho": 101 + i, "pontos": i} for i in range(7)]
+    records += [{"trimestre": "2025T3", "coddistritoconcelho": 101 + i, "pontos": i} for i in range(25)]
+    server = OpendatasoftServer(records, window=10)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pages_small_quarters_and_exports_large_ones(server, tmp_path):
+    written = eredes.download(tmp_path, server.base_url, page_size=3)
+    assert [path.name for path in written] == ["Trimestre=2025T2.csv", "Trimestre=2025T3.csv"]
+
+    small = pd.read_csv(written[0], sep=";")
+    large = pd.read_csv(written[1], sep=";")
+    assert small["Pontos"].tolist() == list(range(7))
+    assert large["Pontos"].tolist() == list(range(25))
+    assert list(small.columns) == list(large.columns) == [label for _, label in FIELDS]
+    assert server.paths.count("/dataset/exports/csv") == 1
+    assert not list(tmp_path.glob("*.partial")) and not list(tmp_path.glob("*.state.json"))
+
+
+def test_last_page_stays_inside_the_window(server, tmp_path):
+    # Ten records paged by six: the second request asks for four so offset + limit stays within the window
+    server.records = [record for record in server.records if record["trimestre"] == "2025T3"][:10]
+    (path,) = eredes.download(tmp_path, server.base_url, page_size=6)
+    assert len(pd.read_csv(path, sep=";")) == 10
+    assert "/dataset/exports/csv" not in server.paths
+
+
+def test_resumes_an_interrupted_quarter(server, tmp_path):
+    server.records = [record for record in server.records if record["trimestre"] == "2025T2"]
+    header = ";".join(label for _, label in FIELDS) + "\n"
+    page = "".join(f"2025T2;{101 + i};{i}\n" for i in range(3))
+    partial = tmp_path / "Trimestre=2025T2.csv.partial"
+    # A page that was written but not recorded in the sidecar before the interruption
+    partial.write_text(header + page + "2025T2;104;3\n2025T2;10")
+    state = {"offset": 3, "bytes": len((header + page).encode()), "total": 7}
+    (tmp_path / "Trimestre=2025T2.csv.state.json").write_text(json.dumps(state))
+
+    (path,) = eredes.download(tmp_path, server.base_url, page_size=3)
+    # The unrecorded bytes are dropped and every record is written once, under one header
+    assert path.read_text() == header + "".join(f"2025T2;{101 + i};{i}\n" for i in range(7))
+    assert server.offsets == [3, 6]
+    assert not partial.exists() and not (tmp_path / "Trimestre=2025T2.csv.state.json").exists()
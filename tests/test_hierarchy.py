@@ -0,0 +1,112 @@
+"""Rolling parish metrics up to municipalities, NUTS III and NUTS II."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import core
+from scripts.hierarchy import CODE, DENSITY, HOUSEHOLDS, INCOME, LEVEL, PARISHES, POINTS, STATIONS, parish_keys, rollup
+from scripts.municipalities import KEY, NAME
+
+# Two NUTS II regions; municipality 1110102 has one parish and no data for it
+UNITS = [
+    ("nuts2", "11", None, "Norte"),
+    ("nuts3", "111", None, "Alto Minho"),
+    ("municipality", "1110101", 101, "Arcos de Valdevez"),
+    ("parish", "111010101", 10101, "Aboim das Choças"),
+    ("parish", "111010102", 10102, "Aguiã"),
+    ("municipality", "1110102", 102, "Caminha"),
+    ("parish", "111010201", 10201, "Âncora"),
+    ("nuts3", "112", None, "Cávado"),
+    ("municipality", "1120301", 301, "Braga"),
+    ("parish", "112030101", 30101, "Adaúfe"),
+    ("nuts2", "16", None, "Centro"),
+    ("nuts3", "16D", None, "Região de Aveiro"),
+    ("municipality", "16D0401", 401, "Águeda"),
+    ("parish", "16D040101", 40101, "Aguada de Cima"),
+]
+
+
+@pytest.fixture
+def units():
+    level, code, key, name = zip(*UNITS)
+    return pd.DataFrame(
+        {
+            LEVEL: level,
+            CODE: pd.array(code, dtype="string"),
+            KEY: pd.array(key, dtype="Int32"),
+            NAME: name,
+            DENSITY: np.arange(len(UNITS), dtype=float),
+        }
+    )
+
+
+@pytest.fixture
+def parishes():
+    return pd.DataFrame(
+        {
+            KEY: [10101, 10102, 10201, 30101, 40101],
+            STATIONS: [2, 1, None, 4, 3],
+            POINTS: [5, 3, None, 8, 6],
+            INCOME: [10000.0, 20000.0, None, 15000.0, 12000.0],
+            HOUSEHOLDS: [100.0, 300.0, None, 200.0, 50.0],
+        }
+    )
+
+
+def by_code(df: pd.DataFrame) -> pd.DataFrame:
+    return df.set_index(CODE)
+
+
+def test_sums_every_level(units, parishes):
+    levels = rollup(parishes, units)
+    assert list(levels) == ["nuts2", "nuts3", "municipality", "parish"]
+    expected = {
+        "nuts2": {"11": (7, 16, 600, 4), "16": (3, 6, 50, 1)},
+        "nuts3": {"111": (3, 8, 400, 3), "112": (4, 8, 200, 1), "16D": (3, 6, 50, 1)},
+        "municipality": {"1110101": (3, 8, 400, 2), "1120301": (4, 8, 200, 1), "16D0401": (3, 6, 50, 1)},
+    }
+    for name, rows in expected.items():
+        df = by_code(levels[name])
+        for code, values in rows.items():
+            assert tuple(df.loc[code, [STATIONS, POINTS, HOUSEHOLDS, PARISHES]]) == values, (name, code)
+    # Every unit keeps the density reported for it
+    assert by_code(levels["nuts3"]).loc["112", DENSITY] == 7.0
+
+
+def test_income_is_weighted_by_households(units, parishes):
+    levels = rollup(parishes, units)
+    assert by_code(levels["municipality"]).loc["1110101", INCOME] == 17500.0
+    assert by_code(levels["nuts2"]).loc["11", INCOME] == pytest.approx(10_000_000 / 600)
+    assert by_code(levels["nuts2"]).loc["16", INCOME] == 12000.0
+
+
+def test_units_without_data_stay_missing(units, parishes):
+    municipality = by_code(rollup(parishes, units)["municipality"]).loc["1110102"]
+    assert municipality[STATIONS] is pd.NA
+    assert municipality[POINTS] is pd.NA
+    assert np.isnan(municipality[INCOME])
+    assert np.isnan(municipality[HOUSEHOLDS])
+    assert municipality[PARISHES] == 1
+
+
+def test_municipal_chargers_replace_the_parish_sums(units, parishes):
+    municipal = pd.DataFrame({KEY: [101, 301], "count_rows": [10, 5], "sum_pontos_de_ligacao": [20.0, 9.0]})
+    assert set(core.JOIN_COLUMNS) <= set(municipal)
+    levels = rollup(parishes, units, municipal)
+
+    municipality = by_code(levels["municipality"])
+    assert tuple(municipality.loc["1110101", [STATIONS, POINTS]]) == (10, 20)
+    # Municipalities missing from the aggregate have no counts, whatever their parishes say
+    assert municipality.loc["16D0401", STATIONS] is pd.NA
+    assert tuple(by_code(levels["nuts3"]).loc["111", [STATIONS, POINTS]]) == (10, 20)
+    nuts2 = by_code(levels["nuts2"])
+    assert tuple(nuts2.loc["11", [STATIONS, POINTS]]) == (15, 29)
+    assert nuts2.loc["16", STATIONS] is pd.NA
+    # Parishes keep their own counts
+    assert by_code(levels["parish"]).loc["111010101", STATIONS] == 2
+
+
+def test_parish_keys():
+    codes = pd.Series(["010101", 10101, "10101.0", "111010101", "16D040101", "1110101", "11", "abc", None], dtype=object)
+    assert parish_keys(codes).tolist() == [10101, 10101, 10101, 10101, 40101, pd.NA, pd.NA, pd.NA, pd.NA]
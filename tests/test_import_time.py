@@ -0,0 +1,32 @@
+"""Import-time budgets of the CLIs, checked in fresh interpreters."""
+
+import pytest
+
+from benchmarks.import_time import BUDGETS, FORBIDDEN, import_time
+
+REPEAT = 3
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS))
+def test_import_within_budget(module):
+    runs = [import_time(module) for _ in range(REPEAT)]
+    seconds = min(run[0] for run in runs)
+    assert seconds <= BUDGETS[module], f"{module} took {seconds:.3f}s, budget {BUDGETS[module]}s"
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS))
+def test_import_pulls_in_no_heavy_dependency(module):
+    _, imported = import_time(module)
+    assert not {name.split(".")[0] for name in imported} & set(FORBIDDEN)
+
+
+@pytest.mark.parametrize("module", ["scripts.download_eredes_chargers", "scripts.download_arcgis_chargers"])
+def test_download_clis_do_not_import_pandas(module):
+    _, imported = import_time(module)
+    assert "pandas" not in imported
+
+
+def test_core_does_not_import_requests():
+    # The HTTP stack is only loaded once the cache actually fetches something
+    _, imported = import_time("scripts.core")
+    assert "requests" not in imported
@@ -0,0 +1,136 @@
+"""Readers of the INE exports."""
+
+import pandas as pd
+import pytest
+
+from scripts import ine
+
+DENSITY_CSV = """\
+Densidade populacional (N.º/ km²) por Local de residência (NUTS - 2024); Anual
+Fonte: INE, Estimativas anuais da população residente
+;;;;;;
+Dados extraídos em 12 de setembro de 2025
+;;;;;;
+Período de referência dos dados;Local de residência (NUTS - 2024);Densidade populacional (N.º/ km²);;;;
+;;Tipologia de áreas urbanas;;;;
+Período;Local;Densidade;Cidades;Freguesias;Vilas;
+2024;PT: Portugal;115,4;x;3092;x;
+;1: Continente;112,6;x;2882;x;
+;11: Norte;170,3;x;1426;x;
+;111: Alto Minho;104,5;x;208;x;
+;1111601: Arcos de Valdevez;38,2;x;36;x;
+;1111602: Caminha;118,9;1;14;x;
+;1111603: Melgaço;x;x;13;x;
+;11116010101: Aboim das Choças;12,1;x;1;x;
+2023;PT: Portugal;114,9;x;3092;x;
+;1111601: Arcos de Valdevez;38,6;x;36;x;
+;1111602: Caminha;118,1;1;14;x;
+;;;;;;
+Fonte: INE, Estimativas anuais da população residente
+Última atualização destes dados: 15 de junho de 2025
+"""
+
+
+def notebook_density(path) -> pd.DataFrame:
+    """The notebook's pandas cleanup of the density export, before the streaming parser."""
+    df = pd.read_csv(path, sep=";", skiprows=7, decimal=",", encoding="latin-1")
+    column_mapping = {
+        df.columns[0]: "Ano",
+        df.columns[1]: "Região",
+        df.columns[2]: "Densidade_Populacional_km2",
+        df.columns[4]: "Freguesias",
+    }
+    df = df[list(column_mapping.keys())].rename(columns=column_mapping)
+    df["Código_NUTS"] = df["Região"].str.extract(r"^([^:]+):")
+    df["Região"] = df["Região"].str.replace(r"^[^:]+:\s*", "", regex=True)
+    df = df[df["Região"].notna()]
+    df = df.replace("x", pd.NA)
+    df["Densidade_Populacional_km2"] = df["Densidade_Populacional_km2"].astype(str).str.replace(",", ".", regex=False)
+    df["Ano"] = df["Ano"].ffill()
+    df = df[df["Ano"].isin(["2024"])]
+    df = df[df["Região"].notna() & ~df["Região"].astype(str).str.contains("Fonte:|Última atualização|Dimensão", na=False)]
+    for col in ["Densidade_Populacional_km2", "Freguesias"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["Ano"] = df["Ano"].astype(int)
+    return df[df["Código_NUTS"].str.len() == 7]
+
+
+@pytest.fixture
+def density_csv(tmp_path):
+    path = tmp_path / "ine_densidade_populacional.csv"
+    path.write_text(DENSITY_CSV, encoding="latin-1")
+    return path
+
+
+def test_density_matches_the_notebook_cleanup(density_csv):
+    table = ine.read_density(density_csv)
+    expected = notebook_density(density_csv)
+    pd.testing.assert_frame_equal(
+        table.data,
+        expected[table.data.columns].reset_index(drop=True),
+        check_dtype=False,
+    )
+    assert table.data["Código_NUTS"].tolist() == ["1111601", "1111602", "1111603"]
+    assert table.data["Região"].tolist() == ["Arcos de Valdevez", "Caminha", "Melgaço"]
+    assert table.data["Densidade_Populacional_km2"].isna().tolist() == [False, False, True]
+
+
+def test_tabulator_keeps_metadata_and_other_levels(density_csv):
+    table = ine.read_density(density_csv, years=None, nuts_length=None)
+    assert table.data["Ano"].tolist() == [2024] * 8 + [2023] * 3
+    assert table.data["Código_NUTS"].tolist()[:4] == ["PT", "1", "11", "111"]
+    assert table.header[0].startswith("Densidade populacional")
+    assert table.header[-1] == "Período;Local;Densidade;Cidades;Freguesias;Vilas"
+    assert table.footer == [
+        "Fonte: INE, Estimativas anuais da população residente",
+        "Última atualização destes dados: 15 de junho de 2025",
+    ]
+
+
+def write_income(path, incomes):
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = ine.INCOME_SHEET
+    ws.append(["Rendimento bruto declarado, 2023"])
+    ws.append(["Código territorial", "Designação", "Nível territorial", ine.INCOME_COLUMN, ine.HOUSEHOLDS_COLUMN])
+    ws.append(["PT", "Portugal", "País", 20000.0, 5_000_000])
+    for (code, name), income in zip([("1601", "Arcos de Valdevez"), ("1602", "Caminha")], incomes):
+        ws.append([code, name, "Município", income, 9000])
+    ws.append(["160101", "Aboim das Choças", "Freguesia", 11000.0, 80])
+    wb.save(path)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    calls = []
+    read_sheet = ine._read_income_sheet
+
+    def counting(*args):
+        calls.append(args)
+        return read_sheet(*args)
+
+    monkeypatch.setattr(ine, "_read_income_sheet", counting)
+    return calls
+
+
+def test_income_is_cached_by_workbook_content(tmp_path, parses):
+    path, cache_dir = tmp_path / "ERendimentoNLocal2023.xlsx", tmp_path / "cache"
+    write_income(path, [14000.0, 16000.0])
+
+    first = ine.read_income(path, cache_dir=cache_dir)
+    assert first[ine.INCOME_CODE_COLUMN].tolist() == ["1601", "1602"]
+    pd.testing.assert_frame_equal(ine.read_income(path, cache_dir=cache_dir), first)
+    assert len(parses) == 1
+    assert len(list(cache_dir.glob("*.parquet"))) == 1
+
+    # Other read options are cached separately
+    assert ine.read_income(path, level="Freguesia", cache_dir=cache_dir)["Concelho"].tolist() == ["Aboim das Choças"]
+    assert len(parses) == 2
+
+    write_income(path, [14000.0, 17000.0])
+    changed = ine.read_income(path, cache_dir=cache_dir)
+    assert len(parses) == 3
+    assert changed[ine.INCOME_COLUMN].tolist() == [14000.0, 17000.0]
+    assert ine.read_income(path, cache_dir=None).equals(changed)
@@ -0,0 +1,47 @@
+"""Code-keyed joins of the municipality sources."""
+
+import pandas as pd
+
+from scripts.municipalities import KEY, NAME, MunicipalityIndex, inner, join_sources, lost
+
+
+def reference() -> MunicipalityIndex:
+    return MunicipalityIndex.from_frame(
+        pd.DataFrame({"Código_NUTS": ["1110601", "1110602", "1110603"], NAME: ["Aveiro", "Braga", "Coimbra"]})
+    )
+
+
+def test_join_sources_flags_keys_only_a_later_source_has():
+    index = reference()
+    joined = join_sources(
+        index,
+        {
+            "INE": pd.DataFrame({KEY: pd.array([601, 602], dtype="Int32"), "income": [1.0, 2.0]}),
+            "densidade": pd.DataFrame({KEY: pd.array([601, 602, 603], dtype="Int32"), "density": [1.0, 2.0, 3.0]}),
+            "EREDES": pd.DataFrame({KEY: pd.array([601, 603, 999], dtype="Int32"), "count_rows": [4, 5, 6]}),
+        },
+    )
+
+    assert joined[KEY].tolist() == [601, 602, 603, 999]
+    assert list(joined.columns) == [KEY, NAME, "income", "in_INE", "density", "in_densidade", "count_rows", "in_EREDES"]
+    assert (joined.filter(like="in_").dtypes == bool).all()
+    assert joined["in_INE"].tolist() == [True, True, False, False]
+    assert joined["in_densidade"].tolist() == [True, True, True, False]
+    assert joined["in_EREDES"].tolist() == [True, False, True, True]
+    assert str(joined["count_rows"].dtype) == "Int64"
+
+    assert inner(joined)[KEY].tolist() == [601]
+    assert lost(joined)[KEY].tolist() == [602, 603, 999]
+
+
+def test_join_sources_keeps_the_first_row_of_a_municipality():
+    joined = join_sources(
+        reference(),
+        {
+            "INE": pd.DataFrame(
+                {KEY: pd.array([601, 601, None], dtype="Int32"), NAME: ["Aveiro", "Aveiro", "?"], "income": [1.0, 2.0, 3.0]}
+            )
+        },
+    )
+    assert joined["income"].tolist()[:1] == [1.0]
+    assert joined[NAME].tolist() == ["Aveiro", "Braga", "Coimbra"]
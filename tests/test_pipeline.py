@@ -0,0 +1,103 @@
+"""Pipeline memoization: stages re-run only when their inputs or code change."""
+
+import types
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from scripts import ine, pipeline, ranking
+
+MUNICIPALITIES = {"0101": "Águeda", "0102": "Albergaria-a-Velha", "0103": "Anadia"}
+
+
+def write_partition(eredes_dir, points):
+    rows = [
+        {
+            "Trimestre": "2025T3",
+            "Concelho": name,
+            "CodDistritoConcelho": dico,
+            "Pontos de ligação para instalações de PCVE": count,
+        }
+        for (dico, name), count in zip(MUNICIPALITIES.items(), points)
+    ]
+    pd.DataFrame(rows).to_csv(eredes_dir / "Trimestre=2025T3.csv", sep=";", index=False)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    income_path = tmp_path / "ERendimentoNLocal2023.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Agregados_pub_2023"
+    ws.append(["Rendimento bruto declarado"])
+    ws.append(["Código territorial", "Designação", "Nível territorial", ine.INCOME_COLUMN])
+    for i, (dico, name) in enumerate(MUNICIPALITIES.items()):
+        ws.append([dico, name, "Município", 15000.0 + 1000 * i])
+    wb.save(income_path)
+
+    density_path = tmp_path / "densidade.csv"
+    lines = ["Densidade populacional", "Período;Local;Densidade;Cidades;Freguesias;Vilas;"]
+    for i, (dico, name) in enumerate(MUNICIPALITIES.items()):
+        lines.append(f"{'2024' if i == 0 else ''};116{dico}: {name};{100 + 50 * i},5;x;10;x;")
+    lines.append("Fonte: INE")
+    density_path.write_text("\n".join(lines) + "\n", encoding="latin-1")
+
+    eredes_dir = tmp_path / "eredes"
+    eredes_dir.mkdir()
+    write_partition(eredes_dir, [4, 2, 7])
+    return income_path, density_path, eredes_dir
+
+
+def stages(sources, **overrides):
+    income_path, density_path, eredes_dir = sources
+    result = pipeline.default_stages(str(income_path), str(density_path), 2024, eredes_dir=str(eredes_dir))
+    for stage in result:
+        if stage.name in overrides:
+            stage.code = (*stage.code, overrides[stage.name])
+    return result
+
+
+def statuses(runs):
+    return {name: run.status for name, run in runs.items()}
+
+
+def test_changing_the_chargers_reruns_only_their_branch(sources, tmp_path):
+    cache_dir = tmp_path / "cache"
+    first = pipeline.run(stages(sources), cache_dir, jobs=1)
+    assert set(statuses(first).values()) == {"ran"}
+    assert statuses(pipeline.run(stages(sources), cache_dir, jobs=1)) == dict.fromkeys(first, "cached")
+
+    write_partition(sources[2], [4, 2, 9])
+    rerun = pipeline.run(stages(sources), cache_dir, jobs=1)
+    assert statuses(rerun) == {
+        "income": "cached",
+        "density": "cached",
+        "eredes_agg": "ran",
+        "joined": "ran",
+        "join": "ran",
+        "ranked": "ran",
+    }
+    ranked = pd.read_parquet(rerun["ranked"].path)
+    assert sorted(ranked[ranking.METRICS["points"]].tolist()) == [2, 4, 9]
+
+
+def test_editing_a_stage_module_invalidates_it(sources, tmp_path):
+    # A stand-in for one of the modules a stage lists in ``code``
+    module_path = tmp_path / "helpers.py"
+    module_path.write_text("SCALE = 1\n")
+    module = types.ModuleType("helpers")
+    module.__file__ = str(module_path)
+
+    cache_dir = tmp_path / "cache"
+    pipeline.run(stages(sources, density=module), cache_dir, jobs=1)
+    module_path.write_text("SCALE = 2\n")
+    rerun = pipeline.run(stages(sources, density=module), cache_dir, jobs=1)
+    assert statuses(rerun) == {
+        "income": "cached",
+        "density": "ran",
+        "eredes_agg": "ran",
+        "joined": "ran",
+        "join": "ran",
+        "ranked": "ran",
+    }
@@ -0,0 +1,31 @@
+"""Report naming and row counts of profile-dataset (without running ydata-profiling)."""
+
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from scripts.cache import frame_digest
+from scripts.profile_dataset import _config, profile_frame, report_path
+
+
+def test_report_path_is_unique_per_input_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    output_dir = Path("reports")
+    paths = [Path("2025T2/export.csv"), Path("2025T3/export.csv"), Path("2025T3/export.parquet")]
+    reports = [report_path(path, output_dir) for path in paths]
+    assert len(set(reports)) == 3
+    assert all(report.name.startswith("profile_export-") for report in reports)
+    assert report_path(Path("./2025T2/../2025T2/export.csv"), output_dir) == reports[0]
+
+
+def test_up_to_date_report_counts_source_rows(tmp_path):
+    df = pd.DataFrame({"x": range(500)})
+    output = tmp_path / "profile.html"
+    output.write_text("<html></html>")
+    config = _config("Report", True, 100)
+    output.with_suffix(".json").write_text(json.dumps({"frame": frame_digest(df), "config": config}))
+
+    result = profile_frame(df, "Report", output, minimal=True, sample_rows=100)
+    assert result.skipped
+    assert (result.rows, result.profiled_rows) == (500, 100)
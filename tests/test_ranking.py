@@ -0,0 +1,82 @@
+"""The vectorized rankings against the notebook's original per-row computations."""
+
+import numpy as np
+import pandas as pd
+
+from scripts.ranking import (
+    METRICS,
+    add_ranks,
+    compressed_ranks,
+    positions,
+    slope_chart_frame,
+    top_n_counts,
+    top_n_intervals,
+    top_n_membership,
+    top_n_names,
+)
+
+
+def frame(rows: int = 40, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # Distinct values, so nlargest and rank(method="first") agree on the order
+    data = {column: rng.permutation(rows) * 1.5 + 1 for column in METRICS.values()}
+    return add_ranks(pd.DataFrame({"Concelho": [f"M{i}" for i in range(rows)], **data}))
+
+
+def notebook_adjusted(selected: pd.DataFrame, column: str, total: int, top_n: int) -> pd.Series:
+    """The notebook's original lambda, with its hardcoded 279 as ``total + 1``."""
+    limit = total + 1 - top_n
+    return selected.apply(
+        lambda r: r[column]
+        if r[column] >= limit
+        else limit - 1 - sum((selected[column] < limit) & (selected[column] > r[column])),
+        axis=1,
+    )
+
+
+def test_compressed_ranks_match_the_notebook_lambda():
+    df = frame()
+    for top_n in (3, 10, 25):
+        selected = df.nlargest(top_n, "rank_points")
+        expected = notebook_adjusted(selected, "rank_income", len(df), top_n)
+        pd.testing.assert_series_equal(
+            compressed_ranks(selected["rank_income"], len(df), top_n), expected, check_names=False, check_dtype=False
+        )
+        chart = slope_chart_frame(df, "points", "income", top_n)
+        assert chart["rank_income_adjusted"].tolist() == expected.tolist()
+
+
+def test_positions_leave_missing_metrics_unranked():
+    df = pd.DataFrame({"Concelho": list("abcd"), METRICS["income"]: [10.0, np.nan, 30.0, 20.0]})
+    df = add_ranks(df, {"income": METRICS["income"]})
+    table = positions(df, ["income"])[:, 0]
+    assert table[[0, 2, 3]].tolist() == [3.0, 1.0, 2.0]
+    assert np.isnan(table[1])
+
+
+def test_top_n_intervals_with_a_missing_metric():
+    df = pd.DataFrame(
+        {
+            "Concelho": list("abcd"),
+            METRICS["income"]: [40.0, np.nan, 30.0, 20.0],
+            METRICS["points"]: [1.0, 2.0, np.nan, 4.0],
+        }
+    )
+    df = add_ranks(df, {"income": METRICS["income"], "points": METRICS["points"]})
+    intervals = top_n_intervals(df, ["income"], ["points"])
+    # b has no income: never qualifies; c has no points: qualifies from its income position on
+    assert intervals.to_dict("list") == {"start": [1, 5, 2, 3], "stop": [3, 2, 5, 1]}
+    assert top_n_names(df, 2, ["income"], ["points"]) == {"a", "c"}
+    assert top_n_names(df, 4, ["income"], ["points"]) == {"c"}
+
+
+def test_top_n_queries_match_nlargest_sets():
+    df = frame()
+    counts = top_n_counts(df, ["income", "density"], ["points"])
+    membership = top_n_membership(df, ["income", "density"], ["points"])
+    for n in range(1, len(df) + 1):
+        top = {name: set(df.nlargest(n, f"rank_{name}")["Concelho"]) for name in ("income", "density", "points")}
+        expected = (top["income"] & top["density"]) - top["points"]
+        assert top_n_names(df, n, ["income", "density"], ["points"]) == expected
+        assert counts[n] == len(expected)
+        assert set(df.loc[membership.loc[n].to_numpy(), "Concelho"]) == expected
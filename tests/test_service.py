@@ -0,0 +1,148 @@
+"""The metrics service: routes, response cache, hot reload and error answers."""
+
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from scripts.municipalities import KEY, NAME
+from scripts.ranking import METRICS
+from scripts.service import MetricsServer, MetricsService, ResponseCache
+
+
+def join_df(points=(30, 10, 20)) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            KEY: pd.array([1106, 1312, 105], dtype="Int32"),
+            NAME: ["Lisboa", "Porto", "Águeda"],
+            METRICS["stations"]: [12, 4, 8],
+            METRICS["points"]: list(points),
+            METRICS["density"]: [5000.0, 5600.0, 140.0],
+            METRICS["income"]: [30000.0, 25000.0, 18000.0],
+        }
+    )
+
+
+@pytest.fixture
+def artifact(tmp_path):
+    path = tmp_path / "join_df.parquet"
+    join_df().to_parquet(path, index=False)
+    return path
+
+
+@pytest.fixture
+def server(artifact):
+    service = MetricsService(artifact, cache_size=8)
+    server = MetricsServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, target: str) -> tuple[int, dict]:
+    url = f"http://127.0.0.1:{server.server_address[1]}{target}"
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as exc:
+        return exc.code, json.load(exc)
+
+
+def test_routes(server):
+    status, health = get(server, "/health")
+    assert (status, health["version"], health["rows"]) == (200, 1, 3)
+
+    status, lisboa = get(server, "/municipalities/1106")
+    assert status == 200
+    assert lisboa["name"] == "Lisboa"
+    assert lisboa["positions"] == {"stations": 1, "points": 1, "density": 2, "income": 1}
+    assert get(server, "/municipalities/agueda")[1]["code"] == 105
+
+    status, top = get(server, "/top?metric=points&n=2")
+    assert status == 200
+    assert [row["name"] for row in top["results"]] == ["Lisboa", "Águeda"]
+
+    # Porto is in the top two by income and density but not by points
+    status, gaps = get(server, "/gaps?n=2")
+    assert status == 200
+    assert [row["name"] for row in gaps["results"]] == ["Porto"]
+
+
+@pytest.mark.parametrize(
+    ("target", "status"),
+    [
+        ("/municipalities/9999", 404),
+        ("/municipalities/%C2%B2", 404),
+        ("/top?metric=area", 400),
+        ("/top?n=zero", 400),
+        ("/gaps?n=0", 400),
+        ("/nowhere", 404),
+    ],
+)
+def test_bad_requests(server, target, status):
+    code, body = get(server, target)
+    assert code == status
+    assert "error" in body
+
+
+def test_unexpected_errors_answer_500(server, monkeypatch):
+    def fail(metric, n):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server.service.snapshot, "top", fail)
+    assert get(server, "/top") == (500, {"error": "internal error"})
+    # The connection is answered, not dropped, and the service keeps serving
+    assert get(server, "/health")[0] == 200
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(maxsize=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (b"1", b"3")
+    assert (cache.hits, cache.misses, len(cache)) == (3, 1, 2)
+
+
+def test_responses_are_cached(server):
+    service = server.service
+    get(server, "/top?metric=income")
+    get(server, "/top?metric=income")
+    assert (service.cache.hits, service.cache.misses) == (1, 1)
+
+
+def test_reloads_when_the_artifact_changes(server, artifact):
+    service = server.service
+    get(server, "/top?metric=points&n=1")
+    assert not service.reload_if_changed()
+
+    join_df(points=(30, 40, 20)).to_parquet(artifact, index=False)
+    # Same size after the rewrite is possible; a later mtime alone must trigger the reload
+    stat = os.stat(artifact)
+    os.utime(artifact, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert service.reload_if_changed()
+    assert len(service.cache) == 0
+
+    assert get(server, "/health")[1]["version"] == 2
+    assert get(server, "/top?metric=points&n=1")[1]["results"][0]["name"] == "Porto"
+
+
+def test_keeps_the_old_snapshot_when_a_reload_fails(server, artifact):
+    service = server.service
+    artifact.write_bytes(b"not parquet")
+    assert not service.reload_if_changed()
+    assert get(server, "/health")[1]["version"] == 1
+    # Not retried until the file changes again
+    assert not service.reload_if_changed()
+
+    join_df().to_parquet(artifact, index=False)
+    assert service.reload_if_changed()
+    assert service.snapshot.version == 2
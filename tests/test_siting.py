@@ -0,0 +1,52 @@
+"""Greedy maximum coverage: lazy (CELF) and naive selection agree."""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import siting
+
+
+def random_coverage(rng, candidates: int, demand: int, density: float) -> siting.Coverage:
+    incidence = rng.random((candidates, demand)) < density
+    owners, columns = np.nonzero(incidence)
+    return siting.Coverage(*siting._csr(candidates, owners, columns))
+
+
+def test_handcrafted_instance():
+    # Candidate 0 covers {0, 1}, 1 covers {1, 2, 3}, 2 covers {3, 4}, 3 covers nothing
+    owners = np.array([0, 0, 1, 1, 1, 2, 2])
+    columns = np.array([0, 1, 1, 2, 3, 3, 4])
+    cover = siting.Coverage(*siting._csr(4, owners, columns))
+    weights = [5.0, 1.0, 1.0, 1.0, 4.0]
+    for lazy in (True, False):
+        selection = siting.greedy(cover, weights, k=4, lazy=lazy)
+        # Stops once everything is covered, before using the empty candidate
+        assert selection.sites.tolist() == [0, 2, 1]
+        assert selection.gains.tolist() == [6.0, 5.0, 1.0]
+        assert selection.remaining == 0.0
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("kind", ["integer", "float"])
+def test_lazy_greedy_selects_the_same_sites(seed, kind):
+    rng = np.random.default_rng(seed)
+    cover = random_coverage(rng, candidates=80, demand=300, density=0.03)
+    weights = rng.integers(0, 50, 300).astype(float) if kind == "integer" else rng.random(300) * 1e3
+    lazy = siting.greedy(cover, weights, k=40)
+    naive = siting.greedy(cover, weights, k=40, lazy=False)
+    np.testing.assert_array_equal(lazy.sites, naive.sites)
+    np.testing.assert_array_equal(lazy.gains, naive.gains)
+    assert lazy.remaining == naive.remaining
+    assert lazy.evaluations < naive.evaluations
+
+
+def test_recommend_with_no_population():
+    demand = pd.DataFrame({"lon": [-9.1, -9.0], "lat": [38.7, 38.8], "population": [0.0, 0.0]})
+    chargers = pd.DataFrame({"lon": [-9.1], "lat": [38.7]})
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result = siting.recommend(demand, k=2, chargers=chargers)
+    assert result.empty
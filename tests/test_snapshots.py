@@ -0,0 +1,95 @@
+"""Incremental updates from a release diff match a full rebuild."""
+
+import pandas as pd
+import pytest
+
+from scripts import core, ine, snapshots
+from scripts.eredes import CODE_COLUMN, POINTS_COLUMN, QUARTER_COLUMN
+from scripts.municipalities import NAME
+
+TOWNS = {"0101": "Águeda", "0102": "Albergaria-a-Velha", "0103": "Anadia", "0104": "Arouca"}
+
+
+@pytest.fixture
+def density():
+    return pd.DataFrame(
+        {
+            "Código_NUTS": [f"116{dico}" for dico in TOWNS],
+            NAME: list(TOWNS.values()),
+            "Densidade_Populacional_km2": [300.0, 160.0, 130.0, 60.0],
+        }
+    )
+
+
+@pytest.fixture
+def income():
+    return pd.DataFrame(
+        {
+            NAME: list(TOWNS.values()),
+            ine.INCOME_CODE_COLUMN: list(TOWNS),
+            ine.INCOME_COLUMN: [17000.0, 16500.0, 18000.0, 15000.0],
+        }
+    )
+
+
+def release(quarter: str, records: list[tuple[str, str, int]]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            QUARTER_COLUMN: quarter,
+            NAME: [TOWNS[dico] for dico, _, _ in records],
+            CODE_COLUMN: [dico for dico, _, _ in records],
+            "Morada": [address for _, address, _ in records],
+            POINTS_COLUMN: [points for _, _, points in records],
+        }
+    )
+
+
+OLD = [
+    ("0101", "Rua A", 2),
+    ("0101", "Rua A", 2),  # an identical copy, matched as a multiset
+    ("0101", "Rua B", 4),
+    ("0102", "Rua C", 2),
+    ("0102", "Rua D", 6),
+    ("0103", "Rua E", 2),
+    ("0104", "Rua F", 1),
+]
+NEW = [
+    ("0101", "Rua A", 2),
+    ("0101", "Rua A", 2),
+    ("0101", "Rua B", 4),
+    ("0101", "Rua G", 8),  # added
+    ("0102", "Rua C", 2),  # Rua D removed
+    ("0103", "Rua E", 10),  # changed
+    ("0104", "Rua F", 1),
+]
+
+
+def full_build(path, income, density):
+    chargers = core.aggregate_charger_files(path, density)
+    return core.rank(core.join(core.join_outer(income, density, chargers)))
+
+
+def incremental(tmp_path, income, density, new):
+    old_path, new_path = tmp_path / "old.csv", tmp_path / "new.csv"
+    release("2025T2", OLD).to_csv(old_path, sep=";", index=False)
+    release("2025T3", new).to_csv(new_path, sep=";", index=False)
+
+    changes = snapshots.diff(snapshots.read_snapshot(old_path), snapshots.read_snapshot(new_path))
+    deltas = snapshots.municipality_deltas(changes, core.municipality_index(density))
+    updated = snapshots.update_join_df(full_build(old_path, income, density), deltas)
+    return changes, updated, full_build(new_path, income, density)
+
+
+def test_update_matches_a_full_rebuild(tmp_path, income, density):
+    changes, updated, rebuilt = incremental(tmp_path, income, density, NEW)
+    assert (len(changes.added), len(changes.removed), changes.changed, changes.unchanged) == (1, 1, 1, 5)
+    assert {"rank_stations", "rank_points", "rank_density", "rank_income"} <= set(updated)
+    pd.testing.assert_frame_equal(updated, rebuilt)
+
+
+def test_update_drops_a_municipality_that_lost_its_last_charger(tmp_path, income, density):
+    new = [record for record in NEW if record[0] != "0104"]
+    _, updated, rebuilt = incremental(tmp_path, income, density, new)
+    assert "Arouca" not in updated[NAME].tolist()
+    # Every metric is re-ranked over the remaining municipalities
+    pd.testing.assert_frame_equal(updated, rebuilt)
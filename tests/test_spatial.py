@@ -0,0 +1,34 @@
+"""ChargerIndex queries against brute-force answers."""
+
+import numpy as np
+import pandas as pd
+
+from scripts.spatial import ChargerIndex, km_to_chord, to_unit_vectors
+
+
+def test_nearest_with_fewer_chargers_than_k():
+    index = ChargerIndex([-9.0, -8.0], [38.0, 39.0])
+    distances, indices = index.nearest([-9.0], [38.0], k=4)
+    assert indices.tolist() == [[0, 1, -1, -1]]
+    assert np.isfinite(distances[0, :2]).all()
+    assert np.isinf(distances[0, 2:]).all()
+
+
+def test_weighted_count_within_matches_brute_force():
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(-9.5, -6.2, 2_000), rng.uniform(37, 42, 2_000)
+    weights = rng.integers(1, 10, 2_000).astype(float)
+    origin_lon, origin_lat = rng.uniform(-9.5, -6.2, 5_000), rng.uniform(37, 42, 5_000)
+    index = ChargerIndex(lon, lat, weights)
+
+    chord = np.linalg.norm(to_unit_vectors(origin_lon, origin_lat)[:, None] - index.points[None], axis=2)
+    inside = chord <= km_to_chord(10)
+    np.testing.assert_allclose(index.count_within(origin_lon, origin_lat, 10, weighted=True), inside @ weights)
+    np.testing.assert_array_equal(index.count_within(origin_lon, origin_lat, 10), inside.sum(axis=1))
+
+
+def test_from_frame_keeps_source_labels():
+    df = pd.DataFrame({"lon": [-9.0, np.nan, -8.0], "lat": [38.0, 39.0, 40.0]}, index=[10, 11, 12])
+    index = ChargerIndex.from_frame(df)
+    _, nearest = index.nearest([-8.0], [40.0])
+    assert index.labels[nearest[0, 0]] == 12
@@ -0,0 +1,56 @@
+"""Incremental tile builds produce the same pyramid as full builds."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import tiles
+
+
+def chargers(seed: int, n: int = 300) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "lon": rng.uniform(-9.5, -6.2, n),
+            "lat": rng.uniform(37.0, 42.1, n),
+            "points": rng.integers(1, 9, n).astype(float),
+        }
+    )
+
+
+def pyramid(output) -> dict[str, bytes]:
+    return {
+        str(path.relative_to(output)): path.read_bytes()
+        for path in sorted(output.rglob("*"))
+        if path.is_file() and path.name != tiles.STATE_FILE
+    }
+
+
+@pytest.mark.parametrize("fmt", ["json", "bin"])
+def test_incremental_build_matches_full_build(tmp_path, fmt):
+    before = chargers(0)
+    # Drop some chargers, among them an isolated one whose tiles must vanish,
+    # change the points of others and add new ones, one far from the rest
+    isolated = pd.DataFrame({"lon": [-28.0], "lat": [38.6], "points": [2.0]})
+    remote = pd.DataFrame({"lon": [-16.9], "lat": [32.7], "points": [4.0]})
+    after = pd.concat([before.iloc[20:], chargers(1, 40), remote], ignore_index=True)
+    after.loc[:9, "points"] += 1
+    before = pd.concat([before, isolated], ignore_index=True)
+    options = {"min_zoom": 0, "max_zoom": 9, "grid_bits": 4, "fmt": fmt, "points_column": "points"}
+
+    incremental = tmp_path / "incremental"
+    tiles.build(before, incremental, **options)
+    assert (incremental / tiles.STATE_FILE).exists()
+    reports = tiles.build(after, incremental, **options)
+    assert sum(report.deleted for report in reports) > 0
+
+    full = tmp_path / "full"
+    tiles.build(after, full, full=True, **options)
+    assert pyramid(incremental) == pyramid(full)
+
+
+def test_unchanged_rebuild_writes_nothing(tmp_path):
+    df = chargers(0)
+    tiles.build(df, tmp_path, max_zoom=8, points_column="points")
+    reports = tiles.build(df, tmp_path, max_zoom=8, points_column="points")
+    assert sum(report.written + report.deleted for report in reports) == 0